@@ -0,0 +1,95 @@
+"""
+Benchmark da extração de HTML (páginas/s por núcleo).
+
+Compara a extração antiga (BeautifulSoup + html.parser, dois `get_text` por
+parágrafo) com os backends de `services/html_extraction.py` instalados, sobre
+páginas salvas em disco. Tudo roda num único processo, então o número já é por
+núcleo.
+
+    # salva até 200 páginas dos cursos já logados e mede
+    python bench_html_extraction.py --fetch 200
+    # só mede, com as páginas já salvas
+    python bench_html_extraction.py --pages-dir logs/ufsm/pages
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import requests
+from bs4 import BeautifulSoup
+from services.html_extraction import extract_html, available_backends
+
+LINKS_LOG = "logs/ufsm/cursos_links_acessados.json"
+
+
+def legacy_extract(html):
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else "Sem título"
+    paragraphs = [p.get_text().strip() for p in soup.find_all("p") if len(p.get_text().strip()) > 50]
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    return title, "\n".join(paragraphs), links
+
+
+def fetch_pages(pages_dir, limit):
+    with open(LINKS_LOG, "r", encoding="utf-8") as f:
+        urls = [url for curso in json.load(f).values() for url in curso["urls_acessadas"]]
+    os.makedirs(pages_dir, exist_ok=True)
+    for url in urls[:limit]:
+        path = os.path.join(pages_dir, hashlib.sha1(url.encode()).hexdigest() + ".html")
+        if os.path.exists(path):
+            continue
+        try:
+            r = requests.get(url, timeout=10)
+            if r.status_code == 200:
+                with open(path, "w", encoding="utf-8") as out:
+                    out.write(r.text)
+        except Exception as e:
+            print(f"[!] Erro em {url}: {e}")
+
+
+def load_pages(pages_dir):
+    pages = []
+    for name in sorted(os.listdir(pages_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(pages_dir, name), "r", encoding="utf-8") as f:
+                pages.append(f.read())
+    return pages
+
+
+def bench(name, fn, pages, rounds):
+    fn(pages[0])  # aquecimento (imports, caches)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            fn(html)
+    elapsed = time.perf_counter() - started
+    rate = len(pages) * rounds / elapsed
+    print(f"{name:<12} {rate:10.1f} páginas/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages-dir", default="logs/ufsm/pages")
+    parser.add_argument("--fetch", type=int, default=0, help="baixa até N páginas do log de cursos antes de medir")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_pages(args.pages_dir, args.fetch)
+    pages = load_pages(args.pages_dir)
+    if not pages:
+        print(f"Nenhuma página em {args.pages_dir}; use --fetch N")
+        return
+
+    size = sum(len(html) for html in pages) / 1024 / 1024
+    print(f"📄 {len(pages)} páginas ({size:.1f} MB), {args.rounds} rodadas\n")
+    baseline = bench("legado", legacy_extract, pages, args.rounds)
+    for backend in available_backends():
+        rate = bench(backend, lambda html: extract_html(html, links=True, backend=backend), pages, args.rounds)
+        print(f"{'':<12} {rate / baseline:10.1f}x o legado")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 from flask import Flask
-from routes.ingest_routes import ingest_blueprint
 import logging
 import sys
 import os
@@ -8,10 +7,18 @@ import os
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 DEBUG_MODE = os.getenv("DEBUG", "False").lower() == "true"
 
-# Inicialização do app
-app = Flask(__name__)
-app.register_blueprint(ingest_blueprint)
+
+def create_app():
+    # As rotas importam os serviços (clientes Qdrant/OpenAI, bancos SQLite); ficam
+    # aqui dentro porque os processos do ParsePool (spawn) reimportam este módulo
+    from routes.ingest_routes import ingest_blueprint
+
+    app = Flask(__name__)
+    app.register_blueprint(ingest_blueprint)
+    return app
+
 
 if __name__ == '__main__':
     print("🚀 Inicializando serviço de ingestão...")
+    app = create_app()
     app.run(host="0.0.0.0", port=5003, debug=DEBUG_MODE)
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, url_for
 from services.ufsm_ingestor import (
     ingest_from_sitemap,
     ingest_all_courses_text,
@@ -7,29 +7,69 @@ from services.ufsm_ingestor import (
     ingest_ufsm_cursos_rag
 )
 from services.hotmart_ingestor import ingest_hotmart
-from services.vector_ops import ingest_manual_text, list_collections, list_all_documents, delete_collection
+from services.vector_ops import ingest_manual_text, list_collections, list_all_documents, delete_collection, embedding_metrics
 from services.reprocess_log import reprocess_from_log
 from services.ingest_faq_from_json import ingest_faq_from_jsonl
 
 from services.ingest_from_web_loader import ingest_from_web_loader
+from services.job_queue import get_job_manager
+from services.crawler import CrawlBudget
 
 ingest_blueprint = Blueprint("ingest", __name__)
 
+
+def _submit_job(name, fn, **params):
+    """
+    Roda a ingestão como job em segundo plano e responde 202 com o ID.
+    Com `{"wait": true}` no corpo mantém o comportamento síncrono antigo.
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get("wait"):
+        return fn(**params)
+    job_id = get_job_manager().submit(name, fn, app=current_app._get_current_object(), **params)
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": url_for("ingest.job_status", job_id=job_id)
+    }), 202
+
+def _budget_params(data):
+    """Limites do crawl vindos do corpo (`max_pages`, `max_bytes`, `max_seconds`, `max_tokens`)."""
+    budget = {field: data[field] for field in CrawlBudget.FIELDS if data.get(field) is not None}
+    return budget or None
+
 ## endpoint for ingestion operations with json data
 @ingest_blueprint.route("/process_faq_json", methods=["POST"])
 def process_faq_json():
-    return ingest_faq_from_jsonl("data/ufsm_geral_dataset.jsonl", collection_name="ufsm_faqs")
+    return _submit_job(
+        "process_faq_json",
+        ingest_faq_from_jsonl,
+        file_path="data/ufsm_geral_dataset.jsonl",
+        collection_name="ufsm_faqs"
+    )
 
 @ingest_blueprint.route("/reprocess_log", methods=["POST"])
 def reprocess_log_endpoint():
-    return reprocess_from_log()
+    data = request.get_json(silent=True) or {}
+    return _submit_job(
+        "reprocess_log",
+        reprocess_from_log,
+        incremental=data.get("incremental", True),
+        replay=data.get("replay")
+    )
 
 ## endpoint for ingestion info from all ufsm web pages
 @ingest_blueprint.route("/ingest_ufsm_cursos_rag", methods=["POST"])
 def ingest_rag_ufsm():
     try:
-        total = ingest_ufsm_cursos_rag()
-        return jsonify({"message": f"Ingestão RAG finalizada com {total} chunks"}), 200
+        data = request.get_json(silent=True) or {}
+        return _submit_job(
+            "ingest_ufsm_cursos_rag",
+            ingest_ufsm_cursos_rag,
+            incremental=data.get("incremental", True),
+            budget=_budget_params(data),
+            replay=data.get("replay")
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -56,7 +96,8 @@ def ingest_ufsm_geral():
 ## endpoint for ingestion operations with crawling
 @ingest_blueprint.route("/ingest_ufsm2", methods=["POST"])
 def ingest_ufsm2():
-    return ingest_via_crawling()
+    data = request.get_json(silent=True) or {}
+    return _submit_job("ingest_ufsm2", ingest_via_crawling, budget=_budget_params(data), replay=data.get("replay"))
 
 
 
@@ -87,6 +128,34 @@ def list_all():
 def get_docs():
     return list_all_documents()
 
+#-------------------------------------------------------------------------------
+## endpoints for background ingestion jobs
+@ingest_blueprint.route("/jobs", methods=["GET"])
+def list_jobs():
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"jobs": get_job_manager().list(limit=limit, status=request.args.get("status"))}), 200
+
+@ingest_blueprint.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(job), 200
+
+@ingest_blueprint.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    manager = get_job_manager()
+    if not manager.get(job_id):
+        return jsonify({"error": "Job não encontrado"}), 404
+    if not manager.cancel(job_id):
+        return jsonify({"error": "Job já finalizado"}), 409
+    return jsonify({"message": f"Cancelamento solicitado para {job_id}"}), 202
+
+## endpoint for embedding throughput/cache metrics
+@ingest_blueprint.route("/metrics", methods=["GET"])
+def metrics():
+    return embedding_metrics()
+
 ## endpoint for deleting a collection
 @ingest_blueprint.route("/delete_collection", methods=["POST"])
 def delete():
@@ -0,0 +1,391 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
+import httpx
+from services import http_fetch
+from services.http_fetch import SITEMAP_NS, USER_AGENT
+from services.page_archive import ArchivedResponse
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sitemap(content: bytes):
+    """
+    Lê um sitemap (urlset ou sitemapindex) e retorna `(sub_sitemaps, paginas)`,
+    cada item como `(loc, lastmod)` com o lastmod da própria entrada.
+    """
+    root = ET.fromstring(content)
+    is_index = root.tag.endswith("sitemapindex")
+    sitemaps, pages = [], []
+    for entry in root:
+        loc = entry.find(f"{SITEMAP_NS}loc")
+        if loc is None or not loc.text:
+            continue
+        lastmod = entry.find(f"{SITEMAP_NS}lastmod")
+        item = (loc.text.strip(), lastmod.text.strip() if lastmod is not None and lastmod.text else None)
+        if is_index or item[0].endswith(".xml"):
+            sitemaps.append(item)
+        else:
+            pages.append(item)
+    return sitemaps, pages
+
+
+class CrawlBudget:
+    """
+    Limites de um crawl: páginas, bytes baixados, tempo de parede e tokens de
+    embedding (estes contabilizados por quem embeda, via `add_tokens` ou `reserve_tokens`).
+    `None` em qualquer limite significa sem limite.
+    """
+
+    FIELDS = ("max_pages", "max_bytes", "max_seconds", "max_tokens")
+
+    def __init__(self, max_pages: int = None, max_bytes: int = None, max_seconds: float = None, max_tokens: int = None):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.tokens_used = 0
+        self.tokens_exhausted = False
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, data: dict = None, **defaults):
+        """Monta o orçamento a partir do corpo da requisição, com `defaults` para o que faltar."""
+        data = data or {}
+        values = {field: data.get(field, defaults.get(field)) for field in cls.FIELDS}
+        return cls(**values)
+
+    def start(self):
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        return self
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started_at if self._started_at else 0.0
+
+    def add_tokens(self, tokens: int):
+        with self._lock:
+            self.tokens_used += tokens
+
+    def reserve_tokens(self, tokens: int) -> bool:
+        """
+        Contabiliza `tokens` se couberem em `max_tokens` e retorna True; senão não
+        conta nada, marca o orçamento de tokens como esgotado e retorna False.
+        """
+        with self._lock:
+            if self.max_tokens is not None and self.tokens_used + tokens > self.max_tokens:
+                self.tokens_exhausted = True
+                return False
+            self.tokens_used += tokens
+            return True
+
+    def exceeded(self, pages: int = 0, bytes_: int = 0):
+        """Retorna o motivo (`"max_pages"`, ...) se algum limite foi atingido, senão None."""
+        if self.max_pages is not None and pages >= self.max_pages:
+            return "max_pages"
+        if self.max_bytes is not None and bytes_ >= self.max_bytes:
+            return "max_bytes"
+        if self.max_seconds is not None and self.elapsed >= self.max_seconds:
+            return "max_seconds"
+        if self.max_tokens is not None and (self.tokens_exhausted or self.tokens_used >= self.max_tokens):
+            return "max_tokens"
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            **{field: getattr(self, field) for field in self.FIELDS},
+            "tokens_used": self.tokens_used,
+            "elapsed": round(self.elapsed, 2),
+        }
+
+
+class CrawlerEngine:
+    """
+    Crawler assíncrono de sitemaps e páginas.
+
+    - Conexões HTTP keep-alive reaproveitadas (um `httpx.AsyncClient` por crawl);
+    - Concorrência global (`concurrency`) e por host (`per_host`);
+    - Intervalo mínimo entre requisições ao mesmo host (`delay`, politeness);
+    - Expansão de sitemaps, download e consumo das páginas acontecem em paralelo,
+      ligados por filas limitadas;
+    - `CrawlBudget` e `cancel_event` param os downloads no meio do crawl; o que
+      já foi baixado ainda é entregue a quem consome;
+    - Com um `archive` (PageArchive), as respostas são arquivadas em disco ou,
+      em replay, lidas de lá sem tocar a rede.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = None,
+        per_host: int = None,
+        delay: float = None,
+        timeout: float = None,
+        queue_size: int = None,
+        archive=None,
+        replay: bool = None,
+    ):
+        self.concurrency = concurrency or int(os.getenv("CRAWL_CONCURRENCY", 16))
+        self.per_host = per_host or int(os.getenv("CRAWL_PER_HOST", 4))
+        self.delay = delay if delay is not None else float(os.getenv("CRAWL_DELAY", 0.25))
+        self.timeout = timeout or float(os.getenv("CRAWL_TIMEOUT", 10))
+        self.queue_size = queue_size or int(os.getenv("CRAWL_QUEUE_SIZE", 256))
+        self.archive = archive
+        self.replay = archive.replaying(replay) if archive is not None else False
+
+        self._host_slots = {}
+        self._host_locks = {}
+        self._host_next = {}
+        self.stats = {"sitemaps": 0, "pages": 0, "not_modified": 0, "failed": 0, "bytes": 0, "replayed": 0}
+        self.stop_reason = None
+        self._reserved = 0
+
+    # ----------------------------------------------------------------- HTTP
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+        )
+
+    async def _wait_turn(self, host: str):
+        """Respeita o intervalo mínimo entre requisições ao mesmo host."""
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            wait = self._host_next.get(host, 0.0) - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._host_next[host] = max(now, self._host_next.get(host, 0.0)) + self.delay
+
+    async def fetch(self, client: httpx.AsyncClient, url: str, headers: dict = None):
+        """
+        Baixa uma URL; retorna dict com status, conteúdo e cabeçalhos ou None em erro.
+        Com cabeçalhos condicionais, um 304 volta como `{"not_modified": True, ...}`.
+        """
+        if self.replay:
+            return await self._replay(url)
+        host = urlparse(url).netloc
+        slot = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slot:
+            await self._wait_turn(host)
+            try:
+                response = await client.get(url, headers=headers)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"Erro ao acessar {url}: {e}")
+                return None
+        self.stats["bytes"] += len(response.content)
+        if response.status_code == 304:
+            self.stats["not_modified"] += 1
+            return {"url": url, "status": 304, "not_modified": True, "headers": dict(response.headers)}
+        if response.status_code != 200:
+            self.stats["failed"] += 1
+            return None
+        if self.archive is not None and self.archive.recording:
+            await asyncio.to_thread(self.archive.put, url, response.content, dict(response.headers))
+        return {
+            "url": url,
+            "status": response.status_code,
+            "content": response.content,
+            "text": response.text,
+            "headers": dict(response.headers),
+            "not_modified": False,
+        }
+
+    async def _replay(self, url: str):
+        archived = await asyncio.to_thread(self.archive.get, url)
+        if not archived:
+            self.stats["failed"] += 1
+            logger.debug(f"URL fora do arquivo: {url}")
+            return None
+        response = ArchivedResponse(url, archived["status"], archived["content"], archived["headers"])
+        self.stats["bytes"] += len(response.content)
+        self.stats["replayed"] += 1
+        return {
+            "url": url,
+            "status": response.status_code,
+            "content": response.content,
+            "text": response.text,
+            "headers": response.headers,
+            "not_modified": False,
+        }
+
+    # ------------------------------------------------------------- sitemaps
+    async def _sitemap(self, client, sitemap_url: str):
+        """
+        Sitemap parseado, via cache de `http_fetch`: dentro do TTL sem rede,
+        depois com GET condicional (304 reaproveita o parse anterior).
+        """
+        if self.replay:
+            fetched = await self.fetch(client, sitemap_url)
+            return parse_sitemap(fetched["content"]) if fetched else None
+        entry, fresh = http_fetch.lookup(sitemap_url)
+        if not fresh:
+            fetched = await self.fetch(client, sitemap_url, headers=entry.conditional_headers() if entry else None)
+            if not fetched:
+                return None
+            if fetched["not_modified"]:
+                if entry is None:
+                    return None
+                entry = http_fetch.revalidated(entry)
+            else:
+                entry = http_fetch.store(sitemap_url, fetched["content"], fetched["headers"])
+        return entry.parse("sitemap", parse_sitemap)
+
+    async def _expand(self, client, sitemap_url: str, meta: dict, enqueue, seen: set, depth: int = 0):
+        try:
+            parsed = await self._sitemap(client, sitemap_url)
+            if parsed is None:
+                return
+            sub_sitemaps, pages = parsed
+        except Exception as e:
+            logger.warning(f"Erro ao processar {sitemap_url}: {e}")
+            return
+        self.stats["sitemaps"] += 1
+        logger.debug(f"🔍 {len(sub_sitemaps)} sub-sitemaps e {len(pages)} páginas em {sitemap_url}")
+
+        for page_url, lastmod in pages:
+            if page_url in seen:
+                continue
+            seen.add(page_url)
+            await enqueue({"url": page_url, "lastmod": lastmod, "sitemap": sitemap_url, "meta": meta})
+
+        if depth < 3 and sub_sitemaps:
+            await asyncio.gather(*(
+                self._expand(client, sub_url, meta, enqueue, seen, depth + 1)
+                for sub_url, _ in sub_sitemaps
+            ))
+
+    # ---------------------------------------------------------------- crawl
+    def _should_stop(self, budget, cancel_event):
+        if self.stop_reason:
+            return True
+        if cancel_event is not None and cancel_event.is_set():
+            self.stop_reason = "cancelled"
+        elif budget is not None:
+            self.stop_reason = budget.exceeded(self._reserved, self.stats["bytes"])
+        if self.stop_reason:
+            logger.info(f"🛑 Crawl interrompido: {self.stop_reason}")
+        return bool(self.stop_reason)
+
+    async def crawl(self, sitemaps=(), urls=(), accept=None, headers_for=None, parse=None, follow=False, budget=None, cancel_event=None):
+        """
+        Gera as páginas baixadas conforme ficam prontas.
+
+        sitemaps: lista de `(url_do_sitemap, meta)`; expandidos recursivamente.
+        urls: lista de `(url_da_pagina, meta)`; baixadas diretamente.
+        accept: filtro opcional `accept(item) -> bool` aplicado antes do download.
+        headers_for: opcional `headers_for(item) -> dict` com cabeçalhos da requisição
+            (ex: If-None-Match/If-Modified-Since para GET condicional).
+        parse: opcional `parse(pagina) -> dict`, roda numa thread logo após o
+            download; o dict é mesclado à página.
+        follow: com `parse`, os `links` (`[(url, meta)]`) que ele devolver também
+            entram no crawl.
+        budget: `CrawlBudget` com os limites do crawl.
+        cancel_event: `threading.Event`; ao ser setado, nenhum download novo começa.
+
+        Cada página é um dict com `url`, `lastmod`, `meta`, `text`, `content`,
+        `headers` e `not_modified` (True para respostas 304, sem conteúdo).
+        O motivo de uma parada antecipada fica em `self.stop_reason`.
+        """
+        # Seguindo links, a fronteira cresce a partir dos próprios workers: fila sem
+        # limite para não travarem uns nos outros (o orçamento limita o total)
+        items = asyncio.Queue(maxsize=0 if follow else self.queue_size)
+        pages = asyncio.Queue(maxsize=self.queue_size)
+        seen = set()
+        state = {"outstanding": 0, "produced": False, "finished": False}
+        if budget is not None:
+            budget.start()
+
+        async def enqueue(item):
+            state["outstanding"] += 1
+            await items.put(item)
+
+        async def settle():
+            # Fim natural: produtor terminou e nenhum item está pendente
+            if state["produced"] and state["outstanding"] == 0 and not state["finished"]:
+                state["finished"] = True
+                for _ in range(self.concurrency):
+                    items.put_nowait(None)
+
+        async with self._client() as client:
+            async def produce():
+                try:
+                    for url, meta in urls:
+                        if url not in seen:
+                            seen.add(url)
+                            await enqueue({"url": url, "lastmod": None, "sitemap": None, "meta": meta})
+                    await asyncio.gather(*(
+                        self._expand(client, url, meta, enqueue, seen) for url, meta in sitemaps
+                    ))
+                finally:
+                    state["produced"] = True
+                    await settle()
+
+            async def process(item):
+                if accept and not accept(item):
+                    return
+                self._reserved += 1
+                headers = headers_for(item) if headers_for else None
+                fetched = await self.fetch(client, item["url"], headers=headers)
+                if not fetched or fetched["not_modified"]:
+                    self._reserved -= 1
+                if not fetched:
+                    return
+                self.stats["pages"] += not fetched["not_modified"]
+                page = {**item, **fetched}
+                if parse and not fetched["not_modified"]:
+                    try:
+                        page.update(await asyncio.to_thread(parse, page))
+                    except Exception as e:
+                        logger.warning(f"Erro ao processar {item['url']}: {e}")
+                    for url, meta in (page.get("links") or ()) if follow else ():
+                        if url not in seen:
+                            seen.add(url)
+                            await enqueue({"url": url, "lastmod": None, "sitemap": item["url"], "meta": meta})
+                await pages.put(page)
+
+            async def work():
+                while not self._should_stop(budget, cancel_event):
+                    try:
+                        # Timeout curto para notar cancelamento/orçamento mesmo ocioso
+                        item = await asyncio.wait_for(items.get(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    if item is None:
+                        break
+                    try:
+                        if not self._should_stop(budget, cancel_event):
+                            await process(item)
+                    finally:
+                        state["outstanding"] -= 1
+                        await settle()
+
+            async def close():
+                await asyncio.gather(*workers)
+                await pages.put(None)
+
+            producer = asyncio.create_task(produce())
+            workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+            closer = asyncio.create_task(close())
+            try:
+                while True:
+                    page = await pages.get()
+                    if page is None:
+                        break
+                    yield page
+            finally:
+                for task in [producer, closer, *workers]:
+                    task.cancel()
+                await asyncio.gather(producer, closer, *workers, return_exceptions=True)
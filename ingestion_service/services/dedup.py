@@ -0,0 +1,98 @@
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e espaços colapsados: base do hash exato."""
+    return " ".join(text.lower().split())
+
+
+def _factual(token: str) -> bool:
+    """Números e nomes próprios (inicial maiúscula): tokens que mudam o fato dito."""
+    return token[:1].isupper() or any(char.isdigit() for char in token)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    Índice de duplicatas de uma execução de ingestão.
+
+    `find_or_add(texto, chave)` devolve a chave do texto já visto de que ele é
+    cópia, ou registra o texto e devolve None. Duplicatas exatas são achadas pelo
+    hash do texto normalizado; quase-duplicatas (o mesmo parágrafo com pontuação
+    ou uma palavra comum diferente) por MinHash sobre shingles de 3 palavras,
+    com Jaccard estimado a partir de `threshold` (DEDUP_JACCARD, 0.97).
+
+    Parágrafos de template que só trocam o nome do curso, a duração ou o número
+    de vagas dizem fatos diferentes: uma quase-duplicata só é descartada se
+    nenhuma das palavras que diferem tiver dígitos ou inicial maiúscula.
+
+    As assinaturas são divididas em `bands` faixas (LSH): só textos que coincidem
+    numa faixa inteira são comparados, então cada consulta custa o mesmo com mil
+    ou cem mil chunks no índice. Textos com menos de `min_words`
+    (DEDUP_MIN_WORDS) palavras só passam pelo hash exato.
+    """
+
+    def __init__(self, threshold: float = None, num_perm: int = 128, bands: int = 16, min_words: int = None, seed: int = 1):
+        self.threshold = threshold if threshold is not None else float(os.getenv("DEDUP_JACCARD", 0.97))
+        self.min_words = min_words if min_words is not None else int(os.getenv("DEDUP_MIN_WORDS", 8))
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Hash multiplicativo (a * h + b) >> 32 com `a` ímpar: uma permutação por coluna
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 63 - 1, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 2 ** 63 - 1, size=num_perm, dtype=np.uint64)
+        self._exact = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles(text)],
+            dtype=np.uint64,
+        )
+        with np.errstate(over="ignore"):
+            values = (hashes[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return values.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    @staticmethod
+    def same_facts(words: set, other: set) -> bool:
+        return not any(_factual(token) for token in words ^ other)
+
+    def find_or_add(self, text: str, key):
+        digest = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+        words = set(_WORD.findall(text))
+        near = len(words) >= self.min_words
+        signature = self.signature(text) if near else None
+        with self._lock:
+            if digest in self._exact:
+                return self._exact[digest]
+            if near:
+                band_keys = self._band_keys(signature)
+                seen = set()
+                for band, band_key in enumerate(band_keys):
+                    for other, other_words, other_key in self._buckets[band].get(band_key, ()):
+                        if id(other) in seen:
+                            continue
+                        seen.add(id(other))
+                        if np.mean(signature == other) >= self.threshold and self.same_facts(words, other_words):
+                            return other_key
+            self._exact[digest] = key
+            if near:
+                for band, band_key in enumerate(band_keys):
+                    self._buckets[band].setdefault(band_key, []).append((signature, words, key))
+        return None
@@ -1,39 +1,17 @@
 import os
 import json
 import logging
-import requests
 from unidecode import unidecode
-import xml.etree.ElementTree as ET
 from qdrant_client.http.models import PointStruct, VectorParams, Distance
 from shared.langchain_container import LangChainContainer
+from shared.collection_aliases import BlueGreenRebuild
+from services.http_fetch import get_all_sitemap_urls, extract_urls_from_sitemap
 
 
 container = LangChainContainer()
 client = container.qdrant_client
 embedding_model = container.embedding_model
 
-def get_all_sitemap_urls():
-    robots_url = "https://www.ufsm.br/robots.txt"
-    response = requests.get(robots_url)
-    sitemap_urls = []
-
-    if response.status_code == 200:
-        for line in response.text.splitlines():
-            if line.lower().startswith("sitemap:"):
-                sitemap_urls.append(line.split(": ", 1)[1])
-    return sitemap_urls
-
-
-def extract_urls_from_sitemap(sitemap_url):
-    response = requests.get(sitemap_url)
-    urls = []
-    if response.status_code == 200:
-        root = ET.fromstring(response.content)
-        for url in root.findall(".//{http://www.sitemaps.org/schemas/sitemap/0.9}loc"):
-            urls.append(url.text)
-    return urls
-
-
 def filter_course_urls(urls):
     return [url for url in urls if "/cursos/graduacao/" in url]
 
@@ -93,10 +71,13 @@ def ingest_ufsm_geral():
     cursos_ordenados = sorted(cursos)
     total_cursos = len(cursos_ordenados)
 
-    frases = []
+    # Paráfrases da mesma informação formam um grupo: cada uma vira um ponto
+    # (uma pergunta pode estar perto de qualquer delas), todos com a primeira
+    # como texto, para que qualquer acerto recupere a mesma resposta
+    grupos = []
 
     for curso in cursos_ordenados:
-        frases.extend([
+        grupos.append([
             f"A Universidade Federal de Santa Maria tem curso de {curso}.",
             f"{curso} é ofertado pela UFSM.",
             f"{curso} é um curso oferecido pela Universidade Federal de Santa Maria - UFSM.",
@@ -106,43 +87,45 @@ def ingest_ufsm_geral():
             f"{curso} é uma graduação da Universidade Federal de Santa Maria.",
         ])
 
-    frases.extend([
+    grupos.append([
         f"A quantidade de cursos da UFSM é {total_cursos}.",
         f"A Universidade Federal de Santa Maria ministra {total_cursos} cursos diferentes.",
         f"Atualmente a UFSM oferece {total_cursos} cursos de graduação.",
         f"No total, são {total_cursos} cursos oferecidos pela UFSM.",
     ])
 
+    frases = [frase for grupo in grupos for frase in grupo]
     # embeddings = embedding_model.encode(frases)
     embeddings = embedding_model.embed_documents(frases)
-    
-    logging.info(f"🧠 Ingerindo {len(frases)} frases em ufsm_geral_knowledge...")
-
-    client.recreate_collection(
-        collection_name="ufsm_geral_knowledge",
-        vectors_config=VectorParams(
-            size=384,
-            distance=Distance.COSINE
-        )
-    )
 
+    logging.info(f"🧠 Ingerindo {len(frases)} frases ({len(grupos)} respostas) em ufsm_geral_knowledge...")
+
+    variantes = [(g, grupo[0], frase) for g, grupo in enumerate(grupos) for frase in grupo]
     points = [
         PointStruct(
             id=i,
-            vector=embedding.tolist(),
+            vector=list(embedding),
             payload={
-                "text": frase,
-                "normalized_text": unidecode(frase),
+                "text": resposta,
+                "normalized_text": unidecode(resposta),
+                "variante": frase,
+                "grupo": g,
                 "categoria": "geral"
             }
         )
-        for i, (frase, embedding) in enumerate(zip(frases, embeddings))
+        for i, ((g, resposta, frase), embedding) in enumerate(zip(variantes, embeddings))
     ]
 
-    client.upsert(collection_name="ufsm_geral_knowledge", points=points)
+    # Blue/green: a coleção atual segue respondendo até o alias trocar
+    vectors_config = VectorParams(
+        size=len(embeddings[0]),
+        distance=Distance.COSINE
+    )
+    with BlueGreenRebuild(client, "ufsm_geral_knowledge", vectors_config) as rebuild:
+        client.upsert(collection_name=rebuild.collection_name, points=points)
     gerar_dataset_fine_tuning(cursos_ordenados, frases)
 
     return {
-        "message": f"{len(frases)} frases geradas e armazenadas com sucesso!",
+        "message": f"{len(frases)} frases geradas e armazenadas com sucesso ({len(grupos)} respostas)!",
         "colecao": "ufsm_geral_knowledge"
     }
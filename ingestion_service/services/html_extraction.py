@@ -0,0 +1,140 @@
+import os
+import logging
+from urllib.parse import urljoin, urldefrag
+
+logger = logging.getLogger(__name__)
+
+# Elementos de navegação/boilerplate descartados antes de extrair o texto
+BOILERPLATE_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "header", "footer", "aside")
+
+BACKENDS = ("selectolax", "lxml", "bs4")
+
+
+def _clean_links(hrefs, base_url):
+    """URLs absolutas http(s), sem fragmento e sem repetição (ordem preservada)."""
+    links, seen = [], set()
+    for href in hrefs:
+        if not href:
+            continue
+        url = urldefrag(urljoin(base_url, href.strip()) if base_url else href.strip())[0]
+        if url.startswith(("http://", "https://")) and url not in seen:
+            seen.add(url)
+            links.append(url)
+    return links
+
+
+def _result(title, texts, hrefs, base_url, min_paragraph):
+    paragraphs = [text for text in (t.strip() for t in texts) if len(text) > min_paragraph]
+    return {
+        "title": title.strip() if title and title.strip() else None,
+        "paragraphs": paragraphs,
+        "text": "\n".join(paragraphs),
+        "links": _clean_links(hrefs, base_url) if hrefs is not None else [],
+    }
+
+
+# ------------------------------------------------------------------ backends
+def _extract_selectolax(html, base_url, min_paragraph, links):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    title_node = tree.css_first("title")
+    title = title_node.text() if title_node else None
+    hrefs = [node.attributes.get("href") for node in tree.css("a[href]")] if links else None
+    tree.strip_tags(list(BOILERPLATE_TAGS))
+    texts = [node.text() for node in tree.css("p")]
+    return _result(title, texts, hrefs, base_url, min_paragraph)
+
+
+def _extract_lxml(html, base_url, min_paragraph, links):
+    import lxml.html
+
+    # bytes: o lxml recusa str com declaração de encoding
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    doc = lxml.html.document_fromstring(html.encode("utf-8"), parser=parser)
+    title = doc.findtext(".//title")
+    hrefs = doc.xpath("//a/@href") if links else None
+    for node in doc.xpath("|".join(f"//{tag}" for tag in BOILERPLATE_TAGS)):
+        node.drop_tree()
+    texts = [node.text_content() for node in doc.iter("p")]
+    return _result(title, texts, hrefs, base_url, min_paragraph)
+
+
+def _extract_bs4(html, base_url, min_paragraph, links):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml" if _available("lxml") else "html.parser")
+    # Uma única varredura da árvore coleta título, links, parágrafos e boilerplate
+    title, hrefs, paragraphs, boilerplate = None, [] if links else None, [], []
+    for node in soup.find_all(True):
+        if node.name == "p":
+            paragraphs.append(node)
+        elif node.name in BOILERPLATE_TAGS:
+            boilerplate.append(node)
+        elif node.name == "a" and links and node.get("href"):
+            hrefs.append(node["href"])
+        elif node.name == "title" and title is None:
+            title = node.get_text()
+    for node in boilerplate:
+        if not node.decomposed:
+            node.decompose()
+    texts = [node.get_text() for node in paragraphs if not node.decomposed]
+    return _result(title, texts, hrefs, base_url, min_paragraph)
+
+
+_EXTRACTORS = {"selectolax": _extract_selectolax, "lxml": _extract_lxml, "bs4": _extract_bs4}
+_availability = {}
+
+
+def _available(name: str) -> bool:
+    if name not in _availability:
+        module = {"selectolax": "selectolax.lexbor", "lxml": "lxml.html", "bs4": "bs4"}[name]
+        try:
+            __import__(module)
+            _availability[name] = True
+        except ImportError:
+            _availability[name] = False
+    return _availability[name]
+
+
+def available_backends() -> list:
+    return [name for name in BACKENDS if _available(name)]
+
+
+def get_backend(name: str = None) -> str:
+    """
+    Backend de extração: `name`, `HTML_EXTRACTION_BACKEND` ou o mais rápido
+    instalado (selectolax > lxml > bs4). Um backend pedido mas não instalado
+    cai no próximo da lista, com aviso.
+    """
+    name = name or os.getenv("HTML_EXTRACTION_BACKEND", "auto")
+    if name != "auto":
+        if name not in _EXTRACTORS:
+            raise ValueError(f"Backend de extração desconhecido: {name}")
+        if _available(name):
+            return name
+        logger.warning(f"⚠️ Backend `{name}` não instalado, usando o próximo disponível")
+    for candidate in BACKENDS:
+        if _available(candidate):
+            return candidate
+    raise RuntimeError("Nenhum backend de extração HTML instalado (selectolax, lxml ou beautifulsoup4)")
+
+
+# ---------------------------------------------------------------------- API
+def extract_html(html: str, base_url: str = None, min_paragraph: int = 50, links: bool = False, backend: str = None) -> dict:
+    """
+    Extrai título, parágrafos e (opcionalmente) links de uma página numa única passada.
+
+    Scripts, estilos, navegação, cabeçalho, rodapé e afins são descartados antes
+    da extração do texto; os links são coletados antes, então os de menu também
+    entram (úteis para crawling). Retorna `{"title", "paragraphs", "text", "links"}`:
+    `paragraphs` são os `<p>` com mais de `min_paragraph` caracteres, `text` é a
+    junção deles por linha e `links` são URLs absolutas (relativas a `base_url`).
+    """
+    if not html or not html.strip():
+        return _result(None, [], [] if links else None, base_url, min_paragraph)
+    return _EXTRACTORS[get_backend(backend)](html, base_url, min_paragraph, links)
+
+
+def extract_paragraphs(html: str, min_paragraph: int = 40, backend: str = None) -> list:
+    return extract_html(html, min_paragraph=min_paragraph, backend=backend)["paragraphs"]
@@ -0,0 +1,201 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+import xml.etree.ElementTree as ET
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "hsmart-ingestion/1.0 (+https://www.ufsm.br)"
+ROBOTS_URL = "https://www.ufsm.br/robots.txt"
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+_local = threading.local()
+
+
+# ----------------------------------------------------------------- sessões
+def session() -> requests.Session:
+    """
+    Sessão `requests` da thread atual, com pool de conexões keep-alive
+    (`FETCH_POOL_SIZE` por host) e retry para falhas de conexão/5xx.
+    """
+    current = getattr(_local, "session", None)
+    if current is None:
+        pool_size = int(os.getenv("FETCH_POOL_SIZE", 16))
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET", "HEAD"))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        current = requests.Session()
+        current.mount("http://", adapter)
+        current.mount("https://", adapter)
+        current.headers["User-Agent"] = USER_AGENT
+        _local.session = current
+    return current
+
+
+def get(url: str, headers: dict = None, timeout: float = 10) -> requests.Response:
+    return session().get(url, headers=headers, timeout=timeout)
+
+
+# ------------------------------------------------------- cache com TTL + 304
+class CachedBody:
+    """Corpo de uma URL em cache, com os validadores e o que já foi parseado dele."""
+
+    __slots__ = ("url", "content", "etag", "last_modified", "checked_at", "parsed")
+
+    def __init__(self, url: str, content: bytes, headers: dict):
+        self.url = url
+        self.content = content
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        self.etag = headers.get("etag")
+        self.last_modified = headers.get("last-modified")
+        self.checked_at = time.monotonic()
+        self.parsed = {}
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def parse(self, name: str, parser):
+        """`parser(conteudo)`, calculado uma vez por versão do corpo."""
+        if name not in self.parsed:
+            self.parsed[name] = parser(self.content)
+        return self.parsed[name]
+
+
+_cache = OrderedDict()  # url -> CachedBody, do menos para o mais recente
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "revalidated": 0, "downloads": 0, "evicted": 0, "expired": 0}
+
+
+def cache_ttl() -> float:
+    return float(os.getenv("FETCH_CACHE_TTL", 3600))
+
+
+def cache_max_entries() -> int:
+    return int(os.getenv("FETCH_CACHE_MAX_ENTRIES", 512))
+
+
+def cache_max_age() -> float:
+    # Vencidas dentro do TTL ainda servem para o GET condicional (304); só
+    # saem do cache depois de tanto tempo sem serem conferidas
+    return float(os.getenv("FETCH_CACHE_MAX_AGE", 24 * 3600))
+
+
+def lookup(url: str, ttl: float = None):
+    """`(entrada, fresca)`: a entrada em cache (ou None) e se ainda está dentro do TTL."""
+    ttl = ttl if ttl is not None else cache_ttl()
+    with _cache_lock:
+        entry = _cache.get(url)
+        if entry is not None:
+            _cache.move_to_end(url)
+        fresh = entry is not None and time.monotonic() - entry.checked_at < ttl
+        if fresh:
+            _stats["hits"] += 1
+        return entry, fresh
+
+
+def _evict():
+    """Remove as entradas antigas demais e, acima do limite, as menos usadas (com `_cache_lock`)."""
+    max_age = cache_max_age()
+    now = time.monotonic()
+    for url in [url for url, entry in _cache.items() if now - entry.checked_at >= max_age]:
+        del _cache[url]
+        _stats["expired"] += 1
+    max_entries = max(cache_max_entries(), 1)
+    while len(_cache) > max_entries:
+        _cache.popitem(last=False)
+        _stats["evicted"] += 1
+
+
+def store(url: str, content: bytes, headers: dict = None) -> CachedBody:
+    entry = CachedBody(url, content, headers)
+    with _cache_lock:
+        _cache[url] = entry
+        _cache.move_to_end(url)
+        _stats["downloads"] += 1
+        _evict()
+    return entry
+
+
+def revalidated(entry: CachedBody) -> CachedBody:
+    """Marca a entrada como conferida agora (o servidor respondeu 304)."""
+    with _cache_lock:
+        entry.checked_at = time.monotonic()
+        _stats["revalidated"] += 1
+    return entry
+
+
+def fetch_cached(url: str, ttl: float = None, timeout: float = 10, replay: bool = None):
+    """
+    `CachedBody` de `url`, ou None se indisponível.
+
+    Dentro do TTL (`FETCH_CACHE_TTL`, 1h) não há requisição; depois dele, um GET
+    condicional (If-None-Match/If-Modified-Since) e, se vier 304, o corpo e o
+    que já foi parseado dele continuam valendo. Passa pelo `PageArchive`: em
+    replay lê do arquivo, sem cache, e no modo record arquiva o que baixar.
+    """
+    from services.page_archive import get_page_archive
+
+    archive = get_page_archive()
+    if archive.replaying(replay):
+        response = archive.fetch(url, timeout=timeout, replay=True)
+        return CachedBody(url, response.content, response.headers) if response.status_code == 200 else None
+
+    entry, fresh = lookup(url, ttl)
+    if fresh:
+        return entry
+    try:
+        response = archive.fetch(url, headers=entry.conditional_headers() if entry else None, timeout=timeout, replay=False)
+    except Exception as e:
+        logger.warning(f"Erro ao acessar {url}: {e}")
+        return entry
+    if response.status_code == 304 and entry:
+        return revalidated(entry)
+    if response.status_code != 200:
+        return None
+    return store(url, response.content, dict(response.headers))
+
+
+def _parsed(url: str, name: str, parser, replay: bool = None) -> list:
+    entry = fetch_cached(url, replay=replay)
+    if entry is None:
+        return []
+    try:
+        return list(entry.parse(name, parser))
+    except Exception as e:
+        logger.warning(f"Erro ao processar {url}: {e}")
+        return []
+
+
+def cache_stats() -> dict:
+    with _cache_lock:
+        return {**_stats, "entries": len(_cache)}
+
+
+# --------------------------------------------------------- robots/sitemaps
+def _robots_sitemaps(content: bytes) -> list:
+    text = content.decode("utf-8", errors="replace")
+    return [line.split(":", 1)[1].strip() for line in text.splitlines() if line.lower().startswith("sitemap:")]
+
+
+def _sitemap_locs(content: bytes) -> list:
+    root = ET.fromstring(content)
+    return [loc.text.strip() for loc in root.iter(f"{SITEMAP_NS}loc") if loc.text]
+
+
+def get_all_sitemap_urls(robots_url: str = ROBOTS_URL, replay: bool = None) -> list:
+    """Sitemaps declarados no robots.txt (cache com TTL)."""
+    return _parsed(robots_url, "robots", _robots_sitemaps, replay=replay)
+
+
+def extract_urls_from_sitemap(url: str, replay: bool = None) -> list:
+    """Todas as `<loc>` de um sitemap, sem expandir sub-sitemaps (cache com TTL)."""
+    return _parsed(url, "locs", _sitemap_locs, replay=replay)
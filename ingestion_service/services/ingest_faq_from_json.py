@@ -4,8 +4,11 @@ from pathlib import Path
 from langchain_core.documents import Document
 from qdrant_client.http.models import VectorParams, Distance
 from shared.langchain_container import LangChainContainer
+from shared.bulk_upload import BulkUploader, document_points
+from shared.point_ids import chunk_point_id
+from shared.collection_aliases import BlueGreenRebuild
 
-def ingest_faq_from_jsonl(file_path: str, collection_name: str = "ufsm_faqs"):
+def ingest_faq_from_jsonl(file_path: str, collection_name: str = "ufsm_faqs", job=None):
     """
     Ingesta um dataset JSONL com pares {prompt, response} em uma coleção vetorial.
     Os prompts são armazenados como exemplos no metadata do response.
@@ -13,6 +16,7 @@ def ingest_faq_from_jsonl(file_path: str, collection_name: str = "ufsm_faqs"):
     Args:
         file_path (str): Caminho para o arquivo .jsonl
         collection_name (str): Nome da coleção no Qdrant
+        job (JobContext): opcional, quando roda como job em segundo plano
     """
     path = Path(file_path)
     if not path.exists():
@@ -38,19 +42,26 @@ def ingest_faq_from_jsonl(file_path: str, collection_name: str = "ufsm_faqs"):
 
     if not docs:
         print("⚠️ Nenhum documento encontrado para ingestão.")
-        return
+        return {"message": "Nenhum documento encontrado para ingestão."}
+    if job:
+        job.progress(documentos=len(docs), etapa="embedding")
+        job.check()
 
     container = LangChainContainer()
     embeddings = container.embedding_model.embed_documents([doc.page_content for doc in docs])
     embedding_dim = len(embeddings[0])
+    if job:
+        job.progress(etapa="upload")
+        job.check()
 
-    print(f"🔧 Recriando coleção '{collection_name}' com dimensão {embedding_dim}...")
-    container.qdrant_client.recreate_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=embedding_dim, distance=Distance.COSINE)
-    )
-
-    container.set_collection(collection_name)
-    container.vectorstore.add_documents(docs)
+    print(f"🔧 Reconstruindo coleção '{collection_name}' com dimensão {embedding_dim}...")
+    # Reaproveita os embeddings já calculados em vez de reembedar via add_documents
+    points = document_points(docs, embeddings, [chunk_point_id(collection_name, doc.page_content) for doc in docs])
+    # Blue/green: a coleção atual segue respondendo até o alias trocar
+    vectors_config = VectorParams(size=embedding_dim, distance=Distance.COSINE)
+    with BlueGreenRebuild(container.qdrant_client, collection_name, vectors_config) as rebuild:
+        BulkUploader(container.qdrant_client).upload(rebuild.collection_name, points, wait=True)
+    container.invalidate_collection(collection_name)
 
     print(f"✅ {len(docs)} documentos FAQ ingeridos na coleção '{collection_name}'")
+    return {"message": f"{len(docs)} documentos FAQ ingeridos na coleção '{collection_name}'"}
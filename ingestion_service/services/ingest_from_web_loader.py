@@ -1,26 +1,28 @@
 import os
 import json
 import logging
-from urllib.parse import urljoin, urlparse
-import requests
+from urllib.parse import urlparse
 from flask import request, jsonify
-from bs4 import BeautifulSoup
 
 from services.ingestion_manager import IngestionManager
+from services.html_extraction import extract_html
+from services.page_archive import get_page_archive
 
 logger = logging.getLogger(__name__)
 
 
-def get_internal_links(base_url, max_links=20):
-    """Extração básica de links internos navegáveis a partir de uma URL."""
+def get_internal_links(base_url, max_links=None):
+    """
+    Extração básica de links internos navegáveis a partir de uma URL.
+    `max_links` vem de CRAWL_MAX_LINKS (20) quando não informado.
+    """
+    max_links = max_links or int(os.getenv("CRAWL_MAX_LINKS", 20))
     try:
-        response = requests.get(base_url, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
+        response = get_page_archive().fetch(base_url, timeout=10)
         base_domain = urlparse(base_url).netloc
 
         links = set()
-        for a in soup.find_all("a", href=True):
-            href = urljoin(base_url, a["href"])
+        for href in extract_html(response.text, base_url=base_url, links=True)["links"]:
             parsed = urlparse(href)
             if parsed.netloc == base_domain and href.startswith(base_url):
                 links.add(href)
@@ -42,7 +44,7 @@ def ingest_from_web_loader(request):
     if not url:
         return jsonify({"error": "URL obrigatória"}), 400
 
-    ingestion = IngestionManager(collection_name=collection)
+    ingestion = IngestionManager(collection_name=collection, replay=data.get("replay"))
     result, status = ingestion.ingest_url(url)
     return jsonify(result), status
 
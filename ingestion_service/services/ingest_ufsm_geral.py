@@ -5,6 +5,7 @@ from datetime import datetime
 from unidecode import unidecode
 import qdrant_client
 from shared.langchain_container import LangChainContainer
+from shared.collection_aliases import BlueGreenRebuild
 
 
 container = LangChainContainer()
@@ -49,10 +50,13 @@ def gerar_dataset_fine_tuning(cursos, frases, path="/app/data/ufsm_geral_dataset
     logging.info(f"📎 Dataset salvo com {len(prompts_respostas)} exemplos em `{path}`.")
 
 def ingest_ufsm_geral(course_list, collection_name="ufsm_geral_knowledge"):
-    frases = []
+    # Paráfrases da mesma informação formam um grupo: cada uma vira um ponto
+    # (uma pergunta pode estar perto de qualquer delas), todos com a primeira
+    # como texto, para que qualquer acerto recupere a mesma resposta
+    grupos = []
 
     for curso in course_list:
-        frases.extend([
+        grupos.append([
             f"A Universidade Federal de Santa Maria tem curso de {curso}.",
             f"{curso} é ofertado pela UFSM.",
             f"{curso} é um curso oferecido pela Universidade Federal de Santa Maria - UFSM.",
@@ -63,39 +67,41 @@ def ingest_ufsm_geral(course_list, collection_name="ufsm_geral_knowledge"):
         ])
 
     total_cursos = len(course_list)
-    frases.extend([
+    grupos.append([
         f"A quantidade de cursos da UFSM é {total_cursos}.",
         f"A Universidade Federal de Santa Maria ministra {total_cursos} cursos diferentes.",
         f"Atualmente a UFSM oferece {total_cursos} cursos de graduação.",
         f"No total, são {total_cursos} cursos oferecidos pela UFSM."
     ])
 
-    embeddings = embedding_model.encode(frases)
-    logging.info(f"🧠 Ingerindo {len(frases)} frases em {collection_name}...")
-
-    client.recreate_collection(
-        collection_name=collection_name,
-        vectors_config=qdrant_client.http.models.VectorParams(
-            size=384,
-            distance=qdrant_client.http.models.Distance.COSINE
-        )
-    )
+    frases = [frase for grupo in grupos for frase in grupo]
+    embeddings = embedding_model.embed_documents(frases)
+    logging.info(f"🧠 Ingerindo {len(frases)} frases ({len(grupos)} respostas) em {collection_name}...")
 
+    variantes = [(g, grupo[0], frase) for g, grupo in enumerate(grupos) for frase in grupo]
     points = [
         qdrant_client.http.models.PointStruct(
             id=i,
-            vector=embedding.tolist(),
+            vector=list(embedding),
             payload={
-                "text": frase,
-                "normalized_text": unidecode(frase),
+                "text": resposta,
+                "normalized_text": unidecode(resposta),
+                "variante": frase,
+                "grupo": g,
                 "categoria": "geral",
                 "timestamp": datetime.now().isoformat()
             }
         )
-        for i, (frase, embedding) in enumerate(zip(frases, embeddings))
+        for i, ((g, resposta, frase), embedding) in enumerate(zip(variantes, embeddings))
     ]
 
-    client.upsert(collection_name=collection_name, points=points)
+    # Blue/green: a coleção atual segue respondendo até o alias trocar
+    vectors_config = qdrant_client.http.models.VectorParams(
+        size=len(embeddings[0]),
+        distance=qdrant_client.http.models.Distance.COSINE
+    )
+    with BlueGreenRebuild(client, collection_name, vectors_config) as rebuild:
+        client.upsert(collection_name=rebuild.collection_name, points=points)
     gerar_dataset_fine_tuning(course_list, frases)
 
     return len(frases), collection_name
\ No newline at end of file
@@ -8,24 +8,47 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import UnstructuredURLLoader, PlaywrightURLLoader
 from shared.langchain_container import LangChainContainer
+from shared.collection_versions import bump_collection
+from services.page_archive import get_page_archive
 
 logger = logging.getLogger(__name__)
 
 
 class IngestionManager:
-    def __init__(self, collection_name="web_geral_loader", chunk_size=800, chunk_overlap=100):
+    def __init__(self, collection_name="web_geral_loader", chunk_size=800, chunk_overlap=100, replay=None):
         self.container = LangChainContainer()
         self.client = self.container.qdrant_client
         self.embedding_model = self.container.embedding_model
         self.vectorstore = self.container.vectorstore
         self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         self.collection_name = collection_name
+        self.archive = get_page_archive()
+        self.replay = replay
         self.skipped_docs = []
         self.log_dir = Path("logs/ingest")
         self.log_dir.mkdir(parents=True, exist_ok=True)
 
+    @staticmethod
+    def _documents_from_html(url, html):
+        """Mesmo resultado do UnstructuredURLLoader (modo single), a partir do HTML já baixado."""
+        from unstructured.partition.html import partition_html
+        elements = partition_html(text=html)
+        return [Document(page_content="\n\n".join(str(el) for el in elements), metadata={"source": url})]
+
     def load_url(self, url):
+        if self.archive.replaying(self.replay):
+            archived = self.archive.fetch(url, replay=True)
+            if archived.status_code != 200:
+                raise RuntimeError(f"🛑 URL não está no arquivo local: {url}")
+            logger.info(f"🗄️ Lendo do arquivo local: {url}")
+            return self._documents_from_html(url, archived.text), "archive"
         try:
+            if self.archive.recording:
+                # Baixa pelo arquivo (grava o HTML) e particiona localmente
+                logger.info(f"🌐 Trying unstructured (arquivando): {url}")
+                response = self.archive.fetch(url)
+                response.raise_for_status()
+                return self._documents_from_html(url, response.text), "unstructured"
             logger.info(f"🌐 Trying UnstructuredURLLoader: {url}")
             loader = UnstructuredURLLoader(urls=[url])
             return loader.load(), "unstructured"
@@ -74,6 +97,7 @@ class IngestionManager:
                 raise RuntimeError("Vectorstore não foi inicializado corretamente.")
     
             vectorstore.add_documents(chunks)
+            bump_collection(self.collection_name)
             self._save_skipped_log()
     
             return {
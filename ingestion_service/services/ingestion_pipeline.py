@@ -0,0 +1,456 @@
+import os
+import json
+import time
+import queue
+import logging
+import itertools
+import threading
+from qdrant_client.http.models import PointStruct, PointIdsList
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from shared.point_ids import chunk_point_id, content_hash
+from shared.collection_versions import bump_collection
+from services.dedup import NearDuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class IngestionPipeline:
+    """
+    Pipeline de ingestão em estágios ligados por filas limitadas:
+
+        páginas -> split -> embedding em lotes -> upsert em lotes no Qdrant
+
+    Cada estágio roda na sua própria thread, então o download das páginas
+    (feito por quem chama `add_page`) sobrepõe o embedding e o upsert. As filas
+    limitadas mantêm a memória constante: se o Qdrant ou a OpenAI ficarem para
+    trás, `add_page` bloqueia até liberar espaço.
+
+    O progresso é gravado por lote em `checkpoint_path` (uma fonte por linha,
+    quando todos os seus chunks já estão no Qdrant). Se a execução cair no meio,
+    a próxima pode pular as fontes já gravadas via `done_sources()`; ao terminar
+    sem falhas o checkpoint é removido.
+
+    Os pontos têm ID determinístico (fonte + texto do chunk). Com um `state`
+    (IngestionStateStore) a ingestão fica incremental: páginas com o mesmo hash
+    de conteúdo são puladas, só chunks novos recebem embedding e os chunks que
+    sumiram da página são apagados depois que os novos foram gravados.
+
+    Com um `budget` (CrawlBudget) os tokens dos chunks que vão para embedding
+    são contabilizados nele, para o crawl parar ao atingir `max_tokens`.
+
+    Com `dedup` (INGEST_DEDUP, ligado por padrão), chunks idênticos a um já
+    visto na execução (boilerplate repetido entre páginas), ou quase idênticos
+    sem diferença de números ou nomes próprios, não são embedados nem gravados:
+    a fonte deles entra na lista `metadata.sources` do chunk que ficou.
+    Os `chunk_ids` da página descartada guardam o ID desse chunk, e um chunk
+    antigo só é apagado quando nenhuma outra página ainda o referencia; se ele
+    fica, a página que deixou de tê-lo sai de `sources` (e de `source`).
+    """
+
+    def __init__(
+        self,
+        container,
+        collection_name: str,
+        splitter=None,
+        batch_size: int = None,
+        embed_workers: int = None,
+        queue_size: int = None,
+        max_retries: int = None,
+        checkpoint_path: str = None,
+        state=None,
+        budget=None,
+        dedup: bool = None,
+    ):
+        self.container = container
+        self.collection_name = collection_name
+        self.splitter = splitter or RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=64)
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", 64))
+        self.embed_workers = embed_workers or int(os.getenv("INGEST_EMBED_WORKERS", 2))
+        self.queue_size = queue_size or int(os.getenv("INGEST_QUEUE_SIZE", 8))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("INGEST_MAX_RETRIES", 3))
+        self.checkpoint_path = checkpoint_path
+        self.state = state
+        self.budget = budget
+        if dedup is None:
+            dedup = os.getenv("INGEST_DEDUP", "true").lower() == "true"
+        self.dedup = NearDuplicateIndex() if dedup else None
+        self._merged = {}
+        # ID do chunk mantido -> fontes que deixaram de contê-lo
+        self._released = {}
+
+        self._pages = queue.Queue(maxsize=self.queue_size * 4)
+        self._batches = queue.Queue(maxsize=self.queue_size)
+        self._embedded = queue.Queue(maxsize=self.queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        # Páginas em andamento, por token (a mesma URL pode entrar duas vezes)
+        self._pending = {}
+        self._tokens = itertools.count()
+        self._started_at = None
+        self.stats = {
+            "pages": 0, "unchanged": 0, "chunks": 0, "reused": 0, "embedded": 0,
+            "upserted": 0, "deleted": 0, "failed": 0, "batches": 0, "duplicates": 0,
+        }
+
+    # ------------------------------------------------------------ lifecycle
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        # Garante a coleção antes de começar a gravar
+        self.container.set_collection(self.collection_name)
+        self._started_at = time.monotonic()
+        self._threads = [threading.Thread(target=self._split_loop, daemon=True)]
+        self._threads += [threading.Thread(target=self._embed_loop, daemon=True) for _ in range(self.embed_workers)]
+        self._threads.append(threading.Thread(target=self._upsert_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def add_page(self, content: str, metadata: dict, page_state: dict = None, chunks: list = None):
+        """
+        Enfileira uma página para split/embedding/upsert (bloqueia se o pipeline estiver cheio).
+        `page_state` (etag, last_modified, lastmod) é gravado no `state` quando a página termina.
+        `chunks` já divididos (ex: pelo ParsePool) dispensam o splitter.
+        """
+        if content:
+            self._pages.put((content, metadata, page_state or {}, chunks))
+
+    def touch_page(self, source: str, page_state: dict):
+        """Registra uma página não modificada (ex: HTTP 304) sem passar pelo pipeline."""
+        with self._lock:
+            self.stats["unchanged"] += 1
+        if self.state:
+            self.state.update(self.collection_name, source, **page_state)
+        self._commit([source])
+
+    def close(self) -> dict:
+        """Drena todos os estágios e retorna as estatísticas da execução."""
+        if not self._threads:
+            return self.stats
+        split_thread, *embed_threads, upsert_thread = self._threads
+        self._pages.put(_STOP)
+        split_thread.join()
+        for _ in embed_threads:
+            self._batches.put(_STOP)
+        for thread in embed_threads:
+            thread.join()
+        self._embedded.put(_STOP)
+        upsert_thread.join()
+        self._threads = []
+        self._merge_sources()
+        self._release_sources()
+        if self.stats["upserted"] or self.stats["deleted"]:
+            bump_collection(self.collection_name)
+
+        if self.checkpoint_path and not self.stats["failed"] and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        elapsed = time.monotonic() - (self._started_at or time.monotonic())
+        logger.info(f"✅ Pipeline `{self.collection_name}`: {self.stats} em {elapsed:.1f}s")
+        return self.stats
+
+    # ------------------------------------------------------------ checkpoint
+    def done_sources(self) -> set:
+        """Fontes já gravadas por uma execução anterior interrompida."""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return {json.loads(line)["source"] for line in f if line.strip()}
+
+    def _commit(self, sources):
+        if not self.checkpoint_path or not sources:
+            return
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        with self._lock, open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            for source in sources:
+                f.write(json.dumps({"source": source}, ensure_ascii=False) + "\n")
+
+    # ---------------------------------------------------------------- stages
+    def _split_loop(self):
+        batch = []
+        while True:
+            item = self._pages.get()
+            if item is _STOP:
+                break
+            try:
+                new = self._split_page(*item)
+            except Exception as e:
+                # Uma página com erro não pode derrubar a thread: add_page/close
+                # ficariam bloqueados na fila
+                logger.error(f"❌ Página {item[1].get('source')} descartada: {e}")
+                with self._lock:
+                    self.stats["failed"] += 1
+                continue
+            for chunk in new:
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    self._batches.put(batch)
+                    batch = []
+        if batch:
+            self._batches.put(batch)
+
+    def _split_page(self, content, metadata, page_state, presplit) -> list:
+        """Divide a página e registra o que falta gravar; retorna os chunks novos `(token, id, doc)`."""
+        source = metadata.get("source")
+        page_hash = content_hash(content)
+        previous = self.state.get(self.collection_name, source) if self.state else None
+        if previous and previous["content_hash"] == page_hash:
+            self.touch_page(source, page_state)
+            return []
+        if presplit is not None:
+            docs = [Document(page_content=chunk, metadata=dict(metadata)) for chunk in presplit]
+        else:
+            docs = self.splitter.create_documents([content], metadatas=[metadata])
+
+        # Chunks repetidos na mesma página viram um único ponto
+        chunks = {chunk_point_id(source, doc.page_content): doc for doc in docs}
+        # Chunks descartados como cópia: a página passa a depender do ponto que ficou
+        references = self._deduplicate(source, chunks) if self.dedup else []
+        known = set(previous["chunk_ids"]) if previous else set()
+        token = next(self._tokens)
+        new = [(token, point_id, doc) for point_id, doc in chunks.items() if point_id not in known]
+        chunk_ids = list(chunks) + [point_id for point_id in dict.fromkeys(references) if point_id not in chunks]
+        if self.budget is not None:
+            self.budget.add_tokens(sum(self._count_tokens(doc.page_content) for _, _, doc in new))
+        with self._lock:
+            self.stats["pages"] += 1
+            self.stats["chunks"] += len(new)
+            self.stats["reused"] += len(chunks) - len(new)
+            self.stats["duplicates"] += len(references)
+            self._pending[token] = {
+                "source": source,
+                "remaining": len(new),
+                "stale": known - set(chunk_ids),
+                "record": {**page_state, "content_hash": page_hash, "chunk_ids": chunk_ids},
+            }
+        if not new:
+            self._finish(token)
+        return new
+
+    def _deduplicate(self, source, chunks) -> list:
+        """Tira de `chunks` as cópias de chunks já vistos na execução; retorna os IDs dos que ficaram."""
+        references = []
+        for point_id, doc in list(chunks.items()):
+            canonical = self.dedup.find_or_add(doc.page_content, (point_id, source))
+            # A mesma página pode aparecer de novo na execução: o ponto é o mesmo
+            if canonical is None or canonical[0] == point_id:
+                continue
+            del chunks[point_id]
+            canonical_id, canonical_source = canonical
+            references.append(canonical_id)
+            if canonical_source != source:
+                with self._lock:
+                    self._merged.setdefault(canonical_id, set()).add(source)
+        return references
+
+    def _rewrite_metadata(self, point_ids, update, what) -> int:
+        """
+        Aplica `update(metadata, point_id)` aos chunks; quando ele devolve um
+        metadata novo, grava no Qdrant. Retorna quantos chunks mudaram.
+        """
+        client = self.container.qdrant_client
+        metadata_key = self.container.get_chain(self.collection_name)["vectorstore"].metadata_payload_key
+        ids = list(point_ids)
+        found = 0
+        for start in range(0, len(ids), 256):
+            try:
+                records = self._with_retries(
+                    lambda: client.retrieve(self.collection_name, ids=ids[start:start + 256], with_payload=True),
+                    f"leitura dos chunks ({what})",
+                )
+                for record in records:
+                    metadata = update(dict((record.payload or {}).get(metadata_key) or {}), str(record.id))
+                    if metadata is None:
+                        continue
+                    self._with_retries(
+                        lambda: client.set_payload(self.collection_name, payload={metadata_key: metadata}, points=[record.id]),
+                        what,
+                    )
+                    found += 1
+            except Exception as e:
+                logger.error(f"❌ Falha em {what}: {e}")
+        return found
+
+    def _merge_sources(self):
+        """Grava em `metadata.sources` dos chunks que ficaram as fontes das cópias descartadas."""
+        if not self._merged:
+            return
+
+        def merge(metadata, point_id):
+            sources = metadata.get("sources") or [metadata.get("source")]
+            merged = sorted(self._merged[point_id] - set(sources))
+            if not merged:
+                return None
+            return {**metadata, "sources": [s for s in sources if s] + merged}
+
+        found = self._rewrite_metadata(self._merged, merge, "mescla das fontes")
+        logger.info(f"🧬 {self.stats['duplicates']} chunks duplicados descartados; fontes mescladas em {found} chunks")
+        self._merged = {}
+
+    def _release_sources(self):
+        """Tira de `sources`/`source` dos chunks mantidos as páginas que deixaram de contê-los."""
+        if not self._released:
+            return
+
+        def release(metadata, point_id):
+            gone = self._released[point_id]
+            sources = [s for s in (metadata.get("sources") or [metadata.get("source")]) if s]
+            remaining = [s for s in sources if s not in gone]
+            if remaining == sources and metadata.get("source") not in gone:
+                return None
+            # Sem outra fonte conhecida o chunk fica como está
+            if not remaining:
+                return None
+            source = metadata.get("source")
+            return {**metadata, "sources": remaining, "source": source if source in remaining else remaining[0]}
+
+        found = self._rewrite_metadata(self._released, release, "remoção de fontes")
+        logger.info(f"🧬 Fontes antigas removidas de {found} chunks compartilhados")
+        self._released = {}
+
+    def _count_tokens(self, text: str) -> int:
+        executor = getattr(self.container, "embedding_executor", None)
+        if executor is not None:
+            return executor.count_tokens(text)
+        return max(1, len(text) // 4)
+
+    def _with_retries(self, fn, what):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = 2 ** attempt
+                logger.warning(f"⚠️ Falha em {what} (tentativa {attempt + 1}): {e}; nova tentativa em {wait}s")
+                time.sleep(wait)
+
+    def _embed_loop(self):
+        embeddings = self.container.embedding_model
+        while True:
+            batch = self._batches.get()
+            if batch is _STOP:
+                break
+            texts = [doc.page_content for _, _, doc in batch]
+            try:
+                vectors = self._with_retries(lambda: embeddings.embed_documents(texts), "embedding")
+            except Exception as e:
+                logger.error(f"❌ Lote de {len(batch)} chunks descartado no embedding: {e}")
+                self._fail(batch)
+                continue
+            with self._lock:
+                self.stats["embedded"] += len(batch)
+            self._embedded.put((batch, vectors))
+
+    def _upsert_loop(self):
+        vectorstore = self.container.get_chain(self.collection_name)["vectorstore"]
+        client = self.container.qdrant_client
+        while True:
+            item = self._embedded.get()
+            if item is _STOP:
+                break
+            batch, vectors = item
+            # Mesmo formato de payload do vectorstore do LangChain (page_content/metadata)
+            points = [
+                PointStruct(
+                    id=point_id,
+                    vector={vectorstore.vector_name: vector} if vectorstore.vector_name else vector,
+                    payload={
+                        vectorstore.content_payload_key: doc.page_content,
+                        vectorstore.metadata_payload_key: doc.metadata,
+                    },
+                )
+                for (_, point_id, doc), vector in zip(batch, vectors)
+            ]
+            try:
+                self._with_retries(
+                    lambda: client.upsert(collection_name=self.collection_name, points=points),
+                    "upsert",
+                )
+            except Exception as e:
+                logger.error(f"❌ Lote de {len(batch)} chunks descartado no upsert: {e}")
+                self._fail(batch)
+                continue
+            with self._lock:
+                self.stats["upserted"] += len(batch)
+                self.stats["batches"] += 1
+            for token in self._settle(batch):
+                self._finish(token)
+            logger.debug(f"📦 {self.stats['upserted']}/{self.stats['chunks']} chunks gravados")
+
+    def _settle(self, batch):
+        """Desconta os chunks gravados e retorna os tokens das páginas que ficaram completas."""
+        done = []
+        with self._lock:
+            for token, _, _ in batch:
+                pending = self._pending.get(token)
+                # Página já descartada por falha em outro lote
+                if pending is None:
+                    continue
+                pending["remaining"] -= 1
+                if pending["remaining"] == 0:
+                    done.append(token)
+        return done
+
+    def _finish(self, token):
+        """Página completa no Qdrant: apaga chunks antigos, grava o estado e o checkpoint."""
+        with self._lock:
+            pending = self._pending.pop(token)
+        try:
+            self._complete(pending)
+        except Exception as e:
+            # Sem estado nem checkpoint: a próxima execução refaz a página
+            logger.error(f"❌ Falha ao concluir {pending['source']}: {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+
+    def _complete(self, pending):
+        source = pending["source"]
+        with self._lock:
+            # Páginas ainda em andamento nesta execução também seguram seus pontos
+            in_flight = {point_id for other in self._pending.values() for point_id in other["record"]["chunk_ids"]}
+        kept = {point_id for point_id in pending["stale"] if point_id in in_flight}
+        stale = [point_id for point_id in pending["stale"] if point_id not in in_flight]
+        if stale and self.state:
+            shared = self.state.referenced(self.collection_name, stale, exclude=source)
+            if shared:
+                logger.info(f"🧬 {len(shared)} chunks antigos de {source} mantidos: outras páginas ainda os usam")
+                stale = [point_id for point_id in stale if point_id not in shared]
+                kept |= shared
+        if stale:
+            try:
+                self._with_retries(
+                    lambda: self.container.qdrant_client.delete(
+                        collection_name=self.collection_name,
+                        points_selector=PointIdsList(points=stale),
+                    ),
+                    "remoção de chunks antigos",
+                )
+            except Exception as e:
+                # Sem atualizar o estado: a próxima execução tenta de novo
+                logger.error(f"❌ Falha ao remover {len(stale)} chunks antigos de {source}: {e}")
+                return
+            with self._lock:
+                self.stats["deleted"] += len(stale)
+        with self._lock:
+            # Outra versão da mesma página pode ter voltado a usar um chunk liberado
+            for point_id in pending["record"]["chunk_ids"]:
+                self._released.get(point_id, set()).discard(source)
+            for point_id in kept:
+                self._released.setdefault(point_id, set()).add(source)
+        if self.state:
+            self.state.update(self.collection_name, source, **pending["record"])
+        self._commit([source])
+
+    def _fail(self, batch):
+        with self._lock:
+            self.stats["failed"] += len(batch)
+            for token, _, _ in batch:
+                # Página com chunk perdido não entra no checkpoint nem no estado
+                self._pending.pop(token, None)
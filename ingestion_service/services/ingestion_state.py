@@ -0,0 +1,120 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+STATE_PATH = os.getenv("INGESTION_STATE_PATH", "logs/ingestion_state.sqlite3")
+
+
+class IngestionStateStore:
+    """
+    Estado por URL das ingestões incrementais (SQLite em `logs/`).
+
+    Para cada (coleção, url) guarda ETag, Last-Modified, o `lastmod` do sitemap,
+    o hash do conteúdo extraído e os IDs dos chunks gravados no Qdrant. Com isso
+    as ingestões pulam páginas inalteradas (sem download ou sem embedding) e
+    removem só os chunks que deixaram de existir.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or STATE_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                collection TEXT NOT NULL,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                lastmod TEXT,
+                content_hash TEXT,
+                chunk_ids TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (collection, url)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, collection: str, url: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, lastmod, content_hash, chunk_ids FROM pages WHERE collection = ? AND url = ?",
+                (collection, url),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "lastmod": row[2],
+            "content_hash": row[3],
+            "chunk_ids": json.loads(row[4]) if row[4] else [],
+        }
+
+    def unchanged_in_sitemap(self, collection: str, url: str, lastmod: str) -> bool:
+        """True se o `lastmod` do sitemap é o mesmo da última ingestão (nem precisa baixar)."""
+        state = self.get(collection, url)
+        return bool(lastmod and state and state["lastmod"] == lastmod and state["content_hash"])
+
+    def conditional_headers(self, collection: str, url: str) -> dict:
+        """Cabeçalhos If-None-Match / If-Modified-Since para um GET condicional."""
+        state = self.get(collection, url) or {}
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    def update(self, collection: str, url: str, **fields):
+        """Atualiza (ou cria) o estado da URL; só os campos informados são alterados."""
+        current = self.get(collection, url) or {}
+        current.update({k: v for k, v in fields.items() if v is not None})
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO pages
+                    (collection, url, etag, last_modified, lastmod, content_hash, chunk_ids, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    collection,
+                    url,
+                    current.get("etag"),
+                    current.get("last_modified"),
+                    current.get("lastmod"),
+                    current.get("content_hash"),
+                    json.dumps(current.get("chunk_ids") or []),
+                    datetime.now().isoformat(),
+                ),
+            )
+            self._conn.commit()
+
+    def referenced(self, collection: str, point_ids, exclude: str = None) -> set:
+        """IDs de `point_ids` que ainda constam nos `chunk_ids` de outra URL da coleção."""
+        found = set()
+        with self._lock:
+            for point_id in point_ids:
+                row = self._conn.execute(
+                    "SELECT 1 FROM pages WHERE collection = ? AND url != ? AND instr(chunk_ids, ?) > 0 LIMIT 1",
+                    (collection, exclude or "", json.dumps(str(point_id))),
+                ).fetchone()
+                if row:
+                    found.add(point_id)
+        return found
+
+    def forget_collection(self, collection: str):
+        """Descarta o estado de uma coleção (ex: quando ela é apagada ou recriada)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE collection = ?", (collection,))
+            self._conn.commit()
+
+
+def http_state(headers: dict) -> dict:
+    """Extrai ETag/Last-Modified de cabeçalhos de resposta HTTP."""
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    return {"etag": headers.get("etag"), "last_modified": headers.get("last-modified")}
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOBS_PATH = os.getenv("INGEST_JOBS_PATH", "logs/jobs.sqlite3")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Levantada por `JobContext.check()` quando o job recebeu pedido de cancelamento."""
+
+
+class JobContext:
+    """
+    Handle passado às funções de ingestão que rodam como job.
+
+    `progress(**contadores)` publica o progresso (gravação limitada a ~1/s) e
+    `cancelled`/`cancel_event` sinalizam o pedido de cancelamento; a função
+    decide onde parar e o que entregar até ali.
+    """
+
+    def __init__(self, manager, job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self._progress = {}
+        self._saved_at = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def progress(self, force: bool = False, **counts):
+        self._progress.update(counts)
+        now = time.monotonic()
+        if force or now - self._saved_at >= 1.0:
+            self._saved_at = now
+            self.manager._update(self.job_id, progress=json.dumps(self._progress, ensure_ascii=False, default=str))
+
+
+def _to_jsonable(result):
+    """Converte o retorno das funções de ingestão (dict, Response ou (Response, status))."""
+    status = None
+    if isinstance(result, tuple):
+        result, status = result[0], result[1]
+    if hasattr(result, "get_json"):
+        result = result.get_json(silent=True)
+    if status is not None and isinstance(status, int) and status >= 400:
+        raise RuntimeError(json.dumps(result, ensure_ascii=False, default=str))
+    return result
+
+
+class JobManager:
+    """
+    Fila de jobs de ingestão em segundo plano, com estado em SQLite (`logs/`).
+
+    `submit` devolve o ID na hora e a função roda num pool de threads
+    (`INGEST_JOB_WORKERS`), dentro do app context do Flask. O estado (status,
+    progresso, resultado, erro) sobrevive a reinícios; jobs que estavam rodando
+    quando o processo caiu são marcados como falhos na inicialização.
+    """
+
+    def __init__(self, path: str = None, max_workers: int = None):
+        self.path = path or JOBS_PATH
+        self.max_workers = max_workers or int(os.getenv("INGEST_JOB_WORKERS", 2))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                params TEXT,
+                status TEXT NOT NULL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created_at TEXT,
+                started_at TEXT,
+                finished_at TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrompido por reinício do serviço", datetime.now().isoformat(), QUEUED, RUNNING),
+        )
+        self._conn.commit()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest-job")
+        self._running = {}
+
+    # ----------------------------------------------------------------- estado
+    def _update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    @staticmethod
+    def _row_to_dict(row) -> dict:
+        keys = ("id", "name", "params", "status", "progress", "result", "error", "created_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        for key in ("params", "progress", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, limit: int = 50, status: str = None) -> list:
+        query, args = "SELECT * FROM jobs", []
+        if status:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    # --------------------------------------------------------------- execução
+    def submit(self, name: str, fn, app=None, **params) -> str:
+        """
+        Enfileira `fn(job=JobContext, **params)` e retorna o ID do job.
+        `app` (Flask) dá o app context para funções que usam `jsonify`.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, name, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, name, json.dumps(params, ensure_ascii=False, default=str), QUEUED, datetime.now().isoformat()),
+            )
+            self._conn.commit()
+        context = JobContext(self, job_id)
+        future = self._executor.submit(self._run, job_id, name, fn, app, context, params)
+        with self._lock:
+            self._running[job_id] = (future, context)
+        logger.info(f"🗂️ Job `{name}` enfileirado: {job_id}")
+        return job_id
+
+    def _run(self, job_id, name, fn, app, context, params):
+        if context.cancelled:
+            self._finish(job_id, CANCELLED, context)
+            return
+        self._update(job_id, status=RUNNING, started_at=datetime.now().isoformat())
+        logger.info(f"▶️ Job `{name}` iniciado: {job_id}")
+        try:
+            if app is not None:
+                with app.app_context():
+                    result = _to_jsonable(fn(job=context, **params))
+            else:
+                result = _to_jsonable(fn(job=context, **params))
+        except JobCancelled:
+            self._finish(job_id, CANCELLED, context)
+        except Exception as e:
+            logger.exception(f"❌ Job `{name}` falhou: {job_id}")
+            self._finish(job_id, FAILED, context, error=str(e))
+        else:
+            # A função pode ter parado cedo por cancelamento e devolvido o parcial
+            self._finish(job_id, CANCELLED if context.cancelled else SUCCEEDED, context, result=result)
+
+    def _finish(self, job_id, status, context, result=None, error=None):
+        context.progress(force=True)
+        self._update(
+            job_id,
+            status=status,
+            result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+            error=error,
+            finished_at=datetime.now().isoformat(),
+        )
+        with self._lock:
+            self._running.pop(job_id, None)
+        logger.info(f"⏹️ Job {job_id}: {status}")
+
+    def cancel(self, job_id: str) -> bool:
+        """Pede o cancelamento; jobs na fila nem começam, os em execução param no próximo ponto de checagem."""
+        with self._lock:
+            entry = self._running.get(job_id)
+        if entry is None:
+            return False
+        future, context = entry
+        context.cancel_event.set()
+        if future.cancel():
+            self._finish(job_id, CANCELLED, context)
+        return True
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -2,7 +2,7 @@ import os
 import logging
 from flask import request, jsonify
 from datetime import datetime
-from utils.vector_store import recreate_and_upsert
+from utils.vector_store import upsert_sentences
 from shared.langchain_container import LangChainContainer
 
 
@@ -19,19 +19,21 @@ def ingest_manual(flask_request):
 
         text = data["text"]
         collection = data.get("collection", "mlops_knowledge")
+        recreate = bool(data.get("recreate", False))
 
         sentences = [s.strip() for s in text.split(". ") if len(s.strip()) >= 40]
         if not sentences:
             return jsonify({"error": "Nenhuma sentença válida encontrada no texto"}), 400
 
-        embeddings = embedding_model.encode(sentences)
+        embeddings = embedding_model.embed_documents(sentences)
         metadata = [{"source": "manual", "timestamp": datetime.now().isoformat()} for _ in sentences]
 
-        recreate_and_upsert(
+        upsert_sentences(
             collection_name=collection,
             sentences=sentences,
             embeddings=embeddings,
-            metadata=metadata
+            metadata=metadata,
+            recreate=recreate
         )
 
         logging.info(f"✅ Ingestão manual concluída na coleção `{collection}` com {len(sentences)} sentenças.")
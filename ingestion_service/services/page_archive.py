@@ -0,0 +1,173 @@
+import os
+import re
+import gzip
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from services import http_fetch
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PATH = os.getenv("PAGE_ARCHIVE_PATH", "logs/pages")
+
+# off: nem grava nem lê | record: grava tudo que for baixado | replay: lê só do arquivo
+MODES = ("off", "record", "replay")
+
+
+def _decode(content: bytes, headers: dict) -> str:
+    content_type = next((value for key, value in headers.items() if key.lower() == "content-type"), "")
+    match = re.search(r"charset=([\w-]+)", content_type, re.I)
+    try:
+        return content.decode(match.group(1) if match else "utf-8", errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+
+class ArchivedResponse:
+    """Resposta lida do arquivo, com a mesma interface usada de `requests.Response`."""
+
+    def __init__(self, url: str, status_code: int, content: bytes = b"", headers: dict = None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.text = _decode(content, self.headers)
+
+
+class PageArchive:
+    """
+    Arquivo local das páginas baixadas, endereçado por conteúdo.
+
+    Cada corpo é gravado uma vez, comprimido, em `objects/<sha256[:2]>/<sha256>.gz`;
+    um índice SQLite liga cada URL à versão mais recente (status, cabeçalhos,
+    data). Páginas iguais em URLs diferentes ocupam um único arquivo.
+
+    No modo `replay` a ingestão lê daqui em vez da rede: experimentos de
+    chunking/metadados/reindexação rodam na velocidade do disco e offline.
+    O modo padrão vem de `PAGE_ARCHIVE_MODE` (`record`); as funções de ingestão
+    aceitam `replay=True/False` para sobrepor por chamada.
+    """
+
+    def __init__(self, path: str = None, mode: str = None):
+        self.path = path or ARCHIVE_PATH
+        self.mode = mode or os.getenv("PAGE_ARCHIVE_MODE", "record")
+        if self.mode not in MODES:
+            raise ValueError(f"PAGE_ARCHIVE_MODE inválido: {self.mode} (use {', '.join(MODES)})")
+        os.makedirs(os.path.join(self.path, "objects"), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT,
+                fetched_at TEXT
+            )
+            """
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "index.sqlite3"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, "objects", digest[:2], f"{digest}.gz")
+
+    # ------------------------------------------------------------------ modo
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def replaying(self, replay: bool = None) -> bool:
+        return self.mode == "replay" if replay is None else replay
+
+    # --------------------------------------------------------------- leitura
+    def get(self, url: str):
+        """Última versão arquivada da URL: `{"url", "status", "content", "headers", "fetched_at"}` ou None."""
+        row = self._conn().execute(
+            "SELECT sha256, status, headers, fetched_at FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if not row:
+            return None
+        digest, status, headers, fetched_at = row
+        try:
+            with gzip.open(self._object_path(digest), "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            logger.warning(f"⚠️ Objeto {digest} de {url} sumiu do arquivo")
+            return None
+        return {
+            "url": url,
+            "status": status,
+            "content": content,
+            "headers": json.loads(headers) if headers else {},
+            "fetched_at": fetched_at,
+        }
+
+    def urls(self, prefix: str = None) -> list:
+        query, args = "SELECT url FROM pages", ()
+        if prefix:
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query, args = query + " WHERE url LIKE ? ESCAPE '\\'", (escaped + "%",)
+        return [row[0] for row in self._conn().execute(query + " ORDER BY url", args)]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    # --------------------------------------------------------------- escrita
+    def put(self, url: str, content: bytes, headers: dict = None, status: int = 200):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp, "wb", compresslevel=6) as f:
+                f.write(content)
+            os.replace(tmp, path)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, sha256, status, headers, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, digest, status, json.dumps(dict(headers or {}), ensure_ascii=False), datetime.now().isoformat()),
+            )
+
+    # ----------------------------------------------------------------- fetch
+    def fetch(self, url: str, headers: dict = None, timeout: float = 10, replay: bool = None):
+        """
+        GET passando pelo arquivo: em replay lê do disco (404 se a URL não foi
+        arquivada; cabeçalhos condicionais são ignorados), senão baixa pela
+        sessão compartilhada de `http_fetch` e, no modo `record`, arquiva as
+        respostas 200.
+        """
+        if self.replaying(replay):
+            archived = self.get(url)
+            if not archived:
+                return ArchivedResponse(url, 404)
+            return ArchivedResponse(url, archived["status"], archived["content"], archived["headers"])
+        response = http_fetch.get(url, headers=headers, timeout=timeout)
+        if self.recording and response.status_code == 200:
+            self.put(url, response.content, dict(response.headers))
+        return response
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_page_archive() -> PageArchive:
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive()
+        return _archive
@@ -0,0 +1,112 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from services.html_extraction import extract_html
+
+logger = logging.getLogger(__name__)
+
+# Um splitter por processo filho, reaproveitado entre as páginas
+_splitters = {}
+
+
+def _splitter(chunk_size: int, chunk_overlap: int):
+    key = (chunk_size, chunk_overlap)
+    if key not in _splitters:
+        _splitters[key] = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return _splitters[key]
+
+
+def parse_and_split(html: str, min_paragraph: int = 50, chunk_size: int = 512, chunk_overlap: int = 64):
+    """Extrai o texto da página e divide em chunks; retorna `(titulo, conteudo, chunks)`."""
+    page = extract_html(html, min_paragraph=min_paragraph)
+    chunks = _splitter(chunk_size, chunk_overlap).split_text(page["text"]) if page["text"] else []
+    return page["title"], page["text"], chunks
+
+
+# Processos compartilhados por todos os jobs do serviço (criados uma vez)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def shared_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool de processos do serviço, criado no primeiro uso com `workers` processos
+    e reaproveitado por todos os jobs seguintes.
+
+    Os processos nascem por `spawn` (`PARSE_START_METHOD`, ou `forkserver`), não
+    por fork: o serviço já tem threads (Flask, jobs, pipeline) e um fork herdaria
+    locks segurados por elas. Cada processo reimporta o `__main__` (`main.py`),
+    que por isso só monta o app e os serviços dentro de `create_app()`.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context(os.getenv("PARSE_START_METHOD", "spawn"))
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            # O primeiro submit cria todos os processos
+            _executor.submit(int).result()
+            logger.info(f"🧮 Pool de parse com {workers} processos ({context.get_start_method()})")
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def default_workers() -> int:
+    """`PARSE_WORKERS` ou o número de núcleos disponíveis para o processo."""
+    if os.getenv("PARSE_WORKERS") is not None:
+        return int(os.getenv("PARSE_WORKERS"))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class ParsePool:
+    """
+    Estágio de parse + chunking em processos, fora do GIL.
+
+    O download continua em threads/asyncio; quem baixou chama `parse(html)`, que
+    bloqueia só aquela thread enquanto um processo do pool extrai o texto e
+    divide em chunks. Com `workers` (PARSE_WORKERS, padrão = núcleos) igual a 0
+    o trabalho roda na própria thread, sem pool.
+
+    Os processos vêm de `shared_executor()`: sobem no primeiro `start()` do
+    serviço e continuam vivos entre os jobs; `close()` só solta a referência.
+    """
+
+    def __init__(self, workers: int = None, min_paragraph: int = 50, chunk_size: int = 512, chunk_overlap: int = 64):
+        self.workers = workers if workers is not None else default_workers()
+        self.min_paragraph = min_paragraph
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        if self.workers > 0 and self._executor is None:
+            self._executor = shared_executor(self.workers)
+        return self
+
+    def close(self):
+        self._executor = None
+
+    def parse(self, html: str):
+        """Retorna `(titulo, conteudo, chunks)` da página."""
+        args = (html, self.min_paragraph, self.chunk_size, self.chunk_overlap)
+        if self._executor is None:
+            return parse_and_split(*args)
+        return self._executor.submit(parse_and_split, *args).result()
@@ -1,22 +1,26 @@
 import json
 import re
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from flask import jsonify
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from shared.langchain_container import LangChainContainer
+from services.ingestion_pipeline import IngestionPipeline
+from services.ingestion_state import IngestionStateStore, http_state
+from services.parse_pool import ParsePool
+from services.page_archive import get_page_archive
 import os
 
 JSON_LOG_PATH = "logs/ufsm/cursos_links_acessados_full.json"
 OUTPUT_LOG_PATH = "logs/ufsm/cursos_links_filtrados.json"
+CHECKPOINT_PATH = "logs/ufsm/reprocess_checkpoint.jsonl"
 COLLECTION_NAME = "ufsm_knowledge"
 MAX_WORKERS = 12
 DATA_MINIMA = datetime(2023, 1, 1)
 
 container = LangChainContainer()
-splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=64)
+CHUNK_SIZE, CHUNK_OVERLAP = 512, 64
+splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
 
 def url_tem_data_antiga(url):
     """
@@ -32,36 +36,42 @@ def url_tem_data_antiga(url):
             return False
     return False  # Mantém links sem data
 
-def process_url(curso, campus, nivel, url):
+def process_url(curso, campus, nivel, url, headers=None, parse_pool=None, replay=None):
+    """
+    Baixa uma URL e extrai/divide o texto no `parse_pool` (processos); retorna
+    `(conteudo, metadados, estado_http, chunks)` ou None. Embedding e upsert ficam
+    a cargo do IngestionPipeline. Com `headers` condicionais, um 304 retorna
+    `(None, {"source": url}, estado_http, None)`. O download passa pelo
+    `PageArchive` (grava ou, em replay, lê do disco).
+    """
     try:
-        response = requests.get(url, timeout=10)
+        response = get_page_archive().fetch(url, timeout=10, headers=headers, replay=replay)
+        if response.status_code == 304:
+            return None, {"source": url}, http_state(response.headers), None
         if response.status_code != 200:
-            return []
+            return None
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        title = soup.title.string.strip() if soup.title else "Sem título"
-        paragraphs = [p.get_text().strip() for p in soup.find_all("p") if len(p.get_text().strip()) > 50]
-        content = "\n".join(paragraphs)
+        title, content, chunks = (parse_pool or ParsePool(workers=0)).parse(response.text)
+        title = title or "Sem título"
         if not content:
-            return []
+            return None
 
-        metadados = [{
+        metadados = {
             "curso": curso,
             "campus": campus,
             "nivel": nivel,
             "document_title": title,
             "source": url,
             "timestamp": datetime.now().isoformat()
-        }]
-        return splitter.create_documents([content], metadatas=metadados)
+        }
+        return content, metadados, http_state(response.headers), chunks
 
     except Exception as e:
         print(f"[!] Erro em {url}: {e}")
-        return []
+        return None
 
-def reprocess_from_log():
+def reprocess_from_log(incremental=True, job=None, replay=None):
     print(f"📂 Lendo log: {JSON_LOG_PATH}")
-    all_chunks = []
 
     try:
         with open(JSON_LOG_PATH, "r", encoding="utf-8") as f:
@@ -95,32 +105,79 @@ def reprocess_from_log():
         json.dump(filtered_logs, f_out, indent=2, ensure_ascii=False)
     print(f"📝 Log filtrado salvo em {OUTPUT_LOG_PATH}")
 
-    tasks = []
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        for curso, info in filtered_logs.items():
-            campus = info["campus"]
-            nivel = info["nivel"]
-            for url in info["urls_acessadas"]:
-                tasks.append(executor.submit(process_url, curso, campus, nivel, url))
-
-        for idx, future in enumerate(as_completed(tasks), 1):
-            chunks = future.result()
-            if chunks:
-                all_chunks.extend(chunks)
-            print(f"📦 Progresso: {idx}/{total_urls} URLs processadas.")
-
-    if not all_chunks:
+    state = IngestionStateStore() if incremental else None
+    pipeline = IngestionPipeline(
+        container,
+        COLLECTION_NAME,
+        splitter=splitter,
+        checkpoint_path=CHECKPOINT_PATH,
+        state=state,
+    )
+    done = pipeline.done_sources()
+    if done:
+        print(f"↩️ Retomando: {len(done)} URLs já gravadas serão puladas.")
+    urls = (
+        (curso, info["campus"], info["nivel"], url)
+        for curso, info in filtered_logs.items()
+        for url in info["urls_acessadas"]
+        if url not in done
+    )
+
+    # Janela limitada de downloads em andamento: os resultados vão direto para o
+    # pipeline em vez de se acumularem em memória
+    processed = 0
+
+    def drain(finished):
+        nonlocal processed
+        for future in finished:
+            processed += 1
+            page = future.result()
+            if not page:
+                continue
+            content, metadados, page_state, chunks = page
+            if content is None:
+                pipeline.touch_page(metadados["source"], page_state)
+            else:
+                pipeline.add_page(content, metadados, page_state, chunks=chunks)
+        print(f"📦 Progresso: {processed}/{total_urls} URLs processadas.")
+        if job:
+            job.progress(processadas=processed, total=total_urls, **pipeline.stats)
+
+    # Download em threads (I/O); parse + chunking nos processos do ParsePool (CPU),
+    # compartilhados com os outros jobs do serviço.
+    parse_pool = ParsePool(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).start()
+    with parse_pool, pipeline, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        running = set()
+        for args in urls:
+            if job and job.cancelled:
+                # Para de enfileirar; o que já foi baixado ainda é gravado
+                break
+            headers = state.conditional_headers(COLLECTION_NAME, args[-1]) if state else None
+            running.add(executor.submit(process_url, *args, headers, parse_pool, replay))
+            if len(running) >= MAX_WORKERS * 2:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                drain(finished)
+        drain(wait(running).done)
+
+    stats = pipeline.stats
+    if not stats["upserted"] and not stats["failed"] and not stats["unchanged"] and not stats["reused"]:
         return jsonify({"message": "Nenhum conteúdo válido extraído."}), 200
 
-    print(f"💾 Armazenando {len(all_chunks)} chunks na coleção `{COLLECTION_NAME}`...")
-    container.set_collection(COLLECTION_NAME)
-    container.vectorstore.add_documents(all_chunks)
-
-    print("✅ Ingestão finalizada com sucesso.")
-    return jsonify({
-        "message": f"{len(all_chunks)} chunks reprocessados e armazenados com sucesso.",
+    print(f"✅ Ingestão finalizada: {stats['upserted']} chunks na coleção `{COLLECTION_NAME}`.")
+    response = {
+        "message": f"{stats['upserted']} chunks reprocessados e armazenados com sucesso.",
         "log_filtrado": OUTPUT_LOG_PATH
-    }), 200
+    }
+    if incremental:
+        response["inalteradas"] = stats["unchanged"]
+        response["chunks_reaproveitados"] = stats["reused"]
+        response["chunks_removidos"] = stats["deleted"]
+    if stats["duplicates"]:
+        response["chunks_duplicados"] = stats["duplicates"]
+    if stats["failed"]:
+        response["falhas"] = stats["failed"]
+        response["checkpoint"] = CHECKPOINT_PATH
+    return jsonify(response), 200
 
 # import json
 # import requests
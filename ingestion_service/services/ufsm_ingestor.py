@@ -1,15 +1,20 @@
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
+import asyncio
 import xml.etree.ElementTree as ET
 from flask import jsonify
-from urllib.parse import urljoin
-from collections import deque
 # from unidecode import unidecode
 # from langchain_community.vectorstores import Qdrant
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from shared.langchain_container import LangChainContainer
+from shared.collection_versions import bump_collection
+from services.crawler import CrawlerEngine, CrawlBudget
+from services.html_extraction import extract_html, extract_paragraphs
+from services.parse_pool import ParsePool
+from services.page_archive import get_page_archive
+from services.http_fetch import get_all_sitemap_urls, extract_urls_from_sitemap
+from services.ingestion_pipeline import IngestionPipeline
+from services.ingestion_state import IngestionStateStore, http_state
 from datetime import datetime
 import logging
 
@@ -21,7 +26,7 @@ logger = logging.getLogger(__name__)
 
 def extract_xml_urls(sitemap_url):
     try:
-        response = requests.get(sitemap_url, timeout=10)
+        response = get_page_archive().fetch(sitemap_url, timeout=10)
         if response.status_code != 200:
             return []
         root = ET.fromstring(response.content)
@@ -42,15 +47,16 @@ def is_recent(lastmod_text, years=2):
     except Exception:
         return True
 
+def parse_page_html(html):
+    page = extract_html(html, min_paragraph=50)
+    return page["title"] or "Sem título", page["text"]
+
 def extract_page_text(url):
     try:
-        response = requests.get(url, timeout=10)
+        response = get_page_archive().fetch(url, timeout=10)
         if response.status_code != 200:
             return None, ""
-        soup = BeautifulSoup(response.text, "html.parser")
-        title = soup.title.string.strip() if soup.title else "Sem título"
-        paragraphs = [p.get_text().strip() for p in soup.find_all("p") if len(p.get_text().strip()) > 50]
-        return title, "\n".join(paragraphs)
+        return parse_page_html(response.text)
     except Exception as e:
         logger.warning(f"Erro ao extrair texto de {url}: {e}")
         return None, ""
@@ -77,96 +83,117 @@ def get_course_name_from_url(url):
     except Exception:
         return "Desconhecido"
 
-def ingest_ufsm_cursos_rag():# esse é o bolado que tá rolando  certo
+def ingest_ufsm_cursos_rag(max_pages=None, incremental=True, job=None, budget=None, replay=None):# esse é o bolado que tá rolando  certo
+    """
+    Ingestão dos cursos da UFSM via sitemaps do robots.txt.
+
+    Sitemaps, sub-sitemaps e páginas são baixados concorrentemente pelo
+    `CrawlerEngine` (ver CRAWL_CONCURRENCY / CRAWL_PER_HOST / CRAWL_DELAY).
+
+    No modo incremental, páginas com o mesmo `lastmod` no sitemap nem são
+    baixadas, as demais usam GET condicional (ETag/Last-Modified) e só os chunks
+    alterados são reembedados/apagados.
+
+    `budget` (CrawlBudget ou dict com max_pages/max_bytes/max_seconds/max_tokens)
+    limita o crawl; sem ele, vale `max_pages` (UFSM_CURSOS_MAX_PAGES).
+    Rodando como job (`job`), publica o progresso e, ao ser cancelado, para de
+    baixar e grava o que já foi baixado.
+
+    As páginas baixadas vão para o arquivo local (`PageArchive`); com
+    `replay=True` robots, sitemaps e páginas são lidos de lá, sem rede.
+    """
+    if not isinstance(budget, CrawlBudget):
+        budget = CrawlBudget.from_dict(budget, max_pages=max_pages or int(os.getenv("UFSM_CURSOS_MAX_PAGES", 10)))
+    return asyncio.run(_ingest_ufsm_cursos_rag(budget, incremental, job, replay))
+
+async def _ingest_ufsm_cursos_rag(budget, incremental=True, job=None, replay=None):
     print("🚀 Iniciando ingestão RAG de cursos da UFSM via sitemap...")
-    container = LangChainContainer()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=64)
-    all_chunks = []
+    collection = "ufsm_knowledge"
+    archive = get_page_archive()
+    crawler = CrawlerEngine(archive=archive, replay=replay)
+    state = IngestionStateStore() if incremental else None
+    pipeline = IngestionPipeline(
+        LangChainContainer(),
+        collection,
+        checkpoint_path="logs/ufsm/cursos_checkpoint.jsonl",
+        state=state,
+        budget=budget,
+    )
+    done = pipeline.done_sources()
     curso_logs = {}
-    stop = False
 
-    response = requests.get("https://www.ufsm.br/robots.txt")
-    sitemap_links = [line.split(": ")[1] for line in response.text.splitlines() if line.lower().startswith("sitemap:")]
+    sitemap_links = get_all_sitemap_urls(replay=replay)
     course_sitemaps = [url for url in sitemap_links if "/cursos/" in url]
 
     print(f"🔎 Encontrados {len(course_sitemaps)} sitemaps de cursos...")
-    a,b,c = 0,0,0
+    sitemaps = []
     for sitemap in course_sitemaps:
-        if stop:
-            print("🔴 Ingestão interrompida pelo usuário.")
-            break
         curso = get_course_name_from_url(sitemap)
         campus = get_campus_from_url(sitemap)
         tipo = get_course_type_from_url(sitemap)
-        a+=1
-        logger.debug(a)
         curso_logs[curso] = {
             "campus": campus,
             "nivel": tipo,
             "urls_acessadas": []
         }
-
-        print(f"➡️ Processando curso: {curso} | campus: {campus} | tipo: {tipo}")
         logger.info(f"🎓 Curso: {curso} | Campus: {campus} | Nível: {tipo}")
+        sitemaps.append((sitemap, {"curso": curso, "campus": campus, "nivel": tipo}))
 
-        sub_sitemaps = extract_xml_urls(sitemap)
-        logger.debug(f"🔍 {len(sub_sitemaps)} sub-sitemaps encontrados para {curso}")
+    if done:
+        print(f"↩️ Retomando: {len(done)} páginas já gravadas serão puladas.")
 
-        for sub_url, _ in sub_sitemaps:
-            if stop:
-                print("🔴 Ingestão interrompida pelo usuário.")
-                break
-            b+=1
-            # logger.debug(b)
-            if not sub_url or not sub_url.endswith(".xml"):
-                continue
-
-            sub_sub_sitemaps = extract_xml_urls(sub_url)
-            logger.debug(f"🔍 {len(sub_sub_sitemaps)} sub-sub-sitemaps em {sub_url}")
-
-            for page_url, lastmod in sub_sub_sitemaps:
-                c+=1
-                # logger.debug(c)
-                if not page_url or page_url.endswith(".xml"):
-                    continue
-                if not is_recent(lastmod.text if lastmod is not None else None):
-                    continue
-
-                title, content = extract_page_text(page_url)
-                if not content:
-                    continue
-                if c == 10:
-                    logger.debug("🔴 Limite de 100 páginas atingido, interrompendo ingestão.")
-                    logger.debug("🔴(DESLIGADO O STOP, pra ligar faz stop=true)🔴")
-                    stop=True
-                    break
-                print(f"  ✅ Página acessada: {page_url}")
-                logger.debug(f"📄 {title} | URL: {page_url}")
-                logger.debug(f"a = {a} ")
-                logger.debug(f"b = {b} ")
-                logger.debug(f"c = {c} ")
-
-                curso_logs[curso]["urls_acessadas"].append(page_url)
-
-                metadados = [{
-                    "curso": curso,
-                    "campus": campus,
-                    "nivel": tipo,
-                    "document_title": title,
-                    "source": page_url,
-                    "timestamp": datetime.now().isoformat()
-                }]
-
-                docs = splitter.create_documents([content], metadatas=metadados)
-                all_chunks.extend(docs)
-
-    if not all_chunks:
-        print("⚠️ Nenhum conteúdo válido encontrado para ingestão.")
-        return {"message": "Nenhum conteúdo válido encontrado para ingestão."}
+    def accept(item):
+        if item["url"] in done or not is_recent(item["lastmod"]):
+            return False
+        if state and state.unchanged_in_sitemap(collection, item["url"], item["lastmod"]):
+            pipeline.touch_page(item["url"], {})
+            return False
+        return True
 
-    print(f"💾 Armazenando {len(all_chunks)} documentos na coleção `ufsm_knowledge`...")
-    container.set_collection("ufsm_knowledge")
-    container.vectorstore.add_documents(all_chunks)
+    # Parse + chunking nos processos compartilhados do serviço
+    parse_pool = ParsePool().start()
+    pages = crawler.crawl(
+        sitemaps=sitemaps,
+        accept=accept,
+        headers_for=(lambda item: state.conditional_headers(collection, item["url"])) if state else None,
+        parse=lambda page: dict(zip(("title", "page_content", "chunks"), parse_pool.parse(page["text"]))),
+        budget=budget,
+        cancel_event=job.cancel_event if job else None,
+    )
+    pipeline.start()
+    try:
+        async for page in pages:
+            page_state = {**http_state(page["headers"]), "lastmod": page["lastmod"]}
+            if page["not_modified"]:
+                pipeline.touch_page(page["url"], page_state)
+                continue
+            title, content = page.get("title") or "Sem título", page.get("page_content")
+            if not content:
+                continue
+            meta = page["meta"]
+            print(f"  ✅ Página acessada: {page['url']}")
+            logger.debug(f"📄 {title} | URL: {page['url']}")
+
+            curso_logs[meta["curso"]]["urls_acessadas"].append(page["url"])
+
+            metadados = {
+                **meta,
+                "document_title": title,
+                "source": page["url"],
+                "timestamp": datetime.now().isoformat()
+            }
+            # Bloqueia só se split/embedding/upsert estiverem atrasados
+            await asyncio.to_thread(pipeline.add_page, content, metadados, page_state, page.get("chunks"))
+            if job:
+                job.progress(**pipeline.stats, crawl=crawler.stats, budget=budget.to_dict())
+    finally:
+        await pages.aclose()
+        stats = await asyncio.to_thread(pipeline.close)
+        parse_pool.close()
+
+    logger.info(f"🕸️ Crawl: {crawler.stats} | Orçamento: {budget.to_dict()}")
+    if crawler.stop_reason:
+        logger.info(f"🔴 Crawl interrompido ({crawler.stop_reason}), o que já foi baixado foi gravado.")
 
     os.makedirs("logs/ufsm", exist_ok=True)
     with open("logs/ufsm/cursos_links_acessados.json", "w", encoding="utf-8") as f:
@@ -175,33 +202,33 @@ def ingest_ufsm_cursos_rag():# esse é o bolado que tá rolando  certo
     print("✅ Log salvo em logs/ufsm/cursos_links_acessados.json")
     logger.info("✅ Log JSON salvo com URLs acessadas dos cursos.")
 
-    return {"message": f"Ingestão RAG finalizada com {len(all_chunks)} chunks"}
-
-#---------------- olds
-def get_all_sitemap_urls():
-    r = requests.get("https://www.ufsm.br/robots.txt")
-    if r.status_code != 200:
-        return []
-    return [line.split(": ", 1)[1] for line in r.text.splitlines() if line.lower().startswith("sitemap:")]
+    if not stats["upserted"] and not stats["unchanged"] and not stats["reused"]:
+        print("⚠️ Nenhum conteúdo válido encontrado para ingestão.")
+        return {"message": "Nenhum conteúdo válido encontrado para ingestão."}
 
-def extract_urls_from_sitemap(url):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return []
-    root = ET.fromstring(r.content)
-    return [u.text for u in root.findall(".//{http://www.sitemaps.org/schemas/sitemap/0.9}loc")]
-#---------------- olds
+    message = f"Ingestão RAG finalizada com {stats['upserted']} chunks"
+    if incremental:
+        message += (
+            f" ({stats['unchanged']} páginas inalteradas, {stats['reused']} chunks reaproveitados,"
+            f" {stats['deleted']} chunks antigos removidos)"
+        )
+    if stats["duplicates"]:
+        message += f" ({stats['duplicates']} chunks duplicados descartados)"
+    if stats["failed"]:
+        message += f" ({stats['failed']} chunks falharam; rode novamente para retomar)"
+    if crawler.stop_reason:
+        message += f" (crawl interrompido: {crawler.stop_reason})"
+    return {"message": message, "stop_reason": crawler.stop_reason, "budget": budget.to_dict()}
 
 def filter_course_urls(urls, filtro=None):
     return [url for url in urls if "/cursos/graduacao/" in url and (not filtro or filtro.lower() in url.lower())]
 
 def extract_sentences_from_url(url):
     try:
-        r = requests.get(url, timeout=5)
+        r = get_page_archive().fetch(url, timeout=5)
         if r.status_code != 200:
             return []
-        soup = BeautifulSoup(r.text, "html.parser")
-        return [p.get_text().strip() for p in soup.find_all("p") if len(p.get_text().strip()) > 40]
+        return extract_paragraphs(r.text, min_paragraph=40)
     except:
         return []
 
@@ -224,7 +251,8 @@ def ingest_from_sitemap(request):
             metadata.append({"source": url})
 
     embeddings = embedding_model.embed_documents(sentences)
-    container.store(collection_name="ufsm_cursos", sentences=sentences, embeddings=embeddings, metadata=metadata)
+    # Cada URL vem inteira: o que sumiu da página sai da coleção
+    container.store(collection_name="ufsm_cursos", sentences=sentences, embeddings=embeddings, metadata=metadata, replace_sources=True)
 
     return jsonify({"message": f"{len(sentences)} sentenças ingeridas na coleção ufsm_cursos"}), 200
 
@@ -238,46 +266,80 @@ def ingest_all_courses_text():
     frases = [f"A UFSM oferece o curso de {curso}." for curso in cursos]
     embeddings = embedding_model.embed_documents(frases)
     metadata = [{"source": "ufsm_geral"} for _ in frases]
-    container.store(collection_name="ufsm_geral_knowledge", sentences=frases, embeddings=embeddings, metadata=metadata)
+    # A lista de cursos é um retrato completo: substitui a coleção inteira
+    container.store(collection_name="ufsm_geral_knowledge", sentences=frases, embeddings=embeddings, metadata=metadata, recreate=True)
     return jsonify({"message": f"{len(frases)} frases ingeridas em ufsm_geral_knowledge"}), 200
 
-def ingest_via_crawling():
-    base = "https://www.ufsm.br"
-    visited = set()
-    queue = deque([base])
-    textos = []
+def ingest_via_crawling(job=None, budget=None, replay=None):
+    """
+    Crawl seguindo links internos a partir da home da UFSM.
 
-    while queue and len(visited) < 50:
-        url = queue.popleft()
-        if url in visited:
-            continue
-        visited.add(url)
-        try:
-            r = requests.get(url, timeout=5)
-            if r.status_code != 200:
-                continue
-            soup = BeautifulSoup(r.text, "html.parser")
-            texto = "\n".join(p.get_text().strip() for p in soup.find_all("p") if len(p.get_text().strip()) > 40)
-            if texto:
-                textos.append({"url": url, "text": texto})
-            for a in soup.find_all("a", href=True):
-                next_url = urljoin(url, a["href"])
-                if next_url.startswith(base) and next_url not in visited:
-                    queue.append(next_url)
-        except:
-            continue
+    `budget` (CrawlBudget ou dict) limita o crawl; sem ele, até
+    UFSM_CRAWL_MAX_PAGES (50) páginas. Cancelado como job, para de baixar e
+    ingere o que já tinha sido baixado. `replay=True` lê as páginas do
+    arquivo local em vez da rede.
+    """
+    if not isinstance(budget, CrawlBudget):
+        budget = CrawlBudget.from_dict(budget, max_pages=int(os.getenv("UFSM_CRAWL_MAX_PAGES", 50)))
+    textos, stop_reason = asyncio.run(_crawl_ufsm_site(budget, job, replay))
 
     sentences = []
     metadata = []
     for item in textos:
-        for sent in item["text"].split(". "):
-            if len(sent.strip()) >= 40:
-                sentences.append(sent.strip())
-                metadata.append({"source": item["url"]})
+        sentences.extend(item["sentences"])
+        metadata.extend({"source": item["url"]} for _ in item["sentences"])
+
+    if not sentences:
+        return jsonify({"message": "Nenhum texto encontrado via crawling", "stop_reason": stop_reason}), 200
 
     embeddings = embedding_model.embed_documents(sentences)
-    container.store("ufsm_knowledge", sentences, embeddings, metadata)
-    return jsonify({"message": f"{len(sentences)} sentenças ingeridas via crawling"}), 200
+    container.store("ufsm_knowledge", sentences, embeddings, metadata, replace_sources=True)
+    return jsonify({
+        "message": f"{len(sentences)} sentenças ingeridas via crawling",
+        "stop_reason": stop_reason,
+        "budget": budget.to_dict(),
+    }), 200
+
+def _parse_crawled_page(page, base="https://www.ufsm.br"):
+    extracted = extract_html(page["text"], base_url=page["url"], min_paragraph=40, links=True)
+    links = [(url, {}) for url in extracted["links"] if url.startswith(base)]
+    return {"texto": extracted["text"], "links": links}
+
+def _budget_sentences(texto, budget):
+    """
+    Sentenças da página, já contabilizadas no orçamento de tokens (mesma conta do
+    executor de embeddings). A página entra inteira ou não entra: como a gravação
+    substitui a versão anterior da URL, uma página cortada perderia o resto. A
+    primeira que não cabe esgota o orçamento, e o crawler para de baixar.
+    """
+    sentences = [sent.strip() for sent in texto.split(". ") if len(sent.strip()) >= 40]
+    tokens = sum(container.embedding_executor.count_tokens(sent) for sent in sentences)
+    if sentences and not budget.reserve_tokens(tokens):
+        return []
+    return sentences
+
+async def _crawl_ufsm_site(budget, job=None, replay=None):
+    base = "https://www.ufsm.br"
+    crawler = CrawlerEngine(archive=get_page_archive(), replay=replay)
+    textos = []
+    pages = crawler.crawl(
+        urls=[(base, {})],
+        parse=_parse_crawled_page,
+        follow=True,
+        budget=budget,
+        cancel_event=job.cancel_event if job else None,
+    )
+    try:
+        async for page in pages:
+            sentences = _budget_sentences(page["texto"], budget) if page.get("texto") else []
+            if sentences:
+                textos.append({"url": page["url"], "sentences": sentences})
+            if job:
+                job.progress(visitadas=crawler.stats["pages"], com_texto=len(textos), budget=budget.to_dict())
+    finally:
+        await pages.aclose()
+    logger.info(f"🕸️ Crawl: {crawler.stats} | Orçamento: {budget.to_dict()}")
+    return textos, crawler.stop_reason
 
 def ingest_from_web_loader(request):
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -301,6 +363,7 @@ def ingest_from_web_loader(request):
         embeddings=embedding_model
     )
     vectordb.add_documents(chunks)
+    bump_collection(collection)
 
     return jsonify({"message": f"{len(chunks)} chunks adicionados à coleção `{collection}`."}), 200
 
@@ -1,5 +1,6 @@
 from flask import jsonify
 from shared.langchain_container import LangChainContainer
+from services.ingestion_state import IngestionStateStore
 
 container = LangChainContainer()
 client = container.qdrant_client
@@ -15,7 +16,7 @@ def ingest_manual_text(request):
     metadata = [{"source": "manual"} for _ in sentences]
 
     collection = data.get("collection", "mlops_knowledge")
-    container.store(collection, sentences, embeddings, metadata)
+    container.store(collection, sentences, embeddings, metadata, recreate=bool(data.get("recreate", False)))
     return jsonify({"message": f"Ingestão manual em `{collection}` realizada com sucesso"}), 200
 
 def list_collections():
@@ -65,13 +66,21 @@ def list_all_documents():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def embedding_metrics():
+    return jsonify({
+        "embedding_executor": container.embedding_executor.stats(),
+        "embedding_cache": embedding_model.stats()
+    }), 200
+
 def delete_collection(request):
     data = request.get_json()
     name = data.get("collection")
     if not name:
         return jsonify({"error": "Coleção obrigatória"}), 400
     try:
-        client.delete_collection(name)
+        container.delete_collection(name)
+        # Sem a coleção, o estado incremental dela não vale mais
+        IngestionStateStore().forget_collection(name)
         return jsonify({"message": f"Coleção `{name}` deletada com sucesso."}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,32 +1,62 @@
+import os
 import qdrant_client
 from qdrant_client.http.models import VectorParams, Distance, PointStruct
+from shared.point_ids import indexed_point_ids
+from shared.bulk_upload import BulkUploader, checkpoint_path_for, prune_stale_points
+from shared.collection_aliases import BlueGreenRebuild, logical_collections
+from shared.collection_versions import bump_collection
 import logging
 
 client = qdrant_client.QdrantClient(host="vector_db", port=6333)
 
 
-def recreate_and_upsert(collection_name, sentences, embeddings, metadata):
-    """
-    Cria (ou recria) uma coleção no Qdrant e insere os embeddings com metadados.
+def upsert_sentences(collection_name, sentences, embeddings, metadata, recreate=False, checkpoint_path=None, replace_sources=False):
     """
-    logging.info(f"🧹 (Re)criando coleção `{collection_name}` com {len(sentences)} sentenças...")
+    Insere os embeddings com metadados no Qdrant, mesclando na coleção existente.
 
-    client.recreate_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(
-            size=len(embeddings[0]),
-            distance=Distance.COSINE
-        )
+    Os IDs são determinísticos por (fonte, índice, hash do texto); a coleção só é
+    substituída com `recreate=True`, via rebuild blue/green (alias). O envio usa
+    o `BulkUploader` (lotes em paralelo, retry e resume via `checkpoint_path` ou,
+    por padrão, o checkpoint da coleção em `UPLOAD_CHECKPOINT_DIR`). Com
+    `replace_sources=True` os pontos antigos das fontes enviadas que não vieram
+    de novo são apagados (ver `LangChainContainer.store`).
+    """
+    vectors_config = VectorParams(
+        size=len(embeddings[0]),
+        distance=Distance.COSINE
     )
+    exists = collection_name in logical_collections(client)
 
+    ids = indexed_point_ids(sentences, metadata)
     points = [
         PointStruct(
-            id=i,
-            vector=embedding.tolist(),
+            id=ids[i],
+            vector=embedding.tolist() if hasattr(embedding, "tolist") else list(embedding),
             payload={**metadata[i], "text": sentence}
         )
         for i, (sentence, embedding) in enumerate(zip(sentences, embeddings))
     ]
 
-    client.upsert(collection_name=collection_name, points=points)
+    uploader = BulkUploader(client)
+
+    # Retomando uma carga interrompida: continua na coleção atual
+    resuming = bool(checkpoint_path) and os.path.exists(checkpoint_path)
+    if recreate and not resuming:
+        logging.info(f"🧹 Reconstruindo coleção `{collection_name}` com {len(sentences)} sentenças...")
+        with BlueGreenRebuild(client, collection_name, vectors_config) as rebuild:
+            uploader.upload(rebuild.collection_name, points, wait=True)
+    else:
+        if not exists:
+            client.create_collection(collection_name=collection_name, vectors_config=vectors_config)
+        uploader.upload(collection_name, points, checkpoint_path=checkpoint_path or checkpoint_path_for(collection_name))
+        if replace_sources:
+            prune_stale_points(client, collection_name, points)
+        bump_collection(collection_name)
     logging.info(f"✅ Inserção finalizada na coleção `{collection_name}` com {len(points)} pontos.")
+
+
+def recreate_and_upsert(collection_name, sentences, embeddings, metadata):
+    """
+    Cria (ou recria) uma coleção no Qdrant e insere os embeddings com metadados.
+    """
+    upsert_sentences(collection_name, sentences, embeddings, metadata, recreate=True)
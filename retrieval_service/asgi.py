@@ -0,0 +1,11 @@
+from quart import Quart
+from routes.async_query_routes import async_query_blueprint
+import logging
+import sys
+
+# Modo assíncrono: `uvicorn asgi:app` (ou SERVER_MODE=asgi python main.py)
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+
+app = Quart(__name__)
+app.logger.setLevel(logging.DEBUG)
+app.register_blueprint(async_query_blueprint)
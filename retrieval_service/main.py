@@ -13,4 +13,8 @@ app.register_blueprint(query_blueprint)
 
 if __name__ == "__main__":
     print("🚀 Inicializando serviço de recuperação...")
-    app.run(host="0.0.0.0", port=5004, debug=DEBUG_MODE)
+    if os.getenv("SERVER_MODE", "wsgi").lower() == "asgi":
+        import uvicorn
+        uvicorn.run("asgi:app", host="0.0.0.0", port=5004, workers=int(os.getenv("ASGI_WORKERS", 1)))
+    else:
+        app.run(host="0.0.0.0", port=5004, debug=DEBUG_MODE, threaded=True)
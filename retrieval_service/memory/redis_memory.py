@@ -1,17 +1,92 @@
 import os
+import json
+from typing import List, Optional
+import redis
 from langchain.memory import ConversationBufferMemory
-from langchain_community.chat_message_histories import RedisChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, messages_from_dict, message_to_dict
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+# Mesmo prefixo do RedisChatMessageHistory, para os dois modos lerem o mesmo histórico
+KEY_PREFIX = "message_store:"
+
+# Janela deslizante por sessão (em mensagens) e orçamento opcional de tokens
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", 20))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 0))  # 0 = sem limite
+HISTORY_TTL = int(os.getenv("HISTORY_TTL", 0))  # segundos, 0 = sem expiração
+
+# Pools criados uma vez por processo e reaproveitados por todas as requisições
+_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+_async_client = None
+
+
+def _estimate_tokens(message: BaseMessage) -> int:
+    # Aproximação barata (~4 caracteres por token), suficiente para limitar o histórico
+    return len(message.content) // 4 + 1
+
+
+def _apply_token_budget(messages: List[BaseMessage], token_budget: int) -> List[BaseMessage]:
+    if not token_budget:
+        return messages
+    kept, used = [], 0
+    for message in reversed(messages):
+        used += _estimate_tokens(message)
+        if used > token_budget:
+            break
+        kept.append(message)
+    return kept[::-1]
+
+
+def _decode(items) -> List[BaseMessage]:
+    # LPUSH deixa a mensagem mais nova no início da lista
+    return messages_from_dict([json.loads(item.decode("utf-8")) for item in items[::-1]])
+
+
+class BoundedRedisChatMessageHistory(BaseChatMessageHistory):
+    """
+    Histórico de conversa no Redis com conexões do pool compartilhado e janela
+    fixa: cada escrita faz LPUSH + LTRIM no servidor, então a lista da sessão
+    nunca passa de `window` mensagens e cada leitura custa tempo constante.
+    """
+
+    def __init__(self, session_id: str, window: int = None, token_budget: int = None, ttl: int = None):
+        self.session_id = session_id
+        self.window = window or HISTORY_WINDOW
+        self.token_budget = HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+        self.ttl = ttl if ttl is not None else HISTORY_TTL
+        self.redis_client = redis.Redis(connection_pool=_pool)
+
+    @property
+    def key(self) -> str:
+        return KEY_PREFIX + self.session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        items = self.redis_client.lrange(self.key, 0, self.window - 1)
+        return _apply_token_budget(_decode(items), self.token_budget)
+
+    def add_messages(self, messages: List[BaseMessage]) -> None:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for message in messages:
+            pipe.lpush(self.key, json.dumps(message_to_dict(message)))
+        pipe.ltrim(self.key, 0, self.window - 1)
+        if self.ttl:
+            pipe.expire(self.key, self.ttl)
+        pipe.execute()
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def clear(self) -> None:
+        self.redis_client.delete(self.key)
+
 
 def get_conversation_memory(session_id: str):
     """Cria memória persistente usando Redis para uma sessão de conversa"""
-    history = RedisChatMessageHistory(
-        url=REDIS_URL,
-        session_id=session_id,
-    )
+    history = BoundedRedisChatMessageHistory(session_id=session_id)
     memory = ConversationBufferMemory(
         chat_memory=history,
         memory_key="chat_history",
@@ -19,3 +94,33 @@ def get_conversation_memory(session_id: str):
         return_messages=True
     )
     return memory
+
+
+def get_async_redis():
+    """Cliente `redis.asyncio` compartilhado pelo modo ASGI (com pool próprio)."""
+    global _async_client
+    if _async_client is None:
+        import redis.asyncio as aioredis
+        _async_client = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+        )
+    return _async_client
+
+
+async def aget_messages(session_id: str, window: int = None, token_budget: Optional[int] = None):
+    """Lê a janela do histórico da sessão sem bloquear o event loop."""
+    window = window or HISTORY_WINDOW
+    items = await get_async_redis().lrange(KEY_PREFIX + session_id, 0, window - 1)
+    return _apply_token_budget(_decode(items), HISTORY_TOKEN_BUDGET if token_budget is None else token_budget)
+
+
+async def asave_context(session_id: str, query: str, answer: str):
+    """Grava pergunta e resposta no histórico, como `memory.save_context`."""
+    key = KEY_PREFIX + session_id
+    async with get_async_redis().pipeline(transaction=False) as pipe:
+        pipe.lpush(key, json.dumps(message_to_dict(HumanMessage(content=query))))
+        pipe.lpush(key, json.dumps(message_to_dict(AIMessage(content=answer))))
+        pipe.ltrim(key, 0, HISTORY_WINDOW - 1)
+        if HISTORY_TTL:
+            pipe.expire(key, HISTORY_TTL)
+        await pipe.execute()
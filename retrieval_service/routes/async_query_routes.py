@@ -0,0 +1,102 @@
+import json
+import logging
+from quart import Blueprint, request, jsonify, Response
+from unidecode import unidecode
+from services.async_qa_service import aqa_chain, aqa_stream
+from services.qa_service import embedding_model, answer_cache
+from services.qa_metrics import qa_counters
+from memory.redis_memory import aget_messages
+from routes.query_routes import parse_stream_format
+
+# Mesmo contrato de routes/query_routes.py, servido por ASGI
+async_query_blueprint = Blueprint("async_query", __name__)
+logger = logging.getLogger(__name__)
+
+
+@async_query_blueprint.route("/query", methods=["POST"])
+async def query():
+    data = await request.get_json()
+    question = unidecode(data.get("question", "").strip())
+    session_id = data.get("session_id", "default")
+    use_cache = not data.get("bypass_cache", False)
+
+    if not question:
+        return jsonify({"error": "A pergunta não pode estar vazia."}), 400
+
+    logger.info(f"📥 Pergunta recebida: {question}")
+
+    try:
+        stream_format = parse_stream_format(data.get("stream"), request.headers.get("Accept", ""))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if stream_format:
+        def encode(event, payload):
+            if stream_format == "ndjson":
+                return json.dumps({"event": event, "data": payload}, ensure_ascii=False) + "\n"
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def generate():
+            try:
+                async for event, payload in aqa_stream(question, session_id=session_id, use_cache=use_cache):
+                    yield encode(event, payload)
+            except Exception as e:
+                logger.exception("❌ Erro durante o streaming.")
+                yield encode("error", {"error": str(e)})
+
+        mimetype = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+        response = Response(generate(), mimetype=mimetype)
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        response.timeout = None
+        return response
+
+    try:
+        result = await aqa_chain(question, session_id=session_id, use_cache=use_cache)
+        answer = result["result"]
+    except Exception as e:
+        logger.exception("❌ Erro durante o processamento.")
+        return jsonify({"error": str(e)}), 500
+
+    return Response(
+        json.dumps({"response": answer}, ensure_ascii=False),
+        status=200,
+        mimetype="application/json"
+    )
+
+
+@async_query_blueprint.route("/history/<session_id>", methods=["GET"])
+async def get_history(session_id):
+    try:
+        messages = await aget_messages(session_id)
+
+        formatted = []
+        for msg in messages:
+            role = "user" if msg.type == "human" else "ai"
+            formatted.append({"role": role, "content": msg.content})
+
+        return jsonify({
+            "session_id": session_id,
+            "total_messages": len(formatted),
+            "history": formatted
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Erro ao recuperar histórico: {str(e)}"}), 500
+
+
+@async_query_blueprint.route("/metrics", methods=["GET"])
+async def metrics():
+    return jsonify({
+        "qa": qa_counters.snapshot(),
+        "embedding_cache": embedding_model.stats(),
+        "embedding_executor": embedding_model.base.stats(),
+        "semantic_cache": answer_cache.stats()
+    }), 200
+
+
+@async_query_blueprint.route("/cache/invalidate", methods=["POST"])
+async def invalidate_cache():
+    data = await request.get_json(silent=True) or {}
+    collection = data.get("collection")
+    answer_cache.invalidate(collection)
+    return jsonify({"message": f"Cache semântico invalidado: {collection or 'todas as coleções'}"}), 200
@@ -1,9 +1,10 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from unidecode import unidecode
 import json
 import logging
-from services.qa_service import qa_chain
-from shared.conversation_memory import get_conversation_memory
+from services.qa_service import qa_chain, qa_stream, embedding_model, answer_cache
+from services.qa_metrics import qa_counters
+from memory.redis_memory import get_conversation_memory
 
 query_blueprint = Blueprint("query", __name__)
 logger = logging.getLogger(__name__)
@@ -13,15 +14,23 @@ def query():
     data = request.get_json()
     question = unidecode(data.get("question", "").strip())
     session_id = data.get("session_id", "default")
+    use_cache = not data.get("bypass_cache", False)
 
     if not question:
         return jsonify({"error": "A pergunta não pode estar vazia."}), 400
 
     logger.info(f"📥 Pergunta recebida: {question}")
 
+    try:
+        stream_format = parse_stream_format(data.get("stream"), request.headers.get("Accept", ""))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if stream_format:
+        return _stream_response(question, session_id, use_cache, stream_format)
+
     try:
         # result = qa_chain.invoke({"query": question})
-        result = qa_chain(question, session_id=session_id)
+        result = qa_chain(question, session_id=session_id, use_cache=use_cache)
         answer = result["result"]
         sources = result.get("source_documents", [])
         context = "\n---\n".join([doc.page_content for doc in sources])
@@ -43,6 +52,55 @@ def query():
         mimetype="application/json"
     )
 
+STREAM_TRUE = {True, 1, "true", "1", "sse"}
+STREAM_FALSE = {False, 0, "false", "0", ""}
+
+def parse_stream_format(requested, accept: str = ""):
+    """
+    `sse` (Server-Sent Events), `ndjson` (JSON por linha) ou None, a partir do
+    campo `stream` (true/false, "sse" ou "ndjson") ou, sem ele, do header Accept.
+    Levanta ValueError para qualquer outro valor de `stream`.
+    """
+    if isinstance(requested, str):
+        requested = requested.strip().lower()
+    elif isinstance(requested, (list, dict)):
+        raise ValueError(f"Valor inválido para `stream`: {requested!r}")
+    if requested == "ndjson":
+        return "ndjson"
+    if requested in STREAM_TRUE:
+        return "sse"
+    if requested in STREAM_FALSE:
+        return None
+    if requested is not None:
+        raise ValueError(f"Valor inválido para `stream`: {requested!r} (use true, false, \"sse\" ou \"ndjson\")")
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    if "text/event-stream" in accept:
+        return "sse"
+    return None
+
+def _stream_response(question, session_id, use_cache, stream_format):
+    def encode(event, payload):
+        if stream_format == "ndjson":
+            return json.dumps({"event": event, "data": payload}, ensure_ascii=False) + "\n"
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def generate():
+        try:
+            for event, payload in qa_stream(question, session_id=session_id, use_cache=use_cache):
+                yield encode(event, payload)
+        except Exception as e:
+            logger.exception("❌ Erro durante o streaming.")
+            yield encode("error", {"error": str(e)})
+
+    mimetype = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+    return current_app.response_class(
+        stream_with_context(generate()),
+        status=200,
+        mimetype=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @query_blueprint.route("/history/<session_id>", methods=["GET"])
 def get_history(session_id):
     try:
@@ -61,4 +119,20 @@ def get_history(session_id):
         }), 200
 
     except Exception as e:
-        return jsonify({"error": f"Erro ao recuperar histórico: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Erro ao recuperar histórico: {str(e)}"}), 500
+
+@query_blueprint.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "qa": qa_counters.snapshot(),
+        "embedding_cache": embedding_model.stats(),
+        "embedding_executor": embedding_model.base.stats(),
+        "semantic_cache": answer_cache.stats()
+    }), 200
+
+@query_blueprint.route("/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    data = request.get_json(silent=True) or {}
+    collection = data.get("collection")
+    answer_cache.invalidate(collection)
+    return jsonify({"message": f"Cache semântico invalidado: {collection or 'todas as coleções'}"}), 200
@@ -0,0 +1,131 @@
+import asyncio
+from shared.single_flight import AsyncSingleFlight
+from memory.redis_memory import asave_context
+from services.qa_metrics import CountingCallbackHandler, qa_counters
+from services.qa_service import container, router, answer_cache
+
+# Coalescência de perguntas idênticas dentro do event loop
+in_flight = AsyncSingleFlight()
+
+
+class AsyncQAExecution:
+    """
+    Versão assíncrona de `QAExecution` para o modo ASGI.
+
+    Embeddings, busca no Qdrant (AsyncQdrantClient), geração (ChatOpenAI) e
+    histórico Redis (redis.asyncio) são aguardados sem ocupar uma thread por
+    requisição. Usa as mesmas instâncias compartilhadas e caches do modo Flask;
+    o que nelas ainda é síncrono (roteador, `get_chain`, que pode listar/criar
+    coleções no Qdrant, e o cache semântico, que lê versões no Redis) roda em
+    `asyncio.to_thread` para não parar o event loop.
+    """
+
+    def __init__(self, session_id: str, use_cache: bool = True):
+        self.session_id = session_id
+        self.use_cache = use_cache
+        self.collection_name = None
+        self.callbacks = None
+
+    async def _decide(self, query: str):
+        # Aquece o cache de embeddings de forma assíncrona; o roteador
+        # (heurística, classificador e centróides locais) reaproveita o vetor
+        question_embedding = await container.embedding_model.aembed_query(query)
+        self.collection_name = await asyncio.to_thread(router.decide, query)
+        return question_embedding
+
+    async def run(self, query: str):
+        print(f"📥 Pergunta recebida (async): {query}")
+        question_embedding = await self._decide(query)
+
+        if not self.collection_name:
+            return {
+                "result": "Não encontrei nenhuma base relevante para essa pergunta.",
+                "sources": []
+            }
+
+        if self.use_cache:
+            cached = await asyncio.to_thread(answer_cache.lookup, self.collection_name, question_embedding, query)
+            if cached:
+                await asave_context(self.session_id, query, cached["result"])
+                return {"result": cached["result"], "sources": cached["sources"], "cached": True}
+
+        chain = (await asyncio.to_thread(container.get_chain, self.collection_name))["qa_chain"]
+        self.callbacks = CountingCallbackHandler(qa_counters)
+        try:
+            result = await chain.ainvoke({"query": query}, config={"callbacks": [self.callbacks]})
+        except Exception as e:
+            print(f"❌ Erro durante execução do QA Chain: {e}")
+            container.invalidate_collection(self.collection_name)
+            return {
+                "result": "Erro interno ao processar a pergunta.",
+                "sources": []
+            }
+
+        await asave_context(self.session_id, query, result["result"])
+        sources = [doc.metadata for doc in result["source_documents"]]
+        if self.use_cache:
+            await asyncio.to_thread(answer_cache.store, self.collection_name, query, question_embedding, result["result"], sources)
+
+        return {
+            "result": result["result"],
+            "sources": sources
+        }
+
+    async def stream(self, query: str):
+        """Eventos `(tipo, dados)` no mesmo formato de `QAExecution.stream`."""
+        print(f"📥 Pergunta recebida (async stream): {query}")
+        question_embedding = await self._decide(query)
+
+        if not self.collection_name:
+            answer = "Não encontrei nenhuma base relevante para essa pergunta."
+            yield "meta", {"collection": None, "sources": []}
+            yield "token", answer
+            yield "done", {"result": answer}
+            return
+
+        if self.use_cache:
+            cached = await asyncio.to_thread(answer_cache.lookup, self.collection_name, question_embedding, query)
+            if cached:
+                await asave_context(self.session_id, query, cached["result"])
+                yield "meta", {"collection": self.collection_name, "sources": cached["sources"], "cached": True}
+                yield "token", cached["result"]
+                yield "done", {"result": cached["result"]}
+                return
+
+        entry = await asyncio.to_thread(container.get_chain, self.collection_name)
+        self.callbacks = CountingCallbackHandler(qa_counters)
+        config = {"callbacks": [self.callbacks]}
+
+        docs = await entry["retriever"].ainvoke(query, config=config)
+        sources = [doc.metadata for doc in docs]
+        yield "meta", {"collection": self.collection_name, "sources": sources}
+
+        prompt = container.prompt.format(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=query
+        )
+        parts = []
+        async for chunk in container.chat_model.astream(prompt, config=config):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield "token", chunk.content
+
+        answer = "".join(parts)
+        await asave_context(self.session_id, query, answer)
+        if self.use_cache:
+            await asyncio.to_thread(answer_cache.store, self.collection_name, query, question_embedding, answer, sources)
+        yield "done", {"result": answer}
+
+
+async def aqa_chain(query: str, session_id: str, use_cache: bool = True):
+    qa_counters.incr("questions")
+    key = (session_id, " ".join(query.split()), use_cache)
+    result, shared = await in_flight.do(key, AsyncQAExecution(session_id, use_cache=use_cache).run, query)
+    if shared:
+        qa_counters.incr("coalesced")
+    return result
+
+
+def aqa_stream(query: str, session_id: str, use_cache: bool = True):
+    qa_counters.incr("questions")
+    return AsyncQAExecution(session_id, use_cache=use_cache).stream(query)
@@ -6,8 +6,9 @@ client = get_qdrant_client()
 logger = logging.getLogger(__name__)
 # client = QdrantClient(host="vector_db", port=6333)
 
-def decide_collection(question, embedding_model, max_results_per_collection=3):
-    question_embedding = embedding_model.encode(question).tolist()
+def decide_collection(question, embedding_model, max_results_per_collection=3, question_embedding=None):
+    if question_embedding is None:
+        question_embedding = embedding_model.encode(question).tolist()
 
     try:
         collections = client.get_collections()
@@ -47,8 +48,9 @@ def decide_collection(question, embedding_model, max_results_per_collection=3):
 
 # def retrieve_context(question, embedding_model):
 def retrieve_context(question, client, embedding_model):
-    collection_name = decide_collection(question, embedding_model)
+    # Embute uma única vez e reaproveita na escolha da coleção e na busca
     question_embedding = embedding_model.encode(question).tolist()
+    collection_name = decide_collection(question, embedding_model, question_embedding=question_embedding)
 
     try:
         collections = client.get_collections()
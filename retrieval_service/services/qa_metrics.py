@@ -0,0 +1,50 @@
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class QACounters:
+    """
+    Contadores thread-safe das chamadas upstream feitas pelo serviço de QA.
+    """
+
+    FIELDS = ("questions", "retrievals", "generations", "coalesced")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            self._values[field] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values = {field: 0 for field in self.FIELDS}
+
+
+class CountingCallbackHandler(BaseCallbackHandler):
+    """
+    Callback do LangChain que conta buscas no retriever e gerações do LLM
+    de uma única execução, acumulando também nos contadores globais.
+    """
+
+    def __init__(self, counters: QACounters):
+        self.counters = counters
+        self.retrievals = 0
+        self.generations = 0
+
+    def on_retriever_end(self, documents, **kwargs):
+        self.retrievals += 1
+        self.counters.incr("retrievals")
+
+    def on_llm_end(self, response, **kwargs):
+        self.generations += 1
+        self.counters.incr("generations")
+
+
+# Contadores do processo (usados em testes e logs)
+qa_counters = QACounters()
@@ -1,65 +1,174 @@
 from shared.langchain_container import LangChainContainer
 from shared.collection_router import CollectionRouter
+from shared.collection_versions import get_collection_versions
 from models.client_loader import get_qdrant_client
+from shared.single_flight import SingleFlight
 from memory.redis_memory import get_conversation_memory  # vamos criar esse arquivo abaixo
+from services.qa_metrics import CountingCallbackHandler, qa_counters
+from services.semantic_cache import SemanticAnswerCache
 
-# Instâncias
+# Instâncias compartilhadas (somente leitura durante as requisições)
 container = LangChainContainer()
 client = get_qdrant_client()
 embedding_model = container.embedding_model
 router = CollectionRouter(client=client, embedding_model=embedding_model)
+# Perguntas idênticas (mesma sessão e texto) em andamento compartilham uma execução
+in_flight = SingleFlight()
+# Respostas para perguntas semanticamente iguais; invalidado quando a ingestão
+# publica uma versão nova da coleção (ou o índice de roteamento nota a mudança)
+answer_cache = SemanticAnswerCache(versions=get_collection_versions())
+router.change_listeners.append(answer_cache.invalidate_many)
+
+
+class QAExecution:
+    """
+    Execução de uma pergunta com estado próprio da requisição.
+
+    Modelos, cliente Qdrant e chains do registro do container são compartilhados
+    e nunca alterados aqui; coleção e memória Redis da sessão vivem apenas nesta
+    instância, então threads concorrentes não interferem umas nas outras.
+    """
+
+    def __init__(self, session_id: str, use_cache: bool = True, container: LangChainContainer = container, router: CollectionRouter = router):
+        self.container = container
+        self.router = router
+        self.session_id = session_id
+        self.use_cache = use_cache
+        self.collection_name = None
+        self.memory = None
+        self.callbacks = None
+
+    def run(self, query: str):
+        print(f"📥 Pergunta recebida: {query}")
+        self.collection_name = self.router.decide(query)
+
+        if not self.collection_name:
+            print("⚠️ Nenhuma coleção relevante encontrada.")
+            return {
+                "result": "Não encontrei nenhuma base relevante para essa pergunta.",
+                "sources": []
+            }
+
+        print(f"📚 Coleção selecionada: {self.collection_name}")
+        self.memory = get_conversation_memory(self.session_id)
+
+        # Embedding vem do cache de embeddings e é reaproveitado pelo retriever
+        question_embedding = self.container.embedding_model.embed_query(query) if self.use_cache else None
+        if question_embedding is not None:
+            cached = answer_cache.lookup(self.collection_name, question_embedding, query)
+            if cached:
+                print(f"⚡ Resposta do cache semântico (similaridade {cached['similarity']:.4f})")
+                self.memory.save_context({"query": query}, {"result": cached["result"]})
+                return {"result": cached["result"], "sources": cached["sources"], "cached": True}
+
+        chain = self.container.get_chain(self.collection_name)["qa_chain"]
+        self.callbacks = CountingCallbackHandler(qa_counters)
+
+        try:
+            # Uma única invocação: 1 embedding, 1 busca no Qdrant e 1 completion
+            result = chain.invoke({"query": query}, config={"callbacks": [self.callbacks]})
+        except Exception as e:
+            print(f"❌ Erro durante execução do QA Chain: {e}")
+            # A coleção pode ter sido apagada/recriada pelo serviço de ingestão
+            self.container.invalidate_collection(self.collection_name)
+            return {
+                "result": "Erro interno ao processar a pergunta.",
+                "sources": []
+            }
+
+        # Memória da sessão é gravada aqui, e não acoplada à chain compartilhada
+        self.memory.save_context({"query": query}, {"result": result["result"]})
+
+        if self.callbacks.retrievals != 1 or self.callbacks.generations != 1:
+            print(
+                f"⚠️ Execução fora do esperado: {self.callbacks.retrievals} buscas, "
+                f"{self.callbacks.generations} gerações"
+            )
+
+        print("✅ Resposta gerada com sucesso!")
+        print(f"🧠 Resposta:\n{result['result']}\n")
+
+        print("🔎 Documentos usados como contexto:")
+        for idx, doc in enumerate(result.get("source_documents", []), 1):
+            content_preview = doc.page_content[:300].strip().replace("\n", " ")
+            print(f"  {idx}. 📄 {content_preview}...")
+            print(f"     🔖 Metadados: {doc.metadata}\n")
+
+        sources = [doc.metadata for doc in result["source_documents"]]
+        if question_embedding is not None:
+            answer_cache.store(self.collection_name, query, question_embedding, result["result"], sources)
 
-
-def qa_chain(query: str, session_id: str):
-    print(f"📥 Pergunta recebida: {query}")
-    collection_name = router.decide(query)
-
-    if not collection_name:
-        print("⚠️ Nenhuma coleção relevante encontrada.")
         return {
-            "result": "Não encontrei nenhuma base relevante para essa pergunta.",
-            "sources": []
+            "result": result["result"],
+            "sources": sources
         }
 
-    print(f"📚 Coleção selecionada: {collection_name}")
-    container.set_collection(collection_name)
-
-    # Vincula a memória ao chain
-    memory = get_conversation_memory(session_id)
-    memory.output_key = "result"  # 👈 ESSENCIAL
-    container.qa_chain.memory = memory
-    print(f"🔗 Output key da memória: {memory.output_key}")
-
-    result = container.qa_chain.invoke({
-            "query": query,
-            "chat_history": memory.chat_memory.messages
-        })
-    try:
-        # result = container.qa_chain.invoke({"query": query})
-        result = container.qa_chain.invoke({
-            "query": query,
-            "chat_history": memory.chat_memory.messages
-        })
-    except Exception as e:
-        print(f"❌ Erro durante execução do QA Chain: {e}")
-        return {
-            "result": "Erro interno ao processar a pergunta.",
-            "sources": []
-        }
-
-    print("✅ Resposta gerada com sucesso!")
-    print(f"🧠 Resposta:\n{result['result']}\n")
-
-    print("🔎 Documentos usados como contexto:")
-    for idx, doc in enumerate(result.get("source_documents", []), 1):
-        content_preview = doc.page_content[:300].strip().replace("\n", " ")
-        print(f"  {idx}. 📄 {content_preview}...")
-        print(f"     🔖 Metadados: {doc.metadata}\n")
-
-    return {
-        "result": result["result"],
-        "sources": [doc.metadata for doc in result["source_documents"]]
-    }
+    def stream(self, query: str):
+        """
+        Versão em streaming de `run`: gera eventos `(tipo, dados)`.
+        Primeiro `meta` (coleção e fontes), depois um `token` por pedaço da
+        resposta conforme o LLM gera, e por fim `done` com a resposta completa.
+        """
+        print(f"📥 Pergunta recebida (stream): {query}")
+        self.collection_name = self.router.decide(query)
+
+        if not self.collection_name:
+            answer = "Não encontrei nenhuma base relevante para essa pergunta."
+            yield "meta", {"collection": None, "sources": []}
+            yield "token", answer
+            yield "done", {"result": answer}
+            return
+
+        self.memory = get_conversation_memory(self.session_id)
+
+        question_embedding = self.container.embedding_model.embed_query(query) if self.use_cache else None
+        if question_embedding is not None:
+            cached = answer_cache.lookup(self.collection_name, question_embedding, query)
+            if cached:
+                self.memory.save_context({"query": query}, {"result": cached["result"]})
+                yield "meta", {"collection": self.collection_name, "sources": cached["sources"], "cached": True}
+                yield "token", cached["result"]
+                yield "done", {"result": cached["result"]}
+                return
+
+        entry = self.container.get_chain(self.collection_name)
+        self.callbacks = CountingCallbackHandler(qa_counters)
+        config = {"callbacks": [self.callbacks]}
+
+        # Mesmo fluxo da chain "stuff": busca, monta o prompt e gera
+        docs = entry["retriever"].invoke(query, config=config)
+        sources = [doc.metadata for doc in docs]
+        yield "meta", {"collection": self.collection_name, "sources": sources}
+
+        prompt = self.container.prompt.format(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=query
+        )
+        parts = []
+        for chunk in self.container.chat_model.stream(prompt, config=config):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield "token", chunk.content
+
+        answer = "".join(parts)
+        self.memory.save_context({"query": query}, {"result": answer})
+        if question_embedding is not None:
+            answer_cache.store(self.collection_name, query, question_embedding, answer, sources)
+        yield "done", {"result": answer}
+
+
+def qa_chain(query: str, session_id: str, use_cache: bool = True):
+    qa_counters.incr("questions")
+    key = (session_id, " ".join(query.split()), use_cache)
+    result, shared = in_flight.do(key, lambda: QAExecution(session_id, use_cache=use_cache).run(query))
+    if shared:
+        qa_counters.incr("coalesced")
+    return result
+
+
+def qa_stream(query: str, session_id: str, use_cache: bool = True):
+    qa_counters.incr("questions")
+    return QAExecution(session_id, use_cache=use_cache).stream(query)
 
 
 # from shared.langchain_container import LangChainContainer
@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import logging
+import threading
+from typing import Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Palavras que podem mudar entre duas perguntas sem mudar o que se pergunta.
+# Interrogativos como "quando"/"onde"/"quem" ficam de fora de propósito.
+STOPWORDS = frozenset("""
+a o as os um uma uns umas de do da dos das d em no na nos nas num numa por pelo pela
+pelos pelas para pra pro com e ou que qual quais se me eu voce vc meu minha ao aos
+sobre ate entre sao ser esta estao existe existem ha tem possui eh la aqui ainda
+tambem entao isso essa esse este
+""".split())
+
+
+def content_words(question: str) -> frozenset:
+    """Palavras da pergunta (minúsculas) que carregam o fato: nomes, números, datas, termos."""
+    return frozenset(word for word in _WORD.findall(question.lower()) if word not in STOPWORDS)
+
+
+class SemanticAnswerCache:
+    """
+    Cache semântico de respostas por coleção.
+
+    Guarda (embedding da pergunta, resposta, fontes) e devolve a resposta de uma
+    pergunta anterior quando a similaridade de cosseno com a nova pergunta passa
+    do limiar. Entradas expiram por TTL e podem ser invalidadas por coleção
+    (ex: quando a coleção é re-ingerida).
+
+    Perguntas de template ("A UFSM tem curso de Medicina?" / "...de Direito?")
+    ficam acima do limiar mesmo pedindo fatos diferentes; por isso, com a
+    pergunta em `lookup`, um hit só vale se as palavras de conteúdo (fora
+    `STOPWORDS`) das duas perguntas forem as mesmas.
+
+    Com `versions` (CollectionVersions), cada consulta confere a versão da
+    coleção publicada pelo serviço de ingestão e descarta as respostas da
+    coleção quando ela muda.
+    """
+
+    def __init__(self, threshold: float = None, ttl: int = None, max_entries: int = None, versions=None):
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+        self.ttl = ttl or int(os.getenv("SEMANTIC_CACHE_TTL", 24 * 3600))
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 2000))
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.versions = versions
+        self._seen_versions = {}
+
+        # coleção -> (matriz de embeddings normalizados, lista de entradas)
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, collection_name: str):
+        """Invalida a coleção se a ingestão publicou uma versão nova desde a última consulta."""
+        if self.versions is None:
+            return
+        version = self.versions.get(collection_name)
+        if version is None:
+            return
+        with self._lock:
+            seen = self._seen_versions.get(collection_name)
+            self._seen_versions[collection_name] = version
+        if seen is not None and seen != version:
+            self.invalidate(collection_name)
+
+    def lookup(self, collection_name: str, question_embedding, question: str = None) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        self._check_version(collection_name)
+        query = self._normalize(question_embedding)
+        words = content_words(question) if question is not None else None
+        now = time.time()
+        with self._lock:
+            matrix, entries = self._collections.get(collection_name, (None, []))
+            if matrix is None or matrix.shape[1] != query.shape[0]:
+                self._counters["misses"] += 1
+                return None
+            similarities = matrix @ query
+            # Ignora entradas expiradas sem reconstruir a matriz a cada consulta
+            for idx in np.argsort(similarities)[::-1]:
+                if similarities[idx] < self.threshold:
+                    break
+                entry = entries[idx]
+                if words is not None and entry["words"] != words:
+                    # Mesma forma, outro fato (curso, número, data...)
+                    continue
+                if now - entry["created_at"] <= self.ttl:
+                    self._counters["hits"] += 1
+                    return {
+                        "question": entry["question"],
+                        "result": entry["result"],
+                        "sources": entry["sources"],
+                        "similarity": float(similarities[idx]),
+                    }
+            self._counters["misses"] += 1
+        return None
+
+    def store(self, collection_name: str, question: str, question_embedding, answer: str, sources: list):
+        if not self.enabled:
+            return
+        self._check_version(collection_name)
+        entry = {
+            "question": question,
+            "words": content_words(question),
+            "result": answer,
+            "sources": sources,
+            "created_at": time.time(),
+            "vector": self._normalize(question_embedding),
+        }
+        with self._lock:
+            _, entries = self._collections.get(collection_name, (None, []))
+            entries = [e for e in self._live(entries) if e["vector"].shape == entry["vector"].shape]
+            # Limite por coleção: descarta as entradas mais antigas
+            entries = (entries + [entry])[-self.max_entries:]
+            matrix = np.vstack([e["vector"] for e in entries])
+            self._collections[collection_name] = (matrix, entries)
+            self._counters["stores"] += 1
+
+    def _live(self, entries: list) -> list:
+        now = time.time()
+        return [e for e in entries if now - e["created_at"] <= self.ttl]
+
+    def invalidate(self, collection_name: str = None):
+        with self._lock:
+            if collection_name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection_name, None)
+            self._counters["invalidations"] += 1
+        logger.info(f"🧹 Cache semântico invalidado: {collection_name or 'todas as coleções'}")
+
+    def invalidate_many(self, collection_names: list):
+        for name in collection_names:
+            self.invalidate(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["entries"] = sum(len(entries) for _, entries in self._collections.values())
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        return counters
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from qdrant_client.http.models import PointStruct, PointIdsList, Filter, FieldCondition, MatchAny
+
+logger = logging.getLogger(__name__)
+
+
+def _point_size(point: PointStruct) -> int:
+    """Tamanho aproximado do ponto serializado (bytes), para limitar os lotes."""
+    vector = point.vector
+    if isinstance(vector, dict):
+        floats = sum(len(v) for v in vector.values())
+    else:
+        floats = len(vector)
+    # ~10 bytes por float no JSON + payload
+    return floats * 10 + len(json.dumps(point.payload or {}, ensure_ascii=False, default=str))
+
+
+def checkpoint_path_for(collection_name: str) -> str:
+    """Checkpoint padrão da carga de uma coleção (`UPLOAD_CHECKPOINT_DIR`)."""
+    return os.path.join(os.getenv("UPLOAD_CHECKPOINT_DIR", "logs/upload_checkpoints"), f"{collection_name}.jsonl")
+
+
+class BulkUploader:
+    """
+    Carga em massa de pontos no Qdrant.
+
+    - Divide os pontos em lotes limitados por quantidade (`batch_size`) e por
+      tamanho aproximado (`max_batch_bytes`), evitando requisições gigantes;
+    - Envia `parallel` lotes ao mesmo tempo, com retry e backoff por lote;
+    - Reporta progresso (log + `on_progress(enviados, total)`);
+    - Com `checkpoint_path`, grava os lotes concluídos e, se a carga cair no meio,
+      a próxima chamada com os mesmos pontos pula o que já foi enviado.
+
+    Os IDs dos pontos devem ser determinísticos para o resume fazer sentido (ver
+    `shared/point_ids.py`); reenviar um lote é idempotente.
+    """
+
+    def __init__(
+        self,
+        client,
+        batch_size: int = None,
+        max_batch_bytes: int = None,
+        parallel: int = None,
+        max_retries: int = None,
+        on_progress=None,
+    ):
+        self.client = client
+        self.batch_size = batch_size or int(os.getenv("UPLOAD_BATCH_SIZE", 256))
+        self.max_batch_bytes = max_batch_bytes or int(os.getenv("UPLOAD_BATCH_BYTES", 8 * 1024 * 1024))
+        self.parallel = parallel or int(os.getenv("UPLOAD_PARALLEL", 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("UPLOAD_MAX_RETRIES", 3))
+        self.on_progress = on_progress
+
+    # ----------------------------------------------------------------- lotes
+    def batches(self, points):
+        batch, batch_bytes = [], 0
+        for point in points:
+            size = _point_size(point)
+            if batch and (len(batch) >= self.batch_size or batch_bytes + size > self.max_batch_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(point)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _batch_key(batch) -> str:
+        # Identifica o lote pelos IDs dos seus pontos
+        return str(uuid.uuid5(uuid.NAMESPACE_OID, "\0".join(str(point.id) for point in batch)))
+
+    # ------------------------------------------------------------ checkpoint
+    @staticmethod
+    def _load_checkpoint(path: str) -> set:
+        if not path or not os.path.exists(path):
+            return set()
+        with open(path, "r", encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    # ---------------------------------------------------------------- upload
+    def _upload_batch(self, collection_name: str, batch, wait: bool):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.upsert(collection_name=collection_name, points=batch, wait=wait)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                backoff = 2 ** attempt
+                logger.warning(f"⚠️ Falha ao enviar lote de {len(batch)} pontos (tentativa {attempt + 1}): {e}; nova tentativa em {backoff}s")
+                time.sleep(backoff)
+
+    def upload(self, collection_name: str, points, checkpoint_path: str = None, wait: bool = False) -> dict:
+        """
+        Envia `points` para a coleção. Retorna `{"uploaded", "skipped", "batches", "seconds"}`.
+        Com `wait=False` os lotes intermediários são confirmados antes de aplicados,
+        mas o último só é enviado depois dos outros e com `wait=True`: como o Qdrant
+        aplica as operações em ordem, a chamada só retorna com todos os pontos
+        gravados. `wait=True` espera em todos os lotes.
+        """
+        points = list(points)
+        total = len(points)
+        started = time.monotonic()
+        done = self._load_checkpoint(checkpoint_path)
+        lock = threading.Lock()
+        progress = {"uploaded": 0, "skipped": 0, "batches": 0}
+
+        if checkpoint_path:
+            os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+
+        def run(batch, key, wait):
+            self._upload_batch(collection_name, batch, wait)
+            with lock:
+                if checkpoint_path:
+                    with open(checkpoint_path, "a", encoding="utf-8") as f:
+                        f.write(key + "\n")
+                progress["uploaded"] += len(batch)
+                progress["batches"] += 1
+                sent = progress["uploaded"] + progress["skipped"]
+            logger.info(f"📦 `{collection_name}`: {sent}/{total} pontos enviados")
+            if self.on_progress:
+                self.on_progress(sent, total)
+
+        pending = []
+        for batch in self.batches(points):
+            key = self._batch_key(batch)
+            if key in done:
+                progress["skipped"] += len(batch)
+                continue
+            pending.append((batch, key))
+
+        last = pending.pop() if pending else None
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            futures = [executor.submit(run, batch, key, wait) for batch, key in pending]
+            for future in as_completed(futures):
+                # Propaga a primeira falha definitiva; o checkpoint guarda o resto
+                future.result()
+        if last:
+            # Barreira: só retorna depois que o Qdrant aplicou a carga inteira
+            run(*last, True)
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.monotonic() - started
+        logger.info(f"✅ `{collection_name}`: {progress['uploaded']} pontos enviados ({progress['skipped']} já estavam no checkpoint) em {elapsed:.1f}s")
+        return {**progress, "seconds": elapsed}
+
+
+def prune_stale_points(client, collection_name: str, points, source_key: str = "source") -> int:
+    """
+    Apaga da coleção os pontos das fontes de `points` (payload `source_key`) que
+    não estão em `points`: chunks de uma versão anterior da página que sumiram
+    ou mudaram. Retorna quantos pontos foram apagados.
+    """
+    keep = {}
+    for point in points:
+        source = (point.payload or {}).get(source_key)
+        if source:
+            keep.setdefault(source, set()).add(str(point.id))
+    sources = list(keep)
+    stale = []
+    for start in range(0, len(sources), 100):
+        scroll_filter = Filter(must=[FieldCondition(key=source_key, match=MatchAny(any=sources[start:start + 100]))])
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name, scroll_filter=scroll_filter, limit=1000, offset=offset,
+                with_payload=[source_key], with_vectors=False,
+            )
+            stale += [
+                record.id for record in records
+                if str(record.id) not in keep.get((record.payload or {}).get(source_key), ())
+            ]
+            if offset is None:
+                break
+    if stale:
+        client.delete(collection_name, points_selector=PointIdsList(points=stale), wait=True)
+        logger.info(f"🧹 `{collection_name}`: {len(stale)} pontos antigos de {len(sources)} fontes removidos")
+    return len(stale)
+
+
+def document_points(docs, vectors, ids, content_key: str = "page_content", metadata_key: str = "metadata"):
+    """Pontos no mesmo formato de payload do vectorstore `Qdrant` do LangChain."""
+    return [
+        PointStruct(
+            id=point_id,
+            vector=list(vector),
+            payload={content_key: doc.page_content, metadata_key: doc.metadata},
+        )
+        for doc, vector, point_id in zip(docs, vectors, ids)
+    ]
@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+from datetime import datetime
+from shared.collection_versions import bump_collection
+from qdrant_client.http.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    InitFrom,
+)
+
+logger = logging.getLogger(__name__)
+
+# Coleções físicas de um rebuild: `<nome lógico>__v<timestamp>`
+VERSION_SEP = "__v"
+
+
+def is_versioned(name: str) -> bool:
+    return VERSION_SEP in name
+
+
+def logical_name(name: str) -> str:
+    return name.split(VERSION_SEP, 1)[0]
+
+
+def versioned_name(logical: str) -> str:
+    return f"{logical}{VERSION_SEP}{datetime.now():%Y%m%d%H%M%S%f}"
+
+
+def logical_collections(client) -> dict:
+    """
+    Coleções consultáveis pelo nome lógico: `{nome: coleção física}`.
+
+    Inclui os aliases e as coleções comuns; as versões físicas criadas pelos
+    rebuilds ficam de fora (são acessadas só pelo alias).
+    """
+    resolved = {
+        col.name: col.name
+        for col in client.get_collections().collections
+        if not is_versioned(col.name)
+    }
+    for alias in client.get_aliases().aliases:
+        resolved[alias.alias_name] = alias.collection_name
+    return resolved
+
+
+def collection_versions(client, logical: str) -> list:
+    """Versões físicas existentes de uma coleção lógica, da mais antiga à mais nova."""
+    prefix = f"{logical}{VERSION_SEP}"
+    return sorted(col.name for col in client.get_collections().collections if col.name.startswith(prefix))
+
+
+def drop_logical_collection(client, logical: str):
+    """Apaga o alias (se houver), todas as versões físicas e a coleção comum homônima."""
+    aliases = {alias.alias_name for alias in client.get_aliases().aliases}
+    if logical in aliases:
+        client.update_collection_aliases(
+            change_aliases_operations=[DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=logical))]
+        )
+    for physical in collection_versions(client, logical):
+        client.delete_collection(physical)
+    if logical not in aliases:
+        client.delete_collection(logical)
+
+
+class BlueGreenRebuild:
+    """
+    Reconstrução sem downtime de uma coleção, via alias do Qdrant.
+
+        with BlueGreenRebuild(client, "ufsm_faqs", vectors_config) as rebuild:
+            client.upsert(rebuild.collection_name, points)
+
+    Os dados vão para uma coleção versionada nova; enquanto isso o alias
+    `ufsm_faqs` continua apontando para a versão anterior, então as consultas
+    não veem uma coleção vazia ou pela metade. Ao sair do bloco sem erro a nova
+    versão é aquecida e o alias troca de destino numa única operação atômica;
+    as versões antigas além de `keep_versions` são apagadas. Se o bloco falhar,
+    a versão nova é descartada e nada muda para quem consulta.
+
+    Se o nome lógico ainda for uma coleção comum (primeiro rebuild), ela é
+    copiada antes para uma versão física, que fica como a anterior para rollback;
+    na troca só resta apagar a comum e criar o alias, em chamadas seguidas.
+    """
+
+    def __init__(self, client, logical: str, vectors_config, keep_versions: int = None, warm_timeout: float = None):
+        self.client = client
+        self.logical = logical
+        self.vectors_config = vectors_config
+        self.keep_versions = keep_versions if keep_versions is not None else int(os.getenv("ALIAS_KEEP_VERSIONS", 1))
+        self.warm_timeout = warm_timeout or float(os.getenv("ALIAS_WARM_TIMEOUT", 60))
+        self.collection_name = versioned_name(logical)
+        self.backup_name = None
+
+    def __enter__(self):
+        self.adopt_plain_collection()
+        # Depois da cópia, para a versão nova ser a mais recente na ordem dos nomes
+        self.collection_name = versioned_name(self.logical)
+        logger.info(f"🆕 Rebuild de `{self.logical}` em `{self.collection_name}`")
+        self.client.create_collection(collection_name=self.collection_name, vectors_config=self.vectors_config)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            logger.error(f"❌ Rebuild de `{self.logical}` falhou, descartando `{self.collection_name}`: {exc}")
+            try:
+                self.client.delete_collection(self.collection_name)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao descartar `{self.collection_name}`: {e}")
+            return False
+        self.warm()
+        self.switch()
+        self.prune()
+        return False
+
+    def _plain_exists(self) -> bool:
+        aliases = {alias.alias_name for alias in self.client.get_aliases().aliases}
+        collections = {col.name for col in self.client.get_collections().collections}
+        return self.logical not in aliases and self.logical in collections
+
+    def adopt_plain_collection(self):
+        """Copia uma coleção comum com o nome lógico para uma versão física (rollback)."""
+        if not self._plain_exists():
+            return
+        info = self.client.get_collection(self.logical)
+        self.backup_name = versioned_name(self.logical)
+        logger.info(f"📦 `{self.logical}` é uma coleção comum; copiando para `{self.backup_name}`")
+        self.client.create_collection(
+            collection_name=self.backup_name,
+            vectors_config=info.config.params.vectors,
+            init_from=InitFrom(collection=self.logical),
+        )
+        deadline = time.monotonic() + self.warm_timeout
+        while (self.client.get_collection(self.backup_name).points_count or 0) < (info.points_count or 0):
+            if time.monotonic() > deadline:
+                self.client.delete_collection(self.backup_name)
+                raise RuntimeError(f"Cópia de `{self.logical}` para `{self.backup_name}` não terminou em {self.warm_timeout:.0f}s")
+            time.sleep(0.5)
+
+    def warm(self):
+        """Espera a indexação terminar e faz uma busca para carregar os segmentos."""
+        deadline = time.monotonic() + self.warm_timeout
+        while time.monotonic() < deadline:
+            info = self.client.get_collection(self.collection_name)
+            if str(getattr(info.status, "value", info.status)) == "green":
+                break
+            time.sleep(0.5)
+        else:
+            logger.warning(f"⚠️ `{self.collection_name}` não ficou green em {self.warm_timeout:.0f}s; trocando mesmo assim")
+
+        points, _ = self.client.scroll(self.collection_name, limit=1, with_vectors=True)
+        if points and points[0].vector is not None:
+            vector = points[0].vector
+            if isinstance(vector, dict):
+                name, vector = next(iter(vector.items()))
+                vector = (name, vector)
+            self.client.search(collection_name=self.collection_name, query_vector=vector, limit=1)
+
+    def switch(self):
+        """Aponta o alias lógico para a nova versão numa operação atômica."""
+        aliases = {alias.alias_name for alias in self.client.get_aliases().aliases}
+        operations = []
+        if self.logical in aliases:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.logical)))
+        elif self.logical in {col.name for col in self.client.get_collections().collections}:
+            # Migração única: a comum já foi copiada no __enter__ e impede o alias;
+            # o alias é criado logo em seguida
+            logger.warning(f"⚠️ `{self.logical}` era uma coleção comum; substituindo por alias")
+            self.client.delete_collection(self.logical)
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(
+            collection_name=self.collection_name, alias_name=self.logical
+        )))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        bump_collection(self.logical)
+        logger.info(f"🔀 Alias `{self.logical}` → `{self.collection_name}`")
+
+    def prune(self):
+        """Apaga as versões antigas, mantendo `keep_versions` anteriores para rollback."""
+        previous = [name for name in collection_versions(self.client, self.logical) if name != self.collection_name]
+        stale = previous[:-self.keep_versions] if self.keep_versions else previous
+        for name in stale:
+            try:
+                self.client.delete_collection(name)
+                logger.info(f"🧹 Versão antiga `{name}` removida")
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao remover `{name}`: {e}")
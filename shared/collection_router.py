@@ -1,10 +1,15 @@
 import os
 import json
+import time
 import logging
+import threading
 from typing import Optional
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from qdrant_client import QdrantClient
 import joblib
+from shared.routing_index import CentroidRoutingIndex
+from shared.collection_aliases import logical_collections
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,30 @@ class CollectionRouter:
         self.log_path = log_path
         self.model = self._load_model()
 
+        # Votação vetorial em paralelo
+        self.max_workers = int(os.getenv("ROUTER_MAX_WORKERS", 8))
+        self.search_timeout = float(os.getenv("ROUTER_SEARCH_TIMEOUT", 2.0))  # segundos para a votação inteira
+        self.early_exit_score = float(os.getenv("ROUTER_EARLY_EXIT_SCORE", 0.85))
+        self.early_exit_margin = float(os.getenv("ROUTER_EARLY_EXIT_MARGIN", 0.15))
+        self.collections_refresh_seconds = int(os.getenv("COLLECTIONS_REFRESH_SECONDS", 60))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="router-search")
+        self._collections = None
+        self._collections_checked_at = 0.0
+        self._collections_failed_at = 0.0
+        self._lock = threading.Lock()
+
+        # Índice de centróides: votação completa só para empates com margem baixa
+        self.centroid_margin = float(os.getenv("ROUTER_CENTROID_MARGIN", 0.05))
+        self.index = CentroidRoutingIndex(client)
+        # Atualizações do índice: um único worker próprio (não disputam o pool
+        # das buscas) e, após uma falha, espera antes de tentar de novo
+        self.refresh_backoff = float(os.getenv("ROUTER_REFRESH_BACKOFF", 30))
+        self._refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router-refresh")
+        self._refresh_in_flight = False
+        self._refresh_failed_at = 0.0
+        # Callbacks chamados com a lista de coleções alteradas (ex: re-ingestão)
+        self.change_listeners = []
+
     def _load_model(self):
         if os.path.exists(self.model_path):
             logger.info(f"📦 Modelo supervisionado carregado de: {self.model_path}")
@@ -33,6 +62,8 @@ class CollectionRouter:
         return None
 
     def decide(self, question: str, max_results_per_collection: int = 3) -> Optional[str]:
+        self._schedule_index_refresh()
+
         # 1. Heurística
         heuristica = self.heuristic(question)
         if heuristica:
@@ -48,34 +79,153 @@ class CollectionRouter:
             except Exception as e:
                 logger.warning(f"⚠️ Falha ao usar o modelo supervisionado: {e}")
 
-        # 3. Votação vetorial
-        return self._rerank_by_vector_voting(question, max_results_per_collection)
-
-    def _rerank_by_vector_voting(self, question: str, top_k: int) -> Optional[str]:
         question_embedding = self.embedding_model.embed_query(question)
+
+        # 3. Índice de centróides (local, sem chamadas ao Qdrant)
+        if not self.index.built and not self._refresh_failed_at:
+            # Primeira construção: síncrona para já servir esta pergunta; se
+            # falhar, as novas tentativas ficam com o worker em segundo plano
+            self.refresh_index()
+        best, margin, scores = self.index.route(question_embedding)
+        if best and margin >= self.centroid_margin:
+            logger.info(f"🧭 Centróides elegeram: `{best}` (margem {margin:.4f})")
+            self._log_decision(question, best, scores)
+            return best
+        if best:
+            logger.info(f"🧭 Margem baixa entre centróides ({margin:.4f}), confirmando com votação vetorial")
+
+        # 4. Votação vetorial
+        return self._rerank_by_vector_voting(question, max_results_per_collection, question_embedding)
+
+    def _backing_off(self, failed_at: float) -> bool:
+        return bool(failed_at) and time.monotonic() - failed_at < self.refresh_backoff
+
+    def _schedule_index_refresh(self):
+        """Atualiza o índice em segundo plano para não bloquear a pergunta."""
+        if self.index.built:
+            if not self.index.is_stale():
+                return
+        elif not self._refresh_failed_at:
+            return  # a primeira construção é feita em `decide`
+        with self._lock:
+            if self._refresh_in_flight or self._backing_off(self._refresh_failed_at):
+                return
+            self._refresh_in_flight = True
+        self._refresh_executor.submit(self._background_refresh)
+
+    def _background_refresh(self):
+        try:
+            self.refresh_index()
+        finally:
+            with self._lock:
+                self._refresh_in_flight = False
+
+    def refresh_index(self, force: bool = False) -> list:
+        """
+        Recalcula os centróides das coleções alteradas desde a última verificação
+        (ou de todas, com `force=True`). Retorna as coleções alteradas.
+        """
+        try:
+            changed = self.index.refresh(force=force)
+        except Exception as e:
+            self._refresh_failed_at = time.monotonic()
+            logger.warning(f"⚠️ Falha ao atualizar índice de roteamento (nova tentativa em {self.refresh_backoff:.0f}s): {e}")
+            return []
+        self._refresh_failed_at = 0.0
+        if changed:
+            self.invalidate_collections()
+            for listener in self.change_listeners:
+                try:
+                    listener(changed)
+                except Exception as e:
+                    logger.warning(f"⚠️ Falha ao notificar mudança de coleções: {e}")
+        return changed
+
+    def _available_collections(self):
+        with self._lock:
+            if (
+                self._collections is not None
+                and time.monotonic() - self._collections_checked_at <= self.collections_refresh_seconds
+            ):
+                return list(self._collections)
+            if self._backing_off(self._collections_failed_at):
+                # Listagem falhou há pouco: não repete a ida ao Qdrant a cada pergunta
+                return list(self._collections or [])
+        # Nomes lógicos: aliases de rebuilds blue/green e coleções comuns
+        try:
+            collections = list(logical_collections(self.client))
+        except Exception:
+            with self._lock:
+                self._collections_failed_at = time.monotonic()
+            raise
+        with self._lock:
+            self._collections = collections
+            self._collections_checked_at = time.monotonic()
+            self._collections_failed_at = 0.0
+        return list(collections)
+
+    def invalidate_collections(self):
+        with self._lock:
+            self._collections = None
+
+    def _search_avg_score(self, collection_name: str, question_embedding, top_k: int) -> Optional[float]:
+        results = self.client.search(
+            collection_name=collection_name,
+            query_vector=question_embedding,
+            limit=top_k
+        )
+        if not results:
+            return None
+        return sum(r.score for r in results if r.score) / len(results)
+
+    def _is_clear_winner(self, scores: dict) -> bool:
+        # Com um só score não há com quem comparar: a rota dependeria de qual
+        # busca terminou primeiro
+        if len(scores) < 2:
+            return False
+        best, runner_up = sorted(scores.values(), reverse=True)[:2]
+        return best >= self.early_exit_score and best - runner_up >= self.early_exit_margin
+
+    def _rerank_by_vector_voting(self, question: str, top_k: int, question_embedding=None) -> Optional[str]:
+        if question_embedding is None:
+            question_embedding = self.embedding_model.embed_query(question)
         logger.info(f"🔎 Votação vetorial ativada para: {question}")
 
         try:
-            collections = self.client.get_collections()
-            available = [col.name for col in collections.collections]
+            available = self._available_collections()
             if not available:
                 logger.warning("❌ Nenhuma coleção disponível.")
                 return None
 
+            # Todas as buscas saem juntas; a latência fica perto de uma ida ao Qdrant
+            pending = {
+                self._executor.submit(self._search_avg_score, col, question_embedding, top_k): col
+                for col in available
+            }
+            deadline = time.monotonic() + self.search_timeout
             scores = {}
-            for col in available:
-                try:
-                    results = self.client.search(
-                        collection_name=col,
-                        query_vector=question_embedding,
-                        limit=top_k
-                    )
-                    if results:
-                        avg_score = sum(r.score for r in results if r.score) / len(results)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    col = pending.pop(future)
+                    try:
+                        avg_score = future.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Erro ao buscar na `{col}`: {e}")
+                        continue
+                    if avg_score is not None:
                         scores[col] = avg_score
                         logger.debug(f"📊 Score médio para `{col}`: {avg_score:.4f}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Erro ao buscar na `{col}`: {e}")
+                if scores and pending and self._is_clear_winner(scores):
+                    logger.debug(f"⏩ Saída antecipada, {len(pending)} coleções ignoradas")
+                    break
+
+            for future, col in pending.items():
+                future.cancel()
+                logger.debug(f"⏱️ Busca em `{col}` descartada (timeout ou saída antecipada)")
 
             if not scores:
                 logger.warning("⚠️ Nenhuma coleção retornou resultados.")
@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "collection_version:"
+
+
+def _default_redis_url() -> str:
+    host = os.getenv("REDIS_HOST", "redis")
+    port = os.getenv("REDIS_PORT", 6379)
+    return os.getenv("COLLECTION_VERSIONS_REDIS_URL", f"redis://{host}:{port}")
+
+
+class CollectionVersions:
+    """
+    Versão de cada coleção lógica, compartilhada entre serviços pelo Redis.
+
+    O serviço de ingestão chama `bump(nome)` sempre que grava, apaga ou troca o
+    alias de uma coleção; o de recuperação lê `get(nome)` para saber se o que ele
+    guardou em cache (ex: respostas do cache semântico) ainda vale. As leituras
+    ficam em memória por `check_seconds` (COLLECTION_VERSION_CHECK_SECONDS), então
+    a consulta ao Redis custa no máximo uma ida por coleção nesse intervalo.
+
+    Sem Redis acessível as operações viram no-op (com aviso): `get` devolve None
+    e quem usa cai só no TTL do próprio cache.
+    """
+
+    def __init__(self, redis_url: str = None, check_seconds: float = None):
+        self.redis_url = redis_url if redis_url is not None else _default_redis_url()
+        self.check_seconds = check_seconds if check_seconds is not None else float(os.getenv("COLLECTION_VERSION_CHECK_SECONDS", 5))
+        self._redis = None
+        # Depois de uma falha, espera um pouco antes de tentar o Redis de novo
+        self._down_until = 0.0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if not self.redis_url or time.monotonic() < self._down_until:
+            return None
+        if self._redis is None:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(self.redis_url, socket_connect_timeout=1, socket_timeout=1)
+            except Exception as e:
+                logger.warning(f"⚠️ Versões de coleção sem Redis: {e}")
+                self.redis_url = ""
+                return None
+        return self._redis
+
+    def bump(self, *collection_names):
+        """Marca as coleções como alteradas para todos os serviços."""
+        client = self._client()
+        if client is None or not collection_names:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for name in collection_names:
+                pipe.incr(f"{KEY_PREFIX}{name}")
+            pipe.execute()
+        except Exception as e:
+            self._down_until = time.monotonic() + 30
+            logger.warning(f"⚠️ Falha ao publicar nova versão de {list(collection_names)}: {e}")
+
+    def get(self, collection_name: str) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._seen.get(collection_name)
+            if cached and now - cached[1] < self.check_seconds:
+                return cached[0]
+        client = self._client()
+        if client is None:
+            return cached[0] if cached else None
+        try:
+            raw = client.get(f"{KEY_PREFIX}{collection_name}")
+        except Exception as e:
+            self._down_until = time.monotonic() + 30
+            logger.warning(f"⚠️ Falha ao ler a versão de `{collection_name}`: {e}")
+            return cached[0] if cached else None
+        version = int(raw) if raw else 0
+        with self._lock:
+            self._seen[collection_name] = (version, now)
+        return version
+
+
+_versions = None
+_versions_lock = threading.Lock()
+
+
+def get_collection_versions() -> CollectionVersions:
+    global _versions
+    with _versions_lock:
+        if _versions is None:
+            _versions = CollectionVersions()
+        return _versions
+
+
+def bump_collection(*collection_names):
+    get_collection_versions().bump(*collection_names)
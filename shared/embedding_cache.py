@@ -0,0 +1,187 @@
+import os
+import logging
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Camada de cache em volta de um modelo de embeddings do LangChain.
+
+    A chave é (modelo, texto normalizado). Primeiro consulta um LRU em memória,
+    depois (opcional) o Redis e o `EmbeddingStore` em disco; só os textos
+    ausentes vão para o modelo real.
+    Como implementa `Embeddings`, pode ser passado direto ao vectorstore `Qdrant`.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, max_entries: int = None, redis_url: str = None, redis_ttl: int = None, store=None):
+        self.base = base
+        self.model_name = model_name
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+        self.redis_url = redis_url if redis_url is not None else os.getenv("EMBEDDING_CACHE_REDIS_URL", "")
+        self.redis_ttl = redis_ttl or int(os.getenv("EMBEDDING_CACHE_TTL", 7 * 24 * 3600))
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.store = store
+        self._redis = None
+        self._counters = {"hits": 0, "redis_hits": 0, "store_hits": 0, "misses": 0}
+
+    # ------------------------------------------------------------------ chaves
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(f"{self.model_name}\x00{self.normalize(text)}".encode("utf-8")).hexdigest()
+        return f"emb:{digest}"
+
+    # ------------------------------------------------------------------- redis
+    def _redis_client(self):
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(self.redis_url)
+            except Exception as e:
+                logger.warning(f"⚠️ Cache de embeddings sem Redis: {e}")
+                self.redis_url = ""
+                return None
+        return self._redis
+
+    # ------------------------------------------------------------------- cache
+    def _incr(self, field: str, amount: int):
+        with self._lock:
+            self._counters[field] += amount
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+        self._incr("hits", len(found))
+
+        missing = [key for key in keys if key not in found]
+        client = self._redis_client()
+        if missing and client is not None:
+            try:
+                raw_values = client.mget(missing)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao ler embeddings do Redis: {e}")
+                raw_values = [None] * len(missing)
+            from_redis = {
+                key: array("f", raw).tolist()
+                for key, raw in zip(missing, raw_values) if raw
+            }
+            if from_redis:
+                self._incr("redis_hits", len(from_redis))
+                self._remember(from_redis, write_through=False)
+                found.update(from_redis)
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.store is not None:
+            try:
+                from_store = self.store.get_many(missing)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao ler embeddings do disco: {e}")
+                from_store = {}
+            if from_store:
+                self._incr("store_hits", len(from_store))
+                self._remember(from_store, write_through=False)
+                found.update(from_store)
+        return found
+
+    def _remember(self, items: dict, write_through: bool = True):
+        with self._lock:
+            for key, vector in items.items():
+                self._lru[key] = vector
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+        client = self._redis_client()
+        if write_through and items and client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, vector in items.items():
+                    pipe.set(key, array("f", vector).tobytes(), ex=self.redis_ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao gravar embeddings no Redis: {e}")
+
+        if write_through and items and self.store is not None:
+            try:
+                self.store.put_many(items)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao gravar embeddings em disco: {e}")
+
+    def _split(self, texts: List[str]):
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        # Textos repetidos no mesmo lote são embutidos uma única vez
+        pending = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        self._incr("misses", len(pending))
+        return keys, found, pending
+
+    # ------------------------------------------------------------ Embeddings
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._split(texts)
+        if pending:
+            vectors = self.base.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._remember(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._split([text])
+        if pending:
+            vector = self.base.embed_query(text)
+            self._remember({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._split(texts)
+        if pending:
+            vectors = await self.base.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._remember(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._split([text])
+        if pending:
+            vector = await self.base.aembed_query(text)
+            self._remember({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    # ---------------------------------------------------------------- métricas
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._lru)
+        hits = counters["hits"] + counters["redis_hits"] + counters["store_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "size": size,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "redis": bool(self.redis_url),
+            "store": self.store.path if self.store is not None else None,
+        }
@@ -0,0 +1,310 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Janela deslizante de 60s para requisições (RPM) e tokens (TPM).
+    `acquire` bloqueia até a requisição caber nos dois limites; `aacquire` é o
+    equivalente para corrotinas, sem prender uma thread.
+    """
+
+    WINDOW = 60.0
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._events = deque()
+        self._tokens = 0
+        self._cond = threading.Condition()
+
+    def _expire(self, now: float):
+        while self._events and now - self._events[0][0] >= self.WINDOW:
+            _, tokens = self._events.popleft()
+            self._tokens -= tokens
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserva e retorna 0, ou retorna quanto esperar antes de tentar de novo."""
+        now = time.monotonic()
+        self._expire(now)
+        if len(self._events) < self.rpm and self._tokens + tokens <= self.tpm:
+            self._events.append((now, tokens))
+            self._tokens += tokens
+            return 0.0
+        wait = self.WINDOW - (now - self._events[0][0]) if self._events else 0.05
+        return max(wait, 0.05)
+
+    @staticmethod
+    def _check_deadline(deadline: float, wait: float):
+        if deadline is not None and time.monotonic() + wait > deadline:
+            raise TimeoutError("Limite de RPM/TPM de embeddings não libera antes do prazo")
+
+    def acquire(self, tokens: int, deadline: float = None) -> float:
+        """
+        Reserva uma requisição com `tokens`; retorna quanto tempo esperou.
+        Com `deadline` (instante de `time.monotonic()`), levanta `TimeoutError`
+        em vez de esperar além dele.
+        """
+        # Um lote maior que o TPM inteiro nunca caberia: limita à janela cheia
+        tokens = min(tokens, self.tpm)
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._reserve(tokens)
+                if not wait:
+                    return time.monotonic() - started
+                self._check_deadline(deadline, wait)
+                self._cond.wait(timeout=wait)
+
+    async def aacquire(self, tokens: int, deadline: float = None) -> float:
+        tokens = min(tokens, self.tpm)
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._reserve(tokens)
+            if not wait:
+                return time.monotonic() - started
+            self._check_deadline(deadline, wait)
+            await asyncio.sleep(wait)
+
+
+class EmbeddingExecutor(Embeddings):
+    """
+    Executor de embeddings em lotes, ciente dos limites da OpenAI.
+
+    - Empacota os textos em lotes por número de tokens (`max_batch_tokens`) e
+      de entradas (`max_batch_inputs`);
+    - Roda até `max_concurrency` lotes em paralelo, respeitando RPM/TPM;
+    - Refaz com backoff exponencial (e `Retry-After`, quando houver) erros 429,
+      timeouts, falhas de conexão e 5xx, até `max_retries` tentativas, backoff de
+      no máximo `max_backoff` segundos e, se definido, `deadline` segundos por
+      chamada (inclusive esperando RPM/TPM) — a ingestão aguenta esperar, o
+      caminho de consulta do serviço de recuperação configura um orçamento curto;
+    - Mantém métricas de vazão em `stats()`.
+
+    Implementa `Embeddings`, então fica por baixo do `CachedEmbeddings` e é usado
+    por todos os caminhos que chamam `embed_documents`. `aembed_*` usa as
+    chamadas assíncronas do modelo base, sem ocupar threads.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model_name: str,
+        max_batch_tokens: int = None,
+        max_batch_inputs: int = None,
+        max_concurrency: int = None,
+        rpm: int = None,
+        tpm: int = None,
+        max_retries: int = None,
+        max_backoff: float = None,
+        deadline: float = None,
+    ):
+        self.base = base
+        self.model_name = model_name
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv("EMBED_BATCH_TOKENS", 50000))
+        self.max_batch_inputs = max_batch_inputs or int(os.getenv("EMBED_BATCH_INPUTS", 512))
+        self.max_concurrency = max_concurrency or int(os.getenv("EMBED_CONCURRENCY", 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EMBED_MAX_RETRIES", 6))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv("EMBED_MAX_BACKOFF", 60))
+        # Prazo total de uma chamada em segundos (0 = sem prazo)
+        self.deadline = deadline if deadline is not None else float(os.getenv("EMBED_DEADLINE", 0))
+        self.limiter = RateLimiter(
+            rpm=rpm or int(os.getenv("EMBED_RPM", 3000)),
+            tpm=tpm or int(os.getenv("EMBED_TPM", 1000000)),
+        )
+
+        self._encoding = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._counters = {
+            "requests": 0, "texts": 0, "tokens": 0, "retries": 0,
+            "rate_limited": 0, "failures": 0, "throttled_seconds": 0.0, "busy_seconds": 0.0,
+        }
+
+    # ---------------------------------------------------------------- tokens
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model_name)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoding = False
+        if self._encoding is False:
+            return max(1, len(text) // 4)
+        return max(1, len(self._encoding.encode(text, disallowed_special=())))
+
+    def pack(self, texts: List[str]):
+        """Agrupa índices de `texts` em lotes de até `max_batch_tokens`/`max_batch_inputs`."""
+        batches, current, current_tokens = [], [], 0
+        for index, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_inputs
+            ):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    # -------------------------------------------------------------- execução
+    def _incr(self, **amounts):
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+            for field, amount in amounts.items():
+                self._counters[field] += amount
+
+    @staticmethod
+    def _retry_after(error) -> float:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return 0.0
+
+    @staticmethod
+    def _is_retryable(error) -> bool:
+        try:
+            import openai
+            if isinstance(error, (openai.RateLimitError, openai.APIConnectionError,
+                                  openai.APITimeoutError, openai.InternalServerError)):
+                return True
+        except ImportError:
+            pass
+        status = getattr(error, "status_code", None)
+        return status == 429 or (status is not None and status >= 500)
+
+    def _deadline_at(self):
+        return time.monotonic() + self.deadline if self.deadline else None
+
+    def _backoff(self, error, attempt: int, waited: float, deadline_at) -> float:
+        """Backoff até a próxima tentativa; relança `error` se não houver mais tentativas ou prazo."""
+        self._incr(throttled_seconds=waited)
+        if attempt == self.max_retries or not self._is_retryable(error):
+            self._incr(failures=1)
+            raise error
+        backoff = max(self._retry_after(error), min(self.max_backoff, 2 ** attempt) * (0.5 + random.random()))
+        if deadline_at is not None and time.monotonic() + backoff > deadline_at:
+            self._incr(failures=1)
+            raise error
+        rate_limited = getattr(error, "status_code", None) == 429
+        self._incr(retries=1, rate_limited=int(rate_limited))
+        logger.warning(f"⚠️ Embedding falhou (tentativa {attempt + 1}): {error}; nova tentativa em {backoff:.1f}s")
+        return backoff
+
+    def _done(self, tokens: int, texts: int, waited: float, started: float):
+        self._incr(
+            requests=1, texts=texts, tokens=tokens,
+            throttled_seconds=waited, busy_seconds=time.monotonic() - started,
+        )
+
+    def _call(self, fn, tokens: int, texts: int):
+        deadline_at = self._deadline_at()
+        for attempt in range(self.max_retries + 1):
+            waited = self.limiter.acquire(tokens, deadline_at)
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                time.sleep(self._backoff(e, attempt, waited, deadline_at))
+                continue
+            self._done(tokens, texts, waited, started)
+            return result
+
+    async def _acall(self, afn, tokens: int, texts: int):
+        deadline_at = self._deadline_at()
+        for attempt in range(self.max_retries + 1):
+            waited = await self.limiter.aacquire(tokens, deadline_at)
+            started = time.monotonic()
+            try:
+                result = await afn()
+            except Exception as e:
+                await asyncio.sleep(self._backoff(e, attempt, waited, deadline_at))
+                continue
+            self._done(tokens, texts, waited, started)
+            return result
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed")
+            return self._pool
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        return self._call(lambda: self.base.embed_documents(texts), tokens, len(texts))
+
+    # ------------------------------------------------------------ Embeddings
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.pack(texts)
+        if len(batches) == 1:
+            return self._embed_batch(list(texts), batches[0][1])
+
+        futures = [
+            self._executor().submit(self._embed_batch, [texts[i] for i in indices], tokens)
+            for indices, tokens in batches
+        ]
+        vectors = [None] * len(texts)
+        for (indices, _), future in zip(batches, futures):
+            for index, vector in zip(indices, future.result()):
+                vectors[index] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(lambda: self.base.embed_query(text), self.count_tokens(text), 1)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_batch(indices, tokens):
+            batch = [texts[i] for i in indices]
+            async with semaphore:
+                return await self._acall(lambda: self.base.aembed_documents(batch), tokens, len(batch))
+
+        batches = self.pack(texts)
+        results = await asyncio.gather(*(embed_batch(indices, tokens) for indices, tokens in batches))
+        vectors = [None] * len(texts)
+        for (indices, _), batch_vectors in zip(batches, results):
+            for index, vector in zip(indices, batch_vectors):
+                vectors[index] = vector
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._acall(lambda: self.base.aembed_query(text), self.count_tokens(text), 1)
+
+    # ---------------------------------------------------------------- métricas
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            **counters,
+            "tokens_per_second": counters["tokens"] / elapsed if elapsed else 0.0,
+            "texts_per_second": counters["texts"] / elapsed if elapsed else 0.0,
+            "rpm_limit": self.limiter.rpm,
+            "tpm_limit": self.limiter.tpm,
+            "concurrency": self.max_concurrency,
+        }
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import logging
+import threading
+from array import array
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "logs/embeddings.sqlite3")
+
+
+class EmbeddingStore:
+    """
+    Armazém persistente de embeddings endereçado por conteúdo (SQLite).
+
+    A chave é a mesma do `CachedEmbeddings` (hash de modelo + texto normalizado)
+    e o valor é o vetor em float32. Sobrevive a reinícios e a recriação de
+    coleções: reingerir ou migrar textos já vistos não chama a OpenAI.
+    """
+
+    # SQLite limita o número de parâmetros por consulta
+    _CHUNK = 500
+
+    def __init__(self, path: str = None):
+        self.path = path or STORE_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexão por thread; WAL permite leitores concorrentes com um escritor
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        conn = self._conn()
+        for start in range(0, len(keys), self._CHUNK):
+            chunk = keys[start:start + self._CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+            )
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -1,11 +1,56 @@
 import os
+import time
+import threading
+from collections import OrderedDict
 from langchain.chains import RetrievalQA
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import Qdrant
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http.models import VectorParams, Distance, PointStruct
 
 from langchain.prompts import PromptTemplate
+from shared.embedding_cache import CachedEmbeddings
+from shared.embedding_executor import EmbeddingExecutor
+from shared.embedding_store import EmbeddingStore
+from shared.point_ids import indexed_point_ids
+from shared.bulk_upload import BulkUploader, checkpoint_path_for, prune_stale_points
+from shared.collection_versions import bump_collection
+from shared.collection_aliases import BlueGreenRebuild, logical_collections, drop_logical_collection
+
+# Um executor por modelo no processo: os vários containers criados pelos
+# módulos de ingestão dividem o mesmo orçamento de RPM/TPM
+_embedding_executors = {}
+_embedding_executors_lock = threading.Lock()
+
+
+def _shared_embedding_executor(model_name: str, api_key: str) -> EmbeddingExecutor:
+    with _embedding_executors_lock:
+        executor = _embedding_executors.get(model_name)
+        if executor is None:
+            executor = EmbeddingExecutor(
+                OpenAIEmbeddings(
+                    model=model_name,
+                    openai_api_key=api_key,
+                    max_retries=0
+                ),
+                model_name=model_name
+            )
+            _embedding_executors[model_name] = executor
+        return executor
+
+
+_embedding_store = None
+
+
+def _shared_embedding_store():
+    """Armazém de embeddings em disco (logs/), desligável com EMBEDDING_STORE_ENABLED=false."""
+    global _embedding_store
+    if os.environ.get("EMBEDDING_STORE_ENABLED", "true").lower() != "true":
+        return None
+    with _embedding_executors_lock:
+        if _embedding_store is None:
+            _embedding_store = EmbeddingStore()
+        return _embedding_store
 
 
 class LangChainContainer:
@@ -15,13 +60,17 @@ class LangChainContainer:
         self.chat_model_name = os.environ.get("OPENAI_CHAT_MODEL", "gpt-4")
         self.top_k = int(os.environ.get("TOP_K", 5))  # Número de documentos a retornar
 
-        # 🔌 Inicializa cliente Qdrant
+        # 🔌 Inicializa cliente Qdrant (o assíncrono é criado sob demanda)
         self.qdrant_client = QdrantClient(host="vector_db", port=6333)
-
-        # 🔤 Embedding
-        self.embedding_model = OpenAIEmbeddings(
-            model=self.embedding_model_name,
-            openai_api_key=self.api_key
+        self._async_qdrant_client = None
+
+        # 🔤 Embedding (cache por texto normalizado + modelo, por cima do executor
+        # em lotes que respeita RPM/TPM e refaz 429 — por isso o cliente não refaz)
+        self.embedding_executor = _shared_embedding_executor(self.embedding_model_name, self.api_key)
+        self.embedding_model = CachedEmbeddings(
+            self.embedding_executor,
+            model_name=self.embedding_model_name,
+            store=_shared_embedding_store()
         )
 
         # 💬 LLM para geração de respostas
@@ -36,6 +85,14 @@ class LangChainContainer:
         self.retriever = None
         self.qa_chain = None
 
+        # Registro LRU de vectorstore/retriever/chain prontos, um por coleção
+        self.chain_cache_size = int(os.environ.get("CHAIN_CACHE_SIZE", 8))
+        self.collections_refresh_seconds = int(os.environ.get("COLLECTIONS_REFRESH_SECONDS", 60))
+        self._chains = OrderedDict()
+        self._known_collections = None
+        self._collections_checked_at = 0.0
+        self._lock = threading.RLock()
+
         # Prompt para a cadeia de QA
         # Usado para formatar a pergunta e o contexto
         self.prompt = PromptTemplate(
@@ -50,32 +107,70 @@ class LangChainContainer:
         """
         )
 
-    def set_collection(self, collection_name: str):
-        existing = [col.name for col in self.qdrant_client.get_collections().collections]
-        if collection_name not in existing:
-            # Cria a coleção com tamanho default (ex: 1536 se for OpenAI embeddings)
-            embedding_dim = len(self.embedding_model.embed_documents(["teste"])[0])
-            self.qdrant_client.recreate_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(
-                    size=embedding_dim,
-                    distance=Distance.COSINE
-                )
-            )
+    @property
+    def async_qdrant_client(self) -> AsyncQdrantClient:
+        """Cliente Qdrant assíncrono, usado pelas chains no modo ASGI."""
+        if self._async_qdrant_client is None:
+            self._async_qdrant_client = AsyncQdrantClient(host="vector_db", port=6333)
+        return self._async_qdrant_client
+
+    def refresh_collections(self):
         """
-        Inicializa a cadeia de recuperação e resposta com a coleção escolhida.
+        Sincroniza a lista de coleções existentes no Qdrant (nomes lógicos, com os
+        aliases dos rebuilds) e descarta do registro as chains de coleções apagadas.
         """
-        self.vectorstore = Qdrant(
-            client=self.qdrant_client,
+        existing = set(logical_collections(self.qdrant_client))
+        with self._lock:
+            self._known_collections = existing
+            self._collections_checked_at = time.monotonic()
+            for name in [name for name in self._chains if name not in existing]:
+                del self._chains[name]
+        return sorted(existing)
+
+    def _collections_stale(self) -> bool:
+        # Chamado com `self._lock`
+        return (
+            self._known_collections is None
+            or time.monotonic() - self._collections_checked_at > self.collections_refresh_seconds
+        )
+
+    def _collection_exists(self, collection_name: str) -> bool:
+        with self._lock:
+            if not self._collections_stale() and collection_name in self._known_collections:
+                return True
+        # Coleção desconhecida ou lista expirada: confirma no Qdrant
+        return collection_name in self.refresh_collections()
+
+    def _ensure_collection(self, collection_name: str, embedding_dim: int = None):
+        if self._collection_exists(collection_name):
+            return
+        # Cria a coleção com tamanho default (ex: 1536 se for OpenAI embeddings)
+        embedding_dim = embedding_dim or len(self.embedding_model.embed_documents(["teste"])[0])
+        self.qdrant_client.recreate_collection(
             collection_name=collection_name,
-            embeddings=self.embedding_model
+            vectors_config=VectorParams(
+                size=embedding_dim,
+                distance=Distance.COSINE
+            )
         )
+        self._mark_created(collection_name)
 
-        self.retriever = self.vectorstore.as_retriever()
+    def _mark_created(self, collection_name: str):
+        with self._lock:
+            if self._known_collections is not None:
+                self._known_collections.add(collection_name)
 
-        self.qa_chain = RetrievalQA.from_chain_type(
+    def _build_chain(self, collection_name: str) -> dict:
+        vectorstore = Qdrant(
+            client=self.qdrant_client,
+            async_client=self.async_qdrant_client,
+            collection_name=collection_name,
+            embeddings=self.embedding_model
+        )
+        retriever = vectorstore.as_retriever(search_kwargs={"k": self.top_k})
+        qa_chain = RetrievalQA.from_chain_type(
             llm=self.chat_model,
-            retriever=self.vectorstore.as_retriever(search_kwargs={"k": self.top_k}),
+            retriever=retriever,
             memory=None,  # só será atribuído depois
             chain_type="stuff",
             input_key="query",
@@ -83,42 +178,110 @@ class LangChainContainer:
             chain_type_kwargs={"prompt": self.prompt},
             return_source_documents=True,
         )
+        return {"vectorstore": vectorstore, "retriever": retriever, "qa_chain": qa_chain}
+
+    def get_chain(self, collection_name: str) -> dict:
+        """
+        Retorna o vectorstore/retriever/chain da coleção, reaproveitando o registro LRU.
+        Em cache hit não há chamada ao Qdrant enquanto a lista de coleções estiver
+        dentro de `COLLECTIONS_REFRESH_SECONDS`; depois disso a existência da
+        coleção é reconfirmada, e a chain de uma coleção apagada é descartada.
+        """
+        with self._lock:
+            entry = self._chains.get(collection_name)
+            if entry is not None:
+                self._chains.move_to_end(collection_name)
+                if not self._collections_stale():
+                    return entry
+
+        # A atualização da lista descarta a chain se a coleção sumiu
+        self._ensure_collection(collection_name)
+        with self._lock:
+            entry = self._chains.get(collection_name)
+            if entry is not None:
+                return entry
+        entry = self._build_chain(collection_name)
+
+        with self._lock:
+            # Outra thread pode ter montado a mesma coleção enquanto isso
+            entry = self._chains.setdefault(collection_name, entry)
+            self._chains.move_to_end(collection_name)
+            while len(self._chains) > self.chain_cache_size:
+                self._chains.popitem(last=False)
+        return entry
+
+    def invalidate_collection(self, collection_name: str):
+        """
+        Remove a coleção do registro (ex: após ser apagada ou recriada por outro serviço).
+        """
+        with self._lock:
+            self._chains.pop(collection_name, None)
+            if self._known_collections is not None:
+                self._known_collections.discard(collection_name)
 
-        # self.qa_chain = RetrievalQA.from_chain_type(
-        #     llm=self.chat_model,
-        #     retriever=self.retriever,
-        #     return_source_documents=True
-        # )
+    def set_collection(self, collection_name: str):
+        """
+        Inicializa a cadeia de recuperação e resposta com a coleção escolhida.
+        """
+        entry = self.get_chain(collection_name)
+        self.vectorstore = entry["vectorstore"]
+        self.retriever = entry["retriever"]
+        self.qa_chain = entry["qa_chain"]
 
-    def store(self, collection_name, sentences, embeddings, metadata):
+    def store(self, collection_name, sentences, embeddings, metadata, recreate: bool = False, checkpoint_path: str = None, replace_sources: bool = False):
         """
         Armazena sentenças com embeddings e metadados no Qdrant.
+
+        Por padrão mescla na coleção existente (criando-a se não existir): os IDs
+        são determinísticos por (fonte, índice, hash do texto), então reingerir a
+        mesma fonte sobrescreve os mesmos pontos e escritores concorrentes de
+        fontes diferentes não se apagam. `recreate=True` substitui a coleção por
+        um rebuild blue/green: os dados vão para uma versão nova e o alias só troca
+        no fim, sem deixar a coleção vazia para as consultas.
+
+        Com `replace_sources=True` cada `metadata["source"]` enviada é tratada como
+        a versão completa daquela fonte: depois do envio, os pontos antigos dela que
+        não vieram de novo (texto editado ou encurtado) são apagados.
+
+        O envio é feito pelo `BulkUploader` (lotes limitados, em paralelo, com
+        retry); uma carga interrompida retoma de onde parou na próxima chamada, pelo
+        checkpoint da coleção (`checkpoint_path` ou, por padrão, um por coleção em
+        `UPLOAD_CHECKPOINT_DIR`). A chamada só retorna com os pontos gravados.
         """
         if not embeddings:
             raise ValueError("Lista de embeddings vazia.")
 
         embedding_dim = len(embeddings[0])
 
-        # (Re)criar coleção
-        self.qdrant_client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(
-                size=embedding_dim,
-                distance=Distance.COSINE
-            )
-        )
-
         # Criar pontos com payload
+        ids = indexed_point_ids(sentences, metadata)
         points = [
             PointStruct(
-                id=i,
-                vector=embedding,
+                id=ids[i],
+                vector=list(embedding),
                 payload={**metadata[i], "text": sentence}
             )
             for i, (sentence, embedding) in enumerate(zip(sentences, embeddings))
         ]
 
-        self.qdrant_client.upsert(collection_name=collection_name, points=points)
+        uploader = BulkUploader(self.qdrant_client)
+
+        # Retomando uma carga interrompida: continua na coleção atual
+        resuming = bool(checkpoint_path) and os.path.exists(checkpoint_path)
+        if recreate and not resuming:
+            vectors_config = VectorParams(size=embedding_dim, distance=Distance.COSINE)
+            with BlueGreenRebuild(self.qdrant_client, collection_name, vectors_config) as rebuild:
+                result = uploader.upload(rebuild.collection_name, points, wait=True)
+            self.invalidate_collection(collection_name)
+            self._mark_created(collection_name)
+            return result
+
+        self._ensure_collection(collection_name, embedding_dim)
+        result = uploader.upload(collection_name, points, checkpoint_path=checkpoint_path or checkpoint_path_for(collection_name))
+        if replace_sources:
+            result["deleted"] = prune_stale_points(self.qdrant_client, collection_name, points)
+        bump_collection(collection_name)
+        return result
 
     def answer(self, question: str) -> str:
         """
@@ -144,7 +307,16 @@ class LangChainContainer:
         """
         Lista as coleções disponíveis no Qdrant.
         """
-        return [col.name for col in self.qdrant_client.get_collections().collections]
+        return self.refresh_collections()
+
+    def delete_collection(self, collection_name: str):
+        """
+        Apaga a coleção no Qdrant (alias e versões, se for um rebuild) e a remove
+        do registro de chains.
+        """
+        drop_logical_collection(self.qdrant_client, collection_name)
+        self.invalidate_collection(collection_name)
+        bump_collection(collection_name)
 
 # import os
 # from langchain.chains import RetrievalQA
@@ -0,0 +1,42 @@
+import uuid
+import hashlib
+
+# Namespace fixo: o mesmo (fonte, texto) gera sempre o mesmo ID de ponto
+POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "hsmart/qdrant-points")
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 do texto, usado para detectar páginas/chunks alterados."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(source: str, text: str) -> str:
+    """
+    ID determinístico de um chunk no Qdrant, derivado da fonte e do conteúdo.
+
+    Chunks com o mesmo texto na mesma fonte mantêm o ID entre execuções, então
+    reingestões sobrescrevem em vez de duplicar e só os chunks alterados precisam
+    de novo embedding.
+    """
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{source}\0{content_hash(text)}"))
+
+
+def indexed_point_id(source: str, index: int, text: str) -> str:
+    """
+    ID determinístico de uma sentença/chunk pela posição na fonte:
+    (fonte, índice do chunk, hash do conteúdo). Reingerir a mesma fonte
+    sobrescreve os mesmos pontos; fontes diferentes nunca colidem.
+    """
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{source}\0{index}\0{content_hash(text)}"))
+
+
+def indexed_point_ids(sentences, metadata):
+    """IDs de `indexed_point_id` para um lote, com o índice contado por fonte."""
+    counters = {}
+    ids = []
+    for sentence, meta in zip(sentences, metadata):
+        source = (meta or {}).get("source", "")
+        index = counters.get(source, 0)
+        counters[source] = index + 1
+        ids.append(indexed_point_id(source, index, sentence))
+    return ids
@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+import numpy as np
+from qdrant_client import QdrantClient
+from shared.collection_aliases import logical_collections
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10) -> np.ndarray:
+    """K-means por similaridade de cosseno (vetores já normalizados)."""
+    k = min(k, len(vectors))
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(k):
+            members = vectors[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class CentroidRoutingIndex:
+    """
+    Índice local de roteamento: alguns centróides por coleção, calculados a partir
+    dos vetores armazenados no Qdrant. Rotear uma pergunta vira um produto escalar
+    NumPy contra uma matriz pequena, sem nenhuma busca no Qdrant.
+    """
+
+    def __init__(self, client: QdrantClient, centroids_per_collection: int = None, sample_size: int = None):
+        self.client = client
+        self.centroids_per_collection = centroids_per_collection or int(os.getenv("ROUTING_INDEX_CENTROIDS", 4))
+        self.sample_size = sample_size or int(os.getenv("ROUTING_INDEX_SAMPLE", 2000))
+        self.check_seconds = int(os.getenv("ROUTING_INDEX_CHECK_SECONDS", 300))
+
+        # dimensão -> (matriz de centróides, coleção de cada linha)
+        self._matrices = {}
+        self._centroids = {}
+        self._points_counts = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._matrices)
+
+    def _sample_vectors(self, collection_name: str) -> Optional[np.ndarray]:
+        vectors = []
+        offset = None
+        while len(vectors) < self.sample_size:
+            records, offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=min(256, self.sample_size - len(vectors)),
+                offset=offset,
+                with_payload=False,
+                with_vectors=True,
+            )
+            for record in records:
+                vector = record.vector
+                if isinstance(vector, dict):  # vetores nomeados: usa o primeiro
+                    vector = next(iter(vector.values()), None)
+                if vector:
+                    vectors.append(vector)
+            if offset is None:
+                break
+        if not vectors:
+            return None
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+    def _build_collection(self, collection_name: str):
+        vectors = self._sample_vectors(collection_name)
+        if vectors is None:
+            return None
+        return _spherical_kmeans(vectors, self.centroids_per_collection)
+
+    def _points_count(self, collection_name: str) -> int:
+        return self.client.get_collection(collection_name=collection_name).points_count or 0
+
+    def refresh(self, force: bool = False) -> list:
+        """
+        Recalcula os centróides das coleções novas ou cujo número de pontos mudou
+        (ex: após uma ingestão) e descarta as coleções apagadas.
+        Retorna a lista de coleções alteradas.
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return []
+        try:
+            # Nomes lógicos (aliases incluídos); a coleção física entra na
+            # assinatura para que a troca de alias de um rebuild conte como mudança
+            targets = logical_collections(self.client)
+            counts = {}
+            for col, physical in targets.items():
+                try:
+                    counts[col] = (physical, self._points_count(physical))
+                except Exception as e:
+                    logger.warning(f"⚠️ Falha ao consultar `{col}` para o índice de roteamento: {e}")
+
+            changed = [
+                col for col, count in counts.items()
+                if force or self._points_counts.get(col) != count
+            ]
+            removed = [col for col in self._centroids if col not in counts]
+
+            centroids = dict(self._centroids)
+            for col in removed:
+                centroids.pop(col, None)
+            for col in changed:
+                try:
+                    built = self._build_collection(targets[col])
+                except Exception as e:
+                    logger.warning(f"⚠️ Falha ao calcular centróides de `{col}`: {e}")
+                    continue
+                if built is None:
+                    centroids.pop(col, None)
+                else:
+                    centroids[col] = built
+
+            matrices = {}
+            for col, matrix in centroids.items():
+                dim = matrix.shape[1]
+                rows, labels = matrices.get(dim, ([], []))
+                rows.append(matrix)
+                labels.extend([col] * len(matrix))
+                matrices[dim] = (rows, labels)
+
+            with self._lock:
+                self._centroids = centroids
+                self._matrices = {dim: (np.vstack(rows), labels) for dim, (rows, labels) in matrices.items()}
+                self._points_counts = counts
+                self._checked_at = time.monotonic()
+
+            if changed or removed:
+                logger.info(f"🧭 Índice de roteamento atualizado: {changed + removed}")
+            return changed + removed
+        finally:
+            self._refreshing.release()
+
+    @property
+    def built(self) -> bool:
+        return self._checked_at > 0
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.check_seconds
+
+    def scores(self, query_vector) -> dict:
+        """Similaridade máxima entre a pergunta e os centróides de cada coleção."""
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        with self._lock:
+            entry = self._matrices.get(query.shape[0])
+        if entry is None:
+            return {}
+        matrix, labels = entry
+        similarities = matrix @ query
+        scores = {}
+        for label, similarity in zip(labels, similarities.tolist()):
+            if similarity > scores.get(label, -1.0):
+                scores[label] = similarity
+        return scores
+
+    def route(self, query_vector):
+        """
+        Retorna `(coleção, margem, scores)`; a margem é a diferença para a segunda
+        colocada e serve para decidir se vale confirmar com a votação vetorial.
+        """
+        scores = self.scores(query_vector)
+        if not scores:
+            return None, 0.0, scores
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        margin = best_score - ranked[1][1] if len(ranked) > 1 else best_score
+        return best, margin, scores
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesce chamadas idênticas em andamento: a primeira thread com uma chave
+    executa a função e as demais aguardam e recebem o mesmo resultado (ou exceção).
+
+    `do` retorna `(resultado, compartilhado)`, onde `compartilhado` indica que a
+    chamada reaproveitou a execução de outra thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result(), False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    Equivalente assíncrono de `SingleFlight` para um único event loop:
+    corrotinas com a mesma chave aguardam a mesma execução.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            future.set_result(await fn(*args, **kwargs))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._calls.pop(key, None)
+        return future.result(), False
+
+    def in_flight(self) -> int:
+        return len(self._calls)
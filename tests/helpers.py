@@ -0,0 +1,22 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pacotes de topo com o mesmo nome nos dois serviços
+SERVICE_PACKAGES = ("services", "routes", "memory", "models", "utils")
+
+
+def use_service(name: str):
+    """
+    Coloca `shared/` e o serviço `name` no sys.path, como no container dele, e
+    esquece os pacotes homônimos já importados do outro serviço.
+    """
+    service_dir = os.path.join(ROOT, name)
+    for path in (ROOT, service_dir):
+        if path in sys.path:
+            sys.path.remove(path)
+    sys.path[:0] = [service_dir, ROOT]
+    for module in list(sys.modules):
+        if module.split(".")[0] in SERVICE_PACKAGES:
+            del sys.modules[module]
@@ -0,0 +1,36 @@
+from helpers import use_service
+
+use_service("ingestion_service")
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+from shared.bulk_upload import BulkUploader, prune_stale_points
+from shared.point_ids import indexed_point_ids
+
+COLLECTION = "ufsm_knowledge"
+
+
+def points_for(sentences, source):
+    metadata = [{"source": source} for _ in sentences]
+    ids = indexed_point_ids(sentences, metadata)
+    return [
+        PointStruct(id=point_id, vector=[1.0, float(i + 1)], payload={**meta, "text": sentence})
+        for i, (point_id, sentence, meta) in enumerate(zip(ids, sentences, metadata))
+    ]
+
+
+def test_reingesting_a_shorter_page_removes_its_old_points():
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    uploader = BulkUploader(client, parallel=1)
+
+    uploader.upload(COLLECTION, points_for(["Inscrições até 30 de maio.", "Taxa de R$ 80.", "Resultado em junho."], "A"))
+    uploader.upload(COLLECTION, points_for(["Outra página."], "B"))
+
+    edited = points_for(["Inscrições até 15 de junho."], "A")
+    uploader.upload(COLLECTION, edited)
+    assert prune_stale_points(client, COLLECTION, edited) == 3
+
+    records, _ = client.scroll(COLLECTION, limit=100, with_payload=True)
+    assert sorted(record.payload["text"] for record in records) == ["Inscrições até 15 de junho.", "Outra página."]
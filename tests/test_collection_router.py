@@ -0,0 +1,67 @@
+import time
+
+from helpers import use_service
+
+use_service("retrieval_service")
+
+from shared.collection_router import CollectionRouter
+
+
+class DownClient:
+    """Qdrant fora do ar: toda listagem falha e é contada."""
+
+    def __init__(self):
+        self.listings = 0
+
+    def get_collections(self):
+        self.listings += 1
+        raise ConnectionError("qdrant indisponível")
+
+    def get_aliases(self):
+        self.listings += 1
+        raise ConnectionError("qdrant indisponível")
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def make_router(monkeypatch, backoff="30"):
+    monkeypatch.setenv("ROUTER_REFRESH_BACKOFF", backoff)
+    client = DownClient()
+    router = CollectionRouter(client, FakeEmbeddings(), model_path="/nonexistent.joblib", log_path="/tmp/router_test_log.jsonl")
+    return router, client
+
+
+def wait_idle(router):
+    deadline = time.monotonic() + 5
+    while router._refresh_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_failed_refresh_is_not_retried_on_every_question(monkeypatch):
+    router, client = make_router(monkeypatch)
+
+    # Pergunta sem heurística aplicável: passa pelo índice e pela votação
+    for _ in range(5):
+        assert router.decide("Qual é o horário do restaurante universitário?") is None
+        wait_idle(router)
+
+    # Uma tentativa de construir o índice e uma listagem para a votação
+    assert client.listings == 2
+    assert router._refresh_failed_at > 0
+
+
+def test_refresh_retries_on_the_dedicated_worker_after_backoff(monkeypatch):
+    router, client = make_router(monkeypatch, backoff="0.05")
+
+    router.decide("Qual é o horário do restaurante universitário?")
+    listings = client.listings
+    time.sleep(0.06)
+    router.decide("Qual é o horário do restaurante universitário?")
+    wait_idle(router)
+
+    # Nova tentativa no worker do índice e uma nova listagem para a votação
+    assert client.listings == listings + 2
+    assert router._refresh_executor is not router._executor
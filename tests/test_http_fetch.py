@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from helpers import use_service
+
+use_service("ingestion_service")
+
+from services import http_fetch
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    with http_fetch._cache_lock:
+        http_fetch._cache.clear()
+        for key in http_fetch._stats:
+            http_fetch._stats[key] = 0
+    yield
+
+
+def test_cache_keeps_only_the_most_recently_used_urls(monkeypatch):
+    monkeypatch.setenv("FETCH_CACHE_MAX_ENTRIES", "2")
+    http_fetch.store("https://a/sitemap.xml", b"a")
+    http_fetch.store("https://b/sitemap.xml", b"b")
+    http_fetch.lookup("https://a/sitemap.xml")
+    http_fetch.store("https://c/sitemap.xml", b"c")
+
+    assert list(http_fetch._cache) == ["https://a/sitemap.xml", "https://c/sitemap.xml"]
+    stats = http_fetch.cache_stats()
+    assert stats["entries"] == 2
+    assert stats["evicted"] == 1
+
+
+def test_entries_past_max_age_are_dropped(monkeypatch):
+    monkeypatch.setenv("FETCH_CACHE_MAX_AGE", "60")
+    old = http_fetch.store("https://a/sitemap.xml", b"a")
+    old.checked_at = time.monotonic() - 120
+    http_fetch.store("https://b/sitemap.xml", b"b")
+
+    assert http_fetch.lookup("https://a/sitemap.xml") == (None, False)
+    assert http_fetch.cache_stats()["expired"] == 1
@@ -0,0 +1,144 @@
+import os
+import threading
+
+from helpers import use_service
+
+use_service("ingestion_service")
+# Sem Redis nos testes: publicar versões de coleção vira no-op
+os.environ.setdefault("COLLECTION_VERSIONS_REDIS_URL", "")
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+from services.ingestion_pipeline import IngestionPipeline
+
+COLLECTION = "ufsm_knowledge"
+DIM = 8
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text) % 7 + 1)] + [1.0] * (DIM - 1) for text in texts]
+
+
+class FakeVectorStore:
+    vector_name = None
+    content_payload_key = "page_content"
+    metadata_payload_key = "metadata"
+
+
+class FakeContainer:
+    def __init__(self):
+        self.qdrant_client = QdrantClient(":memory:")
+        self.qdrant_client.create_collection(COLLECTION, vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+        self.embedding_model = FakeEmbeddings()
+
+    def set_collection(self, collection_name):
+        pass
+
+    def get_chain(self, collection_name):
+        return {"vectorstore": FakeVectorStore()}
+
+
+class FakeState:
+    """Estado em memória com a mesma interface do IngestionStateStore."""
+
+    def __init__(self, fail_on=None):
+        self.pages = {}
+        self.fail_on = fail_on
+
+    def get(self, collection, url):
+        if url == self.fail_on:
+            raise RuntimeError("estado indisponível")
+        return self.pages.get((collection, url))
+
+    def update(self, collection, url, **fields):
+        self.pages[(collection, url)] = {**self.pages.get((collection, url), {}), **fields}
+
+    def referenced(self, collection, point_ids, exclude=None):
+        used = {
+            point_id
+            for (name, url), record in self.pages.items()
+            if name == collection and url != exclude
+            for point_id in record.get("chunk_ids", [])
+        }
+        return {point_id for point_id in point_ids if point_id in used}
+
+
+def page(text, n=40):
+    return " ".join(f"{text} parágrafo {i} com conteúdo suficiente para virar um chunk próprio." for i in range(n))
+
+
+def run_pipeline(pipeline, pages, timeout=20):
+    """Roda as páginas e fecha o pipeline numa thread, para um deadlock falhar o teste em vez de travar."""
+    result = {}
+
+    def target():
+        pipeline.start()
+        for content, metadata, *chunks in pages:
+            pipeline.add_page(content, metadata, chunks=chunks[0] if chunks else None)
+        result["stats"] = pipeline.close()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline travou"
+    return result["stats"]
+
+
+def test_same_source_twice_in_one_run_does_not_deadlock():
+    container = FakeContainer()
+    state = FakeState()
+    pipeline = IngestionPipeline(container, COLLECTION, batch_size=3, queue_size=1, state=state, dedup=False)
+
+    stats = run_pipeline(pipeline, [
+        (page("Primeira versão"), {"source": "A"}),
+        (page("Segunda versão"), {"source": "A"}),
+        (page("Outra página"), {"source": "B"}),
+    ])
+
+    assert stats["pages"] == 3
+    assert stats["failed"] == 0
+    assert pipeline._pending == {}
+    assert (COLLECTION, "A") in state.pages
+    assert (COLLECTION, "B") in state.pages
+
+
+def test_state_lookup_error_drops_only_that_page():
+    container = FakeContainer()
+    state = FakeState(fail_on="B")
+    pipeline = IngestionPipeline(container, COLLECTION, batch_size=3, state=state, dedup=False)
+
+    stats = run_pipeline(pipeline, [
+        (page("Página B"), {"source": "B"}),
+        (page("Página C"), {"source": "C"}),
+    ])
+
+    assert stats["failed"] == 1
+    assert stats["pages"] == 1
+    assert (COLLECTION, "C") in state.pages
+    assert (COLLECTION, "B") not in state.pages
+    assert container.qdrant_client.count(COLLECTION).count == stats["upserted"] > 0
+
+
+def test_page_that_drops_a_shared_chunk_leaves_its_sources():
+    container = FakeContainer()
+    state = FakeState()
+    footer = "Universidade Federal de Santa Maria, Avenida Roraima 1000, Cidade Universitária, Camobi, Santa Maria RS."
+
+    def chunks_of(name, with_footer=True):
+        body = [f"Conteúdo próprio da página {name}, parte {i}, com texto suficiente para ser um chunk." for i in range(3)]
+        return body + [footer] if with_footer else body
+
+    run_pipeline(IngestionPipeline(container, COLLECTION, state=state), [
+        ("A", {"source": "A"}, chunks_of("A")),
+        ("B", {"source": "B"}, chunks_of("B")),
+    ])
+    # A página A muda e perde o rodapé; B continua com ele
+    run_pipeline(IngestionPipeline(container, COLLECTION, state=state), [
+        ("A editada", {"source": "A"}, chunks_of("A editada", with_footer=False)),
+    ])
+
+    points, _ = container.qdrant_client.scroll(COLLECTION, limit=100, with_payload=True)
+    shared = [point.payload["metadata"] for point in points if point.payload["page_content"] == footer]
+    assert shared == [{"source": "B", "sources": ["B"]}]
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from helpers import use_service
+
+use_service("retrieval_service")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("EMBEDDING_STORE_ENABLED", "false")
+
+from langchain.chains import RetrievalQA
+from langchain_community.llms.fake import FakeListLLM
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from services import qa_service
+from services.qa_metrics import qa_counters
+from shared.single_flight import SingleFlight
+
+ANSWER = "As inscrições vão até 30 de maio."
+
+
+class FakeRetriever(BaseRetriever):
+    """Retriever em memória; com `release`, segura a busca até o teste liberar."""
+
+    entered: threading.Event = None
+    release: threading.Event = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.entered:
+            self.entered.set()
+        if self.release:
+            self.release.wait(5)
+        return [Document(page_content="Inscrições abertas até 30 de maio.", metadata={"source": "edital"})]
+
+
+class FakeRouter:
+    def decide(self, query):
+        return "ufsm_knowledge"
+
+
+class FakeMemory:
+    def __init__(self):
+        self.saved = []
+
+    def save_context(self, inputs, outputs):
+        self.saved.append((inputs, outputs))
+
+
+class FakeContainer:
+    def __init__(self, retriever):
+        self.chain = RetrievalQA.from_chain_type(
+            llm=FakeListLLM(responses=[ANSWER]),
+            retriever=retriever,
+            return_source_documents=True,
+        )
+
+    def get_chain(self, collection_name):
+        return {"qa_chain": self.chain}
+
+    def invalidate_collection(self, collection_name):
+        pass
+
+
+@pytest.fixture
+def fake_qa(monkeypatch):
+    retriever = FakeRetriever()
+    container = FakeContainer(retriever)
+    monkeypatch.setattr(qa_service, "get_conversation_memory", lambda session_id: FakeMemory())
+    monkeypatch.setattr(qa_service, "QAExecution", partial(qa_service.QAExecution, container=container, router=FakeRouter()))
+    monkeypatch.setattr(qa_service, "in_flight", SingleFlight())
+    qa_counters.reset()
+    return retriever
+
+
+def test_one_retrieval_and_one_generation_per_question(fake_qa):
+    for query in ("Até quando vão as inscrições?", "E o resultado, quando sai?"):
+        result = qa_service.qa_chain(query, "sessao-1", use_cache=False)
+        assert result["result"] == ANSWER
+        assert result["sources"] == [{"source": "edital"}]
+
+    counters = qa_counters.snapshot()
+    assert counters["questions"] == 2
+    assert counters["retrievals"] == 2
+    assert counters["generations"] == 2
+    assert counters["coalesced"] == 0
+
+
+def test_concurrent_identical_questions_share_one_upstream_call(fake_qa):
+    fake_qa.entered = threading.Event()
+    fake_qa.release = threading.Event()
+    results = []
+
+    def ask():
+        results.append(qa_service.qa_chain("Até quando vão as inscrições?", "sessao-1", use_cache=False))
+
+    leader = threading.Thread(target=ask)
+    leader.start()
+    assert fake_qa.entered.wait(5)
+
+    # Mesma sessão e mesmo texto (a menos de espaços) enquanto o líder busca
+    follower = threading.Thread(target=lambda: results.append(
+        qa_service.qa_chain("Até quando vão  as inscrições? ", "sessao-1", use_cache=False)
+    ))
+    follower.start()
+    deadline = time.monotonic() + 5
+    while qa_service.in_flight.coalesced == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    fake_qa.release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert [result["result"] for result in results] == [ANSWER, ANSWER]
+    counters = qa_counters.snapshot()
+    assert counters["questions"] == 2
+    assert counters["coalesced"] == 1
+    assert counters["retrievals"] == 1
+    assert counters["generations"] == 1
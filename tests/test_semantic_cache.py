@@ -0,0 +1,33 @@
+
+from helpers import use_service
+
+use_service("retrieval_service")
+
+from services.semantic_cache import SemanticAnswerCache
+
+# Perguntas de template embedam quase igual; o teste usa o mesmo vetor para as duas
+EMBEDDING = [0.3, 0.1, 0.9, 0.2]
+
+
+def test_template_questions_with_different_course_do_not_share_an_answer():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("ufsm_knowledge", "A UFSM tem curso de Medicina?", EMBEDDING, "Sim, Medicina é oferecido.", [])
+
+    assert cache.lookup("ufsm_knowledge", EMBEDDING, "A UFSM tem curso de Direito?") is None
+    assert cache.lookup("ufsm_knowledge", EMBEDDING, "a ufsm tem curso de direito?") is None
+
+
+def test_reworded_question_with_the_same_facts_reuses_the_answer():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("ufsm_knowledge", "A UFSM tem curso de Medicina?", EMBEDDING, "Sim, Medicina é oferecido.", [])
+
+    hit = cache.lookup("ufsm_knowledge", EMBEDDING, "A UFSM possui o curso de medicina?")
+    assert hit is not None
+    assert hit["result"] == "Sim, Medicina é oferecido."
+
+
+def test_questions_that_differ_by_a_number_do_not_share_an_answer():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("ufsm_knowledge", "Qual o calendário do vestibular 2024?", EMBEDDING, "Em 2024...", [])
+
+    assert cache.lookup("ufsm_knowledge", EMBEDDING, "Qual o calendário do vestibular 2025?") is None